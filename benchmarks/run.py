@@ -0,0 +1,232 @@
+"""
+Time each stage of a merge on the bundled test files and on synthetic
+scores of growing size, and write the results as JSON.
+
+    python benchmarks/run.py -o results.json
+    python benchmarks/run.py --measures 10 100 1000 10000 --parts 1 10 40 --no-bundled
+
+Stages: parse (compact reader and music21), compare_scores,
+splice_export (taking every difference from score2), show_differences,
+show_highlighted_score, update_measure_in_score, merge_export, and writing
+the merged score as .musicxml and as .mxl (with the size of each file). The music21 stages are skipped for scores larger than
+--music21-limit measures in total, where they would take minutes.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import music21
+import numpy as np
+from music21 import converter
+
+# Run as a script from anywhere, without installing the package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import musicmerge
+from musicmerge.core import MergeOverlay, compare_scores, merge_export, show_differences, show_highlighted_score
+from musicmerge.gui.utils import update_measure_in_score
+from musicmerge.index import ScoreIndex
+from musicmerge.mxl import DEFAULT_COMPRESSION, write_score
+from musicmerge.notation import read_score, to_music21
+from musicmerge.splice import splice_export
+
+from synthetic import write_pair
+
+TESTFILES = Path(__file__).resolve().parent.parent / 'testfiles'
+
+# Pairs of bundled files compared with each other
+BUNDLED_PAIRS = [
+    ('BeetAnGeSample', 'BrahWiMeSample'),
+    ('DebuMandSample', 'FaurReveSample'),
+    ('MahlFaGe4Sample', 'BeetAnGeSample'),
+    ('testscore', 'testscore2'),
+    ('control', 'control_test'),
+    ('10barsofG', '5barsofD'),
+]
+
+# At most this many differing measures go through show_differences per case
+SHOW_DIFFERENCES_SAMPLE = 50
+
+
+def timed(function, repeat):
+    """
+    Run `function` `repeat` times.
+    Returns:
+        (timing dict with the best and median seconds, last result)
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        runs.append(time.perf_counter() - start)
+    return {'best': min(runs), 'median': statistics.median(runs), 'runs': len(runs)}, result
+
+
+def _modified(differences):
+    return [(part_diff['part_id'], measure_diff) for part_diff in differences
+            for measure_diff in part_diff['differences'] if measure_diff['operation'] == 'modify']
+
+
+def benchmark_pair(path1, path2, repeat, music21_limit, compression=DEFAULT_COMPRESSION):
+    """
+    Time every stage on one pair of MusicXML files.
+    Returns:
+        Dict with the size of the scores, the timing of each stage (None
+        for stages that were skipped) and the size of the saved files
+    """
+    stages = {}
+    stages['parse'], (score1, score2) = timed(lambda: (read_score(path1), read_score(path2)), repeat)
+    stages['compare_scores'], differences = timed(lambda: compare_scores(score1, score2), repeat)
+    modified = _modified(differences)
+
+    measures = sum(len(part.measures) for part in score1.parts)
+    case = {
+        'score1': str(path1),
+        'score2': str(path2),
+        'parts': len(score1.parts),
+        'measures': max((len(part.measures) for part in score1.parts), default=0),
+        'notes': sum(len(measure.notes) for part in score1.parts for measure in part.measures),
+        'differences': sum(len(part_diff['differences']) for part_diff in differences),
+        'stages': stages,
+        'output_bytes': None,
+    }
+    def splice():
+        merge = MergeOverlay(score1)
+        for part_diff in differences:
+            for measure_diff in part_diff['differences']:
+                merge.choose(part_diff['part_id'], measure_diff)
+        with tempfile.TemporaryDirectory() as directory:
+            splice_export(merge, os.path.join(directory, 'merged.musicxml'), compression)
+
+    # Needs no music21, so it is timed at every size
+    stages['splice_export'], _ = timed(splice, repeat)
+
+    for stage in ('parse_music21', 'show_differences', 'show_highlighted_score',
+                  'update_measure_in_score', 'merge_export', 'save_musicxml', 'save_mxl'):
+        stages[stage] = None
+    if measures > music21_limit:
+        return case
+
+    stages['parse_music21'], music21_score1 = timed(lambda: converter.parse(path1), repeat)
+
+    # Measures are converted to music21 up front, as the merge screen does before showing them
+    sample = [(part_id, to_music21(diff['score1_measure']), to_music21(diff['score2_measure']))
+              for part_id, diff in modified[:SHOW_DIFFERENCES_SAMPLE]]
+    stages['show_differences'], _ = timed(
+        lambda: [show_differences(measure1, measure2) for _, measure1, measure2 in sample], repeat)
+    stages['show_highlighted_score'], _ = timed(
+        lambda: show_highlighted_score(music21_score1, differences), repeat)
+
+    replacements = [(part_id, diff['measure_number'], to_music21(diff['score2_measure']))
+                    for part_id, diff in modified]
+
+    def update():
+        target = converter.parse(path1)
+        index = ScoreIndex(target)
+        start = time.perf_counter()
+        for part_id, number, measure in replacements:
+            update_measure_in_score(target, part_id, number, measure, index)
+        return time.perf_counter() - start
+
+    # Only the updates are timed, not the parse that gives each run a fresh score
+    runs = [update() for _ in range(repeat)]
+    stages['update_measure_in_score'] = {'best': min(runs), 'median': statistics.median(runs), 'runs': repeat}
+
+    def overlay():
+        merge = MergeOverlay(music21_score1)
+        for part_diff in differences:
+            for measure_diff in part_diff['differences']:
+                merge.choose(part_diff['part_id'], measure_diff)
+        return merge
+
+    def export():
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+            merge_export(overlay(), os.path.join(directory, 'merged.musicxml'))
+
+    stages['merge_export'], _ = timed(export, repeat)
+
+    # Writing alone, of one merged score, in each format
+    merged = overlay().build()
+    case['output_bytes'] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for suffix in ('musicxml', 'mxl'):
+            path = os.path.join(directory, f'merged.{suffix}')
+            stages[f'save_{suffix}'], _ = timed(lambda: write_score(merged, path, compression), repeat)
+            case['output_bytes'][suffix] = os.path.getsize(path)
+    return case
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'musicmerge': musicmerge.__version__,
+        'music21': music21.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stages of a musicmerge merge.")
+    parser.add_argument("-o", "--output", help="JSON results file (default: stdout)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the best and median are kept")
+    parser.add_argument("--no-bundled", action="store_true", help="Skip the bundled test files")
+    parser.add_argument("--measures", type=int, nargs='*', default=[10, 100, 1000, 10000],
+                        help="Measure counts of the synthetic scores (with one part)")
+    parser.add_argument("--parts", type=int, nargs='*', default=[1, 5, 10, 20, 40],
+                        help="Part counts of the synthetic scores (with --parts-measures measures)")
+    parser.add_argument("--parts-measures", type=int, default=100,
+                        help="Measures per part when scaling the number of parts")
+    parser.add_argument("--density", type=int, default=4, help="Notes per measure: 1, 2, 4, 8 or 16")
+    parser.add_argument("--difference-rate", type=float, default=0.1,
+                        help="Fraction of measures changed in the second synthetic score")
+    parser.add_argument("--music21-limit", type=int, default=2000,
+                        help="Skip music21 stages for scores with more measures than this in total")
+    parser.add_argument("--compression-level", type=int, choices=range(10), default=DEFAULT_COMPRESSION,
+                        metavar="0-9", help="zlib level of the .mxl files written")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cases = []
+
+    def run(source, path1, path2, **extra):
+        print(f"{source}: {Path(path1).name} vs {Path(path2).name}", file=sys.stderr)
+        case = benchmark_pair(path1, path2, args.repeat, args.music21_limit, args.compression_level)
+        case.update(source=source, **extra)
+        cases.append(case)
+
+    if not args.no_bundled:
+        for name1, name2 in BUNDLED_PAIRS:
+            run('bundled', TESTFILES / f"{name1}.musicxml", TESTFILES / f"{name2}.musicxml")
+
+    sizes = [(1, measures) for measures in args.measures]
+    sizes += [(parts, args.parts_measures) for parts in args.parts if (parts, args.parts_measures) not in sizes]
+    with tempfile.TemporaryDirectory() as directory:
+        for parts, measures in sizes:
+            path1, path2, changed = write_pair(
+                Path(directory), f"synthetic-{parts}x{measures}", parts=parts, measures=measures,
+                density=args.density, difference_rate=args.difference_rate, seed=args.seed)
+            run('synthetic', path1, path2, density=args.density,
+                difference_rate=args.difference_rate, generated_differences=changed)
+
+    results = {'environment': environment(), 'repeat': args.repeat,
+               'compression_level': args.compression_level, 'cases': cases}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
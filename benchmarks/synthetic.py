@@ -0,0 +1,112 @@
+"""
+Synthetic MusicXML scores for scaling benchmarks.
+
+The MusicXML is written as text, so scores of thousands of measures and
+dozens of parts are generated in seconds without music21.
+"""
+import random
+
+STEPS = ('C', 'D', 'E', 'F', 'G', 'A', 'B')
+# Notes per 4/4 measure and their duration in divisions (DIVISIONS per quarter)
+DENSITIES = {1: 'whole', 2: 'half', 4: 'quarter', 8: 'eighth', 16: '16th'}
+DIVISIONS = 4
+
+HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+          '<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 4.0 Partwise//EN" '
+          '"http://www.musicxml.org/dtds/partwise.dtd">\n'
+          '<score-partwise version="4.0">\n')
+
+
+def _random_measure(rng, density, chord_rate):
+    """One measure as a list of notes, each a list of (step, octave) pitches."""
+    notes = []
+    for _ in range(density):
+        pitches = [(rng.choice(STEPS), rng.randint(3, 5))]
+        if rng.random() < chord_rate:
+            pitches.append((rng.choice(STEPS), pitches[0][1] + 1))
+        notes.append(pitches)
+    return notes
+
+
+def _mutate(rng, measure):
+    """Copy of a measure with the pitch of one note changed."""
+    measure = [list(pitches) for pitches in measure]
+    k = rng.randrange(len(measure))
+    step, octave = measure[k][0]
+    measure[k][0] = (STEPS[(STEPS.index(step) + rng.randint(1, 6)) % len(STEPS)], octave)
+    return measure
+
+
+def _measure_xml(number, notes, density, first):
+    lines = [f'    <measure number="{number}">']
+    if first:
+        lines.append(f'      <attributes><divisions>{DIVISIONS}</divisions><key><fifths>0</fifths></key>'
+                     '<time><beats>4</beats><beat-type>4</beat-type></time>'
+                     '<clef><sign>G</sign><line>2</line></clef></attributes>')
+    duration = DIVISIONS * 4 // density
+    for pitches in notes:
+        for k, (step, octave) in enumerate(pitches):
+            chord = '<chord/>' if k else ''
+            lines.append(f'      <note>{chord}<pitch><step>{step}</step><octave>{octave}</octave></pitch>'
+                         f'<duration>{duration}</duration><voice>1</voice>'
+                         f'<type>{DENSITIES[density]}</type></note>')
+    lines.append('    </measure>')
+    return '\n'.join(lines)
+
+
+def _score_xml(parts):
+    lines = [HEADER, '  <part-list>']
+    for k in range(len(parts)):
+        lines.append(f'    <score-part id="P{k + 1}"><part-name>Part {k + 1}</part-name></score-part>')
+    lines.append('  </part-list>')
+    for k, measures in enumerate(parts):
+        lines.append(f'  <part id="P{k + 1}">')
+        lines.extend(measures)
+        lines.append('  </part>')
+    lines.append('</score-partwise>\n')
+    return '\n'.join(lines)
+
+
+def generate_pair(parts=1, measures=100, density=4, difference_rate=0.1, chord_rate=0.1, seed=0):
+    """
+    Generate two versions of a synthetic score in 4/4.
+
+    Both have `parts` parts of `measures` measures with `density` notes per
+    measure (1, 2, 4, 8 or 16). In the second version a fraction
+    `difference_rate` of the measures has one note's pitch changed.
+    Returns:
+        (musicxml1, musicxml2, differences) where differences is the number
+        of measures that were changed
+    """
+    if density not in DENSITIES:
+        raise ValueError(f"density must be one of {sorted(DENSITIES)}")
+    rng = random.Random(seed)
+    parts1, parts2 = [], []
+    changed = 0
+    for _ in range(parts):
+        measures1, measures2 = [], []
+        for number in range(1, measures + 1):
+            notes = _random_measure(rng, density, chord_rate)
+            edited = rng.random() < difference_rate
+            measures1.append(_measure_xml(number, notes, density, number == 1))
+            measures2.append(_measure_xml(number, _mutate(rng, notes) if edited else notes,
+                                          density, number == 1))
+            changed += edited
+        parts1.append(measures1)
+        parts2.append(measures2)
+    return _score_xml(parts1), _score_xml(parts2), changed
+
+
+def write_pair(directory, name, **options):
+    """
+    Write a generate_pair() result to `directory` as NAME-1.musicxml and
+    NAME-2.musicxml.
+    Returns:
+        (path1, path2, differences)
+    """
+    xml1, xml2, changed = generate_pair(**options)
+    path1 = directory / f"{name}-1.musicxml"
+    path2 = directory / f"{name}-2.musicxml"
+    path1.write_text(xml1, encoding='utf-8')
+    path2.write_text(xml2, encoding='utf-8')
+    return path1, path2, changed
@@ -0,0 +1,391 @@
+def myers_diff(seq1, seq2, max_d=None):
+    """
+    Compute a shortest edit script between two sequences with Myers' O(ND)
+    algorithm, in its linear-space form: the middle snake of the script is
+    found by searching from both ends, and the halves on either side of it
+    are solved the same way, so memory stays O(N + M) however many edits
+    there are. Elements are compared with ==, so measure fingerprints work
+    directly.
+    Returns:
+        List of (tag, i, j) tuples in sequence order, where tag is 'equal',
+        'delete' or 'insert' and i, j are the current positions in seq1 and
+        seq2. A delete removes seq1[i], an insert adds seq2[j] before seq1[i].
+        None if the script would need more than `max_d` edits.
+    """
+    n, m = len(seq1), len(seq2)
+    if max_d is not None and abs(n - m) > max_d:
+        return None
+    ops = []
+    # Sub-problems (x0, x1, y0, y1) and runs of equal elements, in sequence order
+    stack = [('solve', 0, n, 0, m)]
+    bound = max_d
+    while stack:
+        item = stack.pop()
+        if item[0] == 'equal':
+            _, x, y, length = item
+            ops.extend(('equal', x + k, y + k) for k in range(length))
+            continue
+        _, x0, x1, y0, y1 = item
+        # Common ends are matched outright, without a search
+        while x0 < x1 and y0 < y1 and seq1[x0] == seq2[y0]:
+            ops.append(('equal', x0, y0))
+            x0 += 1
+            y0 += 1
+        suffix = 0
+        while x0 < x1 - suffix and y0 < y1 - suffix and seq1[x1 - 1 - suffix] == seq2[y1 - 1 - suffix]:
+            suffix += 1
+        if suffix:
+            stack.append(('equal', x1 - suffix, y1 - suffix, suffix))
+            x1 -= suffix
+            y1 -= suffix
+        if x0 == x1:
+            ops.extend(('insert', x0, y) for y in range(y0, y1))
+            continue
+        if y0 == y1:
+            ops.extend(('delete', x, y0) for x in range(x0, x1))
+            continue
+
+        snake = _middle_snake(seq1, x0, x1, seq2, y0, y1, bound)
+        if snake is None:
+            return None
+        # Only the whole problem is bounded; its halves are within the script found
+        bound = None
+        d, x, y, u, v = snake
+        if d <= 1:
+            _short_script(seq1, x0, x1, seq2, y0, y1, ops)
+            continue
+        stack.append(('solve', u, x1, v, y1))
+        if u > x:
+            stack.append(('equal', x, y, u - x))
+        stack.append(('solve', x0, x, y0, y))
+    _slide(ops, seq1, seq2)
+    _deletes_first(ops)
+    return ops
+
+
+def _slide(ops, seq1, seq2):
+    """
+    Move every insert or delete past the equal elements after it that
+    repeat the inserted or deleted one, so that of equally short scripts
+    the one matching elements earliest is kept (e.g. a copied bar is
+    reported as inserted after the original).
+    """
+    for p in range(len(ops) - 2, -1, -1):
+        q = p
+        while q + 1 < len(ops) and ops[q][0] != 'equal' and ops[q + 1][0] == 'equal':
+            tag, i, j = ops[q]
+            if tag == 'insert' and seq2[j] == seq2[j + 1]:
+                ops[q], ops[q + 1] = ('equal', i, j), ('insert', i + 1, j + 1)
+            elif tag == 'delete' and seq1[i] == seq1[i + 1]:
+                ops[q], ops[q + 1] = ('equal', i, j), ('delete', i + 1, j + 1)
+            else:
+                break
+            q += 1
+
+
+def _deletes_first(ops):
+    """
+    Within every run of edits, put the deletes before the inserts, as the
+    classic search does, so runs pair up into modifications from their start.
+    """
+    start = 0
+    while start < len(ops):
+        if ops[start][0] == 'equal':
+            start += 1
+            continue
+        end = start
+        while end < len(ops) and ops[end][0] != 'equal':
+            end += 1
+        _, i, j = ops[start]
+        deletes = sum(op[0] == 'delete' for op in ops[start:end])
+        ops[start:end] = ([('delete', i + k, j) for k in range(deletes)] +
+                          [('insert', i + deletes, j + k) for k in range(end - start - deletes)])
+        start = end
+
+
+def _middle_snake(seq1, x0, x1, seq2, y0, y1, max_d=None):
+    """
+    Find the middle snake of the shortest edit script of seq1[x0:x1] and
+    seq2[y0:y1], keeping only the furthest point of each diagonal for the
+    current step of each search.
+    Returns:
+        (d, x, y, u, v): the length of the script and the snake from (x, y)
+        to (u, v) in sequence positions, or None if d would exceed max_d
+    """
+    n, m = x1 - x0, y1 - y0
+    delta = n - m
+    odd = delta % 2 != 0
+    offset = n + m + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+    for d in range((n + m + 1) // 2 + 1):
+        if max_d is not None and 2 * d - 1 > max_d:
+            return None
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and seq1[x0 + x] == seq2[y0 + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            # Diagonal k of the forward search is delta - k of the backward one
+            if odd and -(d - 1) <= delta - k <= d - 1 and x + backward[offset + delta - k] >= n:
+                return 2 * d - 1, x0 + start_x, y0 + start_y, x0 + x, y0 + y
+        if max_d is not None and 2 * d > max_d:
+            return None
+        for k in range(-d, d + 1, 2):
+            # Positions counted from the ends of both sequences
+            if k == -d or (k != d and backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and seq1[x1 - 1 - x] == seq2[y1 - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + k] = x
+            if not odd and -d <= delta - k <= d and x + forward[offset + delta - k] >= n:
+                return 2 * d, x1 - x, y1 - y, x1 - start_x, y1 - start_y
+    return None
+
+
+def _short_script(seq1, x0, x1, seq2, y0, y1, ops):
+    """Append the script of a sub-problem with at most one edit."""
+    # Equal lengths mean no edit, otherwise the one extra element goes after the common prefix
+    prefix = 0
+    while x0 + prefix < x1 and y0 + prefix < y1 and seq1[x0 + prefix] == seq2[y0 + prefix]:
+        prefix += 1
+    ops.extend(('equal', x0 + k, y0 + k) for k in range(prefix))
+    x, y = x0 + prefix, y0 + prefix
+    if x1 - x0 > y1 - y0:
+        ops.append(('delete', x, y))
+        x += 1
+    elif y1 - y0 > x1 - x0:
+        ops.append(('insert', x, y))
+        y += 1
+    ops.extend(('equal', x + k, y + k) for k in range(x1 - x))
+
+
+def align_measures(fingerprints1, fingerprints2, mismatches=None):
+    """
+    Align two parts by their measure fingerprints.
+
+    Parts of equal length are compared bar by bar unless a Myers diff finds
+    a strictly shorter edit script, so repeated bars (e.g. whole rests) are
+    not matched across the score. Otherwise runs of deletions and insertions
+    between two matching measures are paired up as modifications; whatever
+    is left over is reported as a plain insert or delete. For parts of
+    equal length, `mismatches` may give the positions that differ (e.g. from
+    columnar.differing_measures) instead of comparing fingerprints.
+    Returns:
+        List of (operation, i, j) tuples where operation is 'modify',
+        'insert' or 'delete'. For 'modify' i and j index the two measures,
+        for 'delete' i is the removed score1 measure and for 'insert' j is the
+        new score2 measure, inserted before score1 measure i.
+    """
+    edits = []
+    deletes, inserts = [], []
+
+    def flush():
+        for (i, _), (_, j) in zip(deletes, inserts):
+            edits.append(('modify', i, j))
+        paired = min(len(deletes), len(inserts))
+        for i, j in deletes[paired:]:
+            edits.append(('delete', i, j))
+        for i, j in inserts[paired:]:
+            edits.append(('insert', i, j))
+        deletes.clear()
+        inserts.clear()
+
+    if len(fingerprints1) == len(fingerprints2):
+        if mismatches is None:
+            mismatches = [k for k, (fp1, fp2) in enumerate(zip(fingerprints1, fingerprints2)) if fp1 != fp2]
+        else:
+            mismatches = list(mismatches)
+        if not mismatches:
+            return edits
+        # Only worth realigning if it beats the in-place modifications
+        script = myers_diff(fingerprints1, fingerprints2, max_d=len(mismatches) - 1)
+        if script is None:
+            return [('modify', k, k) for k in mismatches]
+    else:
+        script = myers_diff(fingerprints1, fingerprints2)
+
+    for tag, i, j in script:
+        if tag == 'equal':
+            flush()
+        elif tag == 'delete':
+            deletes.append((i, j))
+        else:
+            inserts.append((i, j))
+    flush()
+
+    return edits
+
+
+# Cost of leaving a note unmatched in the edit distance fallback
+INDEL_COST = 1.0
+# Extra diagonals searched beyond the length difference of the two runs
+BAND_WIDTH = 3
+
+
+def _voice_events(measure):
+    """
+    Group the notes, chords and rests of a measure by voice.
+    Returns:
+        Dict of voice id (None outside voices) -> list of (onset, element),
+        sorted by onset.
+    """
+    voices = {}
+    for element in measure.recurse().notesAndRests:
+        site = element.activeSite
+        voice = site.id if site is not measure and site.isStream and 'Voice' in site.classes else None
+        voices.setdefault(voice, []).append((float(element.getOffsetInHierarchy(measure)), element))
+
+    for events in voices.values():
+        events.sort(key=lambda event: event[0])
+    return voices
+
+
+def _banded_edit_distance(events1, events2, distances):
+    """
+    Weighted edit distance between two short runs of notes, restricted to a
+    band around the main diagonal.
+    """
+    n, m = len(events1), len(events2)
+    if n == 0 or m == 0:
+        return ([_unmatched('delete', e) for e in events1] +
+                [_unmatched('insert', e) for e in events2])
+
+    band = abs(n - m) + BAND_WIDTH
+    cells = [(i, j) for i in range(1, n + 1) for j in range(max(1, i - band), min(m, i + band) + 1)]
+    # Substitution costs for the whole band in one batch
+    costs = distances([events1[i - 1][1] for i, _ in cells], [events2[j - 1][1] for _, j in cells])
+    subs = dict(zip(cells, map(float, costs)))
+
+    inf = float('inf')
+    cost = [[inf] * (m + 1) for _ in range(n + 1)]
+    back = [[None] * (m + 1) for _ in range(n + 1)]
+    cost[0][0] = 0.0
+
+    for i in range(n + 1):
+        for j in range(max(0, i - band), min(m, i + band) + 1):
+            if i > 0 and j > 0:
+                sub = subs[(i, j)]
+                if cost[i - 1][j - 1] + sub < cost[i][j]:
+                    cost[i][j] = cost[i - 1][j - 1] + sub
+                    back[i][j] = 'match'
+            if i > 0 and cost[i - 1][j] + INDEL_COST < cost[i][j]:
+                cost[i][j] = cost[i - 1][j] + INDEL_COST
+                back[i][j] = 'delete'
+            if j > 0 and cost[i][j - 1] + INDEL_COST < cost[i][j]:
+                cost[i][j] = cost[i][j - 1] + INDEL_COST
+                back[i][j] = 'insert'
+
+    ops = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        step = back[i][j]
+        if step == 'match':
+            ops.append(_matched(events1[i - 1], events2[j - 1], subs[(i, j)]))
+            i -= 1
+            j -= 1
+        elif step == 'delete':
+            ops.append(_unmatched('delete', events1[i - 1]))
+            i -= 1
+        else:
+            ops.append(_unmatched('insert', events2[j - 1]))
+            j -= 1
+
+    ops.reverse()
+    return ops
+
+
+def _matched(event1, event2, cost):
+    return {'operation': 'match', 'note1': event1[1], 'note2': event2[1], 'distance': cost}
+
+
+def _unmatched(operation, event):
+    if operation == 'delete':
+        return {'operation': operation, 'note1': event[1], 'note2': None, 'distance': None}
+    return {'operation': operation, 'note1': None, 'note2': event[1], 'distance': None}
+
+
+def _align_voice(events1, events2, distances):
+    """
+    Align one voice. Notes paired by onset are returned with a distance of
+    None; align_notes fills them in with a single batched call.
+    """
+    ops = []
+    n, m = len(events1), len(events2)
+    i = j = 0
+    while i < n and j < m:
+        onset = events1[i][0]
+        if onset == events2[j][0]:
+            # Same onset on both sides: pair the notes struck together
+            i_end, j_end = i, j
+            while i_end < n and events1[i_end][0] == onset:
+                i_end += 1
+            while j_end < m and events2[j_end][0] == onset:
+                j_end += 1
+            if i_end - i == j_end - j:
+                for event1, event2 in zip(events1[i:i_end], events2[j:j_end]):
+                    ops.append(_matched(event1, event2, None))
+            else:
+                ops.extend(_banded_edit_distance(events1[i:i_end], events2[j:j_end], distances))
+        else:
+            # Onsets disagree: gather both sides up to the next shared onset
+            i_end, j_end = i, j
+            while i_end < n and j_end < m and events1[i_end][0] != events2[j_end][0]:
+                if events1[i_end][0] < events2[j_end][0]:
+                    i_end += 1
+                else:
+                    j_end += 1
+            if i_end == n or j_end == m:
+                i_end, j_end = n, m
+            ops.extend(_banded_edit_distance(events1[i:i_end], events2[j:j_end], distances))
+        i, j = i_end, j_end
+
+    ops.extend(_unmatched('delete', event) for event in events1[i:])
+    ops.extend(_unmatched('insert', event) for event in events2[j:])
+    return ops
+
+
+def align_notes(measure1, measure2, distances):
+    """
+    Align the notes, chords and rests of two measures voice by voice.
+
+    Notes are swept in onset order and paired when their onsets agree. Runs
+    where the onsets disagree fall back to a banded weighted edit distance
+    that uses `distances` (e.g. core.calculate_differences) as substitution
+    cost, so an added grace note or a split note only affects its neighbours.
+    `distances` takes two equal-length lists of notes and returns one cost
+    per pair; it is called once for all onset-paired notes and once per
+    fallback run.
+    Returns:
+        List of dicts in voice and onset order:
+        {
+            'operation': str,   # 'match', 'insert' (only in measure2) or 'delete' (only in measure1)
+            'note1': music21.note.GeneralNote,   # None for 'insert'
+            'note2': music21.note.GeneralNote,   # None for 'delete'
+            'distance': float   # substitution cost for 'match', else None
+        }
+    """
+    voices1 = _voice_events(measure1)
+    voices2 = _voice_events(measure2)
+
+    ops = []
+    for voice in list(voices1) + [v for v in voices2 if v not in voices1]:
+        ops.extend(_align_voice(voices1.get(voice, []), voices2.get(voice, []), distances))
+
+    pending = [op for op in ops if op['operation'] == 'match' and op['distance'] is None]
+    if pending:
+        costs = distances([op['note1'] for op in pending], [op['note2'] for op in pending])
+        for op, cost in zip(pending, costs):
+            op['distance'] = float(cost)
+    return ops
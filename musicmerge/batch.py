@@ -0,0 +1,213 @@
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from .core import MergeOverlay, compare_scores, measure_severity
+from .loader import load_score
+from .splice import write_merge
+
+POLICIES = ('prefer-score1', 'prefer-score2', 'prefer-lower-severity', 'fail-on-conflict')
+
+# prefer-lower-severity takes changes below "Moderate" in show_differences' colour scale
+SEVERITY_THRESHOLD = 0.3
+
+SCORE_SUFFIXES = ('.musicxml', '.xml', '.mxl')
+
+
+class ConflictError(Exception):
+    """Raised by the fail-on-conflict policy when two scores differ."""
+
+
+def read_manifest(path):
+    """
+    Read a batch manifest: a CSV file with one pair per row,
+    `score1,score2[,output]`. Relative paths are taken from the manifest's
+    directory; blank rows and rows starting with # are skipped.
+    Returns:
+        List of (score1, score2, output name or None)
+    """
+    path = Path(path)
+    pairs = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            row = [field.strip() for field in row]
+            if not any(row) or row[0].startswith('#'):
+                continue
+            if len(row) not in (2, 3):
+                raise ValueError(f"{path}: expected 'score1,score2[,output]', got {','.join(row)!r}")
+            pairs.append((path.parent / row[0], path.parent / row[1], row[2] if len(row) == 3 else None))
+    return pairs
+
+
+def find_pairs(directory):
+    """
+    Find score pairs in a directory: every subdirectory holding exactly two
+    MusicXML files is one pair, score1 being the first by name.
+    Returns:
+        (pairs, skipped) where pairs is a list of (score1, score2, output name)
+        and skipped maps other subdirectories to the reason they were skipped
+    """
+    pairs, skipped = [], {}
+    for folder in sorted(p for p in Path(directory).iterdir() if p.is_dir()):
+        scores = sorted(p for p in folder.iterdir() if p.suffix.lower() in SCORE_SUFFIXES)
+        if len(scores) == 2:
+            pairs.append((scores[0], scores[1], f"{folder.name}.musicxml"))
+        else:
+            skipped[str(folder)] = f"expected two MusicXML files, found {len(scores)}"
+    return pairs, skipped
+
+
+def resolve(differences, policy):
+    """
+    Decide every difference of a compare_scores result by `policy`.
+    Returns:
+        List of (part_id, measure_diff, source, severity) where source is
+        'score1' or 'score2'; severity is None unless the policy needed it.
+    Raises:
+        ConflictError: under fail-on-conflict, if there is any difference.
+    """
+    decisions = []
+    for part_diff in differences:
+        for measure_diff in part_diff['differences']:
+            severity = None
+            if policy == 'fail-on-conflict':
+                raise ConflictError(f"part {part_diff['part_name']}, measure {measure_diff['measure_number']} differs")
+            elif policy == 'prefer-score1':
+                source = 'score1'
+            elif policy == 'prefer-score2':
+                source = 'score2'
+            elif policy == 'prefer-lower-severity':
+                # Small corrections are taken from score2; anything bigger keeps score1
+                severity = measure_severity(measure_diff['score1_measure'], measure_diff['score2_measure'])
+                source = 'score2' if severity < SEVERITY_THRESHOLD else 'score1'
+            else:
+                raise ValueError(f"unknown policy {policy!r}; choose from {', '.join(POLICIES)}")
+            decisions.append((part_diff['part_id'], measure_diff, source, severity))
+    return decisions
+
+
+def _output_key(path):
+    # Names differing only in case are one file on some file systems
+    return str(path).casefold()
+
+
+def output_paths(pairs, output_dir):
+    """
+    Where each pair's merge is written: its output name if given, else
+    `<score1 stem>_<score2 stem>.musicxml`, numbered (`_2`, `_3`, ...)
+    when that is already taken by another pair.
+    Returns:
+        List of paths under `output_dir`, one per pair
+    Raises:
+        ValueError: if two pairs are given the same output name
+    """
+    output_dir = Path(output_dir)
+    taken = {}
+    for score1, score2, name in pairs:
+        if name:
+            key = _output_key(output_dir / name)
+            if key in taken:
+                raise ValueError(f"{taken[key][0]} + {taken[key][1]} and {score1} + {score2} "
+                                 f"are both written to {output_dir / name}")
+            taken[key] = (score1, score2)
+
+    paths = []
+    for score1, score2, name in pairs:
+        if name:
+            paths.append(output_dir / name)
+            continue
+        stem = f"{Path(score1).stem}_{Path(score2).stem}"
+        path, number = output_dir / f"{stem}.musicxml", 1
+        while _output_key(path) in taken:
+            number += 1
+            path = output_dir / f"{stem}_{number}.musicxml"
+        taken[_output_key(path)] = (score1, score2)
+        paths.append(path)
+    return paths
+
+
+def merge_pair(score1_path, score2_path, output, policy, cache=None):
+    """
+    Merge one pair of MusicXML files without asking, following `policy`,
+    and write the result to `output`. `cache` works as in load_score.
+    Returns:
+        Summary dict:
+        {
+            'score1': str, 'score2': str, 'output': str or None,
+            'status': 'merged' | 'conflict' | 'error',
+            'differences': int,      # differing measures found
+            'taken': int,            # of which score2's version was kept
+            'error': str or None
+        }
+    """
+    summary = {'score1': str(score1_path), 'score2': str(score2_path), 'output': None,
+               'status': 'merged', 'differences': 0, 'taken': 0, 'error': None}
+    try:
+        score1 = load_score(score1_path, cache)
+        score2 = load_score(score2_path, cache)
+        differences = compare_scores(score1, score2)
+        summary['differences'] = sum(len(part_diff['differences']) for part_diff in differences)
+
+        merge = MergeOverlay(score1)
+        for part_id, measure_diff, source, severity in resolve(differences, policy):
+            if source == 'score2':
+                merge.choose(part_id, measure_diff)
+                summary['taken'] += 1
+
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        write_merge(merge, output)
+        summary['output'] = str(output)
+    except ConflictError as e:
+        summary['status'] = 'conflict'
+        summary['error'] = str(e)
+    except Exception as e:
+        summary['status'] = 'error'
+        summary['error'] = f"{type(e).__name__}: {e}"
+    return summary
+
+
+def batch_merge(pairs, output_dir, policy, cache=None, max_workers=None):
+    """
+    Merge many pairs of scores headlessly, spread over worker processes.
+    `pairs` is a list of (score1, score2, output name or None), as from
+    read_manifest or find_pairs; merged files are written to `output_dir`
+    (see output_paths), which is checked before any pair is merged.
+    Yields:
+        The merge_pair summary of each pair as soon as it is done
+    Raises:
+        ValueError: for an unknown policy, or two pairs with the same output name
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"unknown policy {policy!r}; choose from {', '.join(POLICIES)}")
+    jobs = [(score1, score2, output, policy, cache)
+            for (score1, score2, _), output in zip(pairs, output_paths(pairs, output_dir))]
+
+    if len(jobs) <= 1 or max_workers == 1:
+        for job in jobs:
+            yield merge_pair(*job)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(merge_pair, *job) for job in jobs]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def write_summary(summaries, path, skipped=None):
+    """
+    Write a batch summary as JSON: totals per status, then one entry per
+    pair (sorted by score1) and the inputs that were skipped.
+    """
+    summaries = sorted(summaries, key=lambda summary: (summary['score1'], summary['score2']))
+    totals = {status: 0 for status in ('merged', 'conflict', 'error')}
+    for summary in summaries:
+        totals[summary['status']] += 1
+    report = {'totals': totals, 'pairs': summaries, 'skipped': skipped or {}}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return report
@@ -1,23 +1,202 @@
 import argparse
+import sys
+import time
 from pathlib import Path
-from music21 import converter
-from .core import interactive_merge
+from . import tracing
+from .batch import POLICIES, batch_merge, find_pairs, read_manifest, write_summary
+from .core import MergeOverlay, compare_scores, interactive_merge
+from .loader import ParseCache, ScoreLoadError, load_scores_parallel
+from .mxl import DEFAULT_COMPRESSION, write_score
+from .nway import interactive_n_way_merge, n_way_merge
+from .session import default_session_path, start_session
+from .splice import write_merge
+from .watch import FileWatcher, reload_score, update_differences
 
-def main():
-    parser = argparse.ArgumentParser(description="Merge two MusicXML scores.")
+def batch_main(argv):
+    parser = argparse.ArgumentParser(prog="musicmerge batch",
+                                     description="Merge many pairs of MusicXML scores without prompting.")
+    parser.add_argument("pairs", help="CSV manifest (score1,score2[,output] per row) or a directory "
+                                      "whose subdirectories each hold two scores")
+    parser.add_argument("--policy", choices=POLICIES, required=True,
+                        help="How to settle each differing measure")
+    parser.add_argument("-o", "--output-dir", default="merged", help="Directory for the merged files")
+    parser.add_argument("-j", "--jobs", type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--summary", help="Summary JSON file (default: OUTPUT_DIR/summary.json)")
+    parser.add_argument("--cache-dir", help="Directory for cached parses (default: ~/.cache/musicmerge)")
+    parser.add_argument("--no-cache", action="store_true", help="Always parse the input files")
+    args = parser.parse_args(argv)
+
+    skipped = {}
+    try:
+        if Path(args.pairs).is_dir():
+            pairs, skipped = find_pairs(args.pairs)
+        else:
+            pairs = read_manifest(args.pairs)
+    except (OSError, ValueError) as e:
+        parser.exit(2, f"Failed to read {args.pairs}: {e}\n")
+    for folder, reason in skipped.items():
+        print(f"skipped  {folder}: {reason}")
+
+    cache = False if args.no_cache else ParseCache(args.cache_dir)
+    summaries = []
+    try:
+        for summary in batch_merge(pairs, args.output_dir, args.policy, cache, args.jobs):
+            summaries.append(summary)
+            detail = summary['output'] if summary['status'] == 'merged' else summary['error']
+            print(f"{summary['status']:8} {summary['score1']} + {summary['score2']}: {detail}")
+    except ValueError as e:
+        # Raised before any pair is merged
+        parser.exit(2, f"{e}\n")
+
+    summary_path = args.summary or str(Path(args.output_dir) / "summary.json")
+    Path(summary_path).parent.mkdir(parents=True, exist_ok=True)
+    report = write_summary(summaries, summary_path, skipped)
+    totals = report['totals']
+    print(f"{totals['merged']} merged, {totals['conflict']} conflict(s), {totals['error']} error(s); "
+          f"summary saved to {summary_path}")
+    # Anything not merged fails the run, so pipelines notice
+    return 0 if totals['merged'] == len(summaries) else 1
+
+def _describe(part_diff, measure_diff):
+    where = {'insert': "only in score2", 'delete': "only in score1"}.get(measure_diff['operation'], "differs")
+    return f"{part_diff['part_name']}, measure {measure_diff['measure_number']}: {where}"
+
+def watch_main(argv):
+    parser = argparse.ArgumentParser(prog="musicmerge watch",
+                                     description="Compare two MusicXML scores again each time either is saved.")
     parser.add_argument("score1", help="First MusicXML file")
     parser.add_argument("score2", help="Second MusicXML file")
-    parser.add_argument("-o", "--output", default="merged.musicxml", help="Output file")
-    args = parser.parse_args()
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between checks for changes")
+    parser.add_argument("--cache-dir", help="Directory for cached parses (default: ~/.cache/musicmerge)")
+    parser.add_argument("--no-cache", action="store_true", help="Always parse the input files")
+    args = parser.parse_args(argv)
+
+    cache = False if args.no_cache else ParseCache(args.cache_dir)
+    paths = [args.score1, args.score2]
+    watcher = FileWatcher(paths)
+    try:
+        loaded = [reload_score(path, cache) for path in paths]
+    except Exception as e:
+        parser.exit(1, f"Failed to load files:\n{e}\n")
+    differences = compare_scores(loaded[0][0], loaded[1][0], loaded[0][1], loaded[1][1])
+    for part_diff in differences:
+        for measure_diff in part_diff['differences']:
+            print(_describe(part_diff, measure_diff))
+    print(f"{sum(len(p['differences']) for p in differences)} difference(s). "
+          f"Watching for changes (Ctrl+C to stop)...")
+
+    try:
+        while True:
+            time.sleep(args.interval)
+            changed = watcher.poll()
+            if not changed:
+                continue
+            previous = (loaded[0][0], loaded[1][0], loaded[0][1], loaded[1][1])
+            reloaded = {}
+            try:
+                for index in changed:
+                    # Only the saved file is read again
+                    reloaded[index] = reload_score(paths[index], cache)
+            except Exception as e:
+                # Keep comparing against the versions last read in full
+                print(f"Could not re-read {paths[index]}: {e}")
+                continue
+            for index, entry in reloaded.items():
+                loaded[index] = entry
+            old = {id(m): (p, m) for p in differences for m in p['differences']}
+            differences, parts = update_differences(differences, loaded[0][0], loaded[1][0],
+                                                    loaded[0][1], loaded[1][1], previous)
+            new = {id(m): (p, m) for p in differences for m in p['differences']}
+            print(f"\n{', '.join(paths[index] for index in changed)} changed; "
+                  f"{len(parts)} part(s) compared again")
+            for key, entry in old.items():
+                if key not in new:
+                    print(f"  - {_describe(*entry)}")
+            for key, entry in new.items():
+                if key not in old:
+                    print(f"  + {_describe(*entry)}")
+            print(f"{len(new)} difference(s).")
+    except KeyboardInterrupt:
+        return 0
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ["batch"]:
+        sys.exit(batch_main(argv[1:]))
+    if argv[:1] == ["watch"]:
+        sys.exit(watch_main(argv[1:]))
 
-    # Load scores
-    score1 = converter.parse(args.score1)
-    score2 = converter.parse(args.score2)
+    parser = argparse.ArgumentParser(description="Merge two MusicXML scores, or several versions of one score.",
+                                     epilog="Run 'musicmerge batch -h' to merge many pairs without prompting, "
+                                            "or 'musicmerge watch -h' to follow two scores as they are edited.")
+    parser.add_argument("scores", nargs='+', metavar="score",
+                        help="MusicXML files: two to compare, or with --base any number of edited versions")
+    parser.add_argument("--base", help="Common ancestor of the scores, for a three-way or N-way merge")
+    parser.add_argument("-o", "--output", default="merged.musicxml",
+                        help="Output file; a name ending in .mxl is written as compressed MusicXML")
+    parser.add_argument("--compression-level", type=int, choices=range(10), default=DEFAULT_COMPRESSION,
+                        metavar="0-9", help=f"zlib level of .mxl output (default: {DEFAULT_COMPRESSION})")
+    parser.add_argument("--cache-dir", help="Directory for cached parses (default: ~/.cache/musicmerge)")
+    parser.add_argument("--no-cache", action="store_true", help="Always parse the input files")
+    parser.add_argument("--fresh", action="store_true",
+                        help="Start the review over instead of resuming where it was left")
+    parser.add_argument("--trace", metavar="FILE", help="Write a Chrome trace of each stage to FILE "
+                                                        "(open it in https://ui.perfetto.dev)")
+    args = parser.parse_args(argv)
+    if len(args.scores) < 2 or (len(args.scores) > 2 and not args.base):
+        parser.error("give two scores, or --base and two or more edited versions")
 
-    # Merge and save
-    merged = interactive_merge(score1, score2)
-    merged.write('musicxml', args.output)
-    print(f"Merged score saved to {args.output}")
+    if args.trace:
+        tracing.start()
+    try:
+        # Load scores into the compact model; music21 is only used for output
+        cache = False if args.no_cache else ParseCache(args.cache_dir)
+        if args.base and len(args.scores) > 2:
+            # Every version against the one base; identical edits are reviewed once
+            try:
+                scores = load_scores_parallel(args.scores + [args.base], cache)
+            except ScoreLoadError as e:
+                parser.exit(1, f"Failed to load files:\n{e}\n")
+            result = n_way_merge(scores[-1], scores[:-1])
+            print(f"{result['auto_resolved']} measure(s) merged automatically, "
+                  f"{len(result['conflicts'])} conflict(s) to review.")
+            merged = interactive_n_way_merge(result, [Path(path).name for path in args.scores])
+            session = None
+        else:
+            # Progress is kept in a session, so an interrupted review resumes where it stopped
+            files = {'score1': args.scores[0], 'score2': args.scores[1], 'base': args.base}
+            try:
+                session, resumed = start_session(files, default_session_path(files, args.cache_dir),
+                                                 cache, resume=not args.fresh)
+            except ScoreLoadError as e:
+                parser.exit(1, f"Failed to load files:\n{e}\n")
+            if resumed == 'unchanged':
+                print(f"Resuming the previous review: {session.undecided()} difference(s) left.")
+            elif resumed == 'changed':
+                print(f"The scores changed since the previous review; earlier choices were kept where "
+                      f"they still apply, {session.undecided()} difference(s) left.")
+            elif args.base:
+                # Changes made on one side only are merged without asking
+                print(f"{session.auto_resolved} measure(s) merged automatically, "
+                      f"{session.undecided()} conflict(s) to review.")
+            merged = interactive_merge(session.score1, session.score2, session=session, build=False)
+        if isinstance(merged, MergeOverlay):
+            # Only the measures taken from score2 are rewritten, into score1's own file
+            write_merge(merged, args.output, args.compression_level)
+        else:
+            with tracing.span('write musicxml'):
+                write_score(merged, args.output, args.compression_level)
+        print(f"Merged score saved to {args.output}")
+        if session is not None and not session.undecided():
+            session.delete()
+        elif session is not None and session.journaled:
+            # Fold the journal into the session file
+            session.save()
+    finally:
+        if args.trace:
+            tracing.write(args.trace)
+            print(f"Trace saved to {args.trace}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,247 @@
+import functools
+import hashlib
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.recfunctions import repack_fields
+
+from . import notation, tracing
+from .align import align_measures
+
+# Integer ticks per quarter note for onsets and durations (divisible by 1-10, 12, 14, 16, ...)
+DIVISIONS = 10080
+
+NOTE_DTYPE = np.dtype([
+    ('measure', 'i4'),        # Measure index within the part
+    ('voice', 'i2'),          # Voice number, 0 outside voices
+    ('onset', 'i8'),          # Ticks from the start of the measure
+    ('duration', 'i8'),       # Ticks
+    ('kind', 'i1'),           # KIND_NOTE, KIND_CHORD or KIND_REST
+    ('pitch', 'i2'),          # MIDI pitch (lowest note of a chord), -1 for rests
+    ('pitch_mask', 'u2'),     # Pitch-class bitmask of all sounding pitches
+    ('spelling', 'u8'),       # spelling_code of the spelled pitches, 0 for rests
+    ('articulation', 'u4'),   # Bitset of ARTICULATION_BITS
+    ('stem', 'i1'),           # STEM_CODES
+])
+
+MEASURE_DTYPE = np.dtype([
+    ('number', 'i4'),
+    ('beats', 'i2'),          # Time signature set in this measure, 0 if none
+    ('beat_type', 'i2'),
+    ('clef', 'i2'),           # Clef set in this measure (clef_code), 0 if none
+])
+
+KIND_NOTE, KIND_CHORD, KIND_REST = 0, 1, 2
+
+STEM_CODES = {None: 0, 'unspecified': 0, 'up': 1, 'down': 2, 'noStem': 3, 'double': 4}
+
+ARTICULATIONS = (
+    'Accent', 'StrongAccent', 'Staccato', 'Staccatissimo', 'Spiccato', 'Tenuto',
+    'DetachedLegato', 'Stress', 'Unstress', 'BreathMark', 'Caesura', 'Scoop',
+    'Plop', 'Doit', 'Falloff', 'UpBow', 'DownBow', 'Harmonic', 'OpenString',
+    'Stopped', 'Pizzicato', 'SnapPizzicato', 'NailPizzicato', 'DoubleTongue',
+    'TripleTongue', 'HammerOn', 'PullOff', 'FretBend', 'FretTap', 'Fingering',
+    'StringFingering',
+)
+ARTICULATION_BITS = {name: 1 << i for i, name in enumerate(ARTICULATIONS)}
+# Any articulation not listed above
+OTHER_ARTICULATION = 1 << 31
+
+CLEF_SIGNS = {'G': 1, 'F': 2, 'C': 3, 'percussion': 4, 'TAB': 5, 'jianpu': 6, 'none': 7}
+
+
+def clef_code(sign, line, octave_change):
+    """Pack a clef into a small integer; 0 means no clef."""
+    if sign is None:
+        return 0
+    return CLEF_SIGNS.get(sign, 8) * 100 + (line or 0) * 10 + (octave_change or 0) + 5
+
+
+def _ticks(quarter_length):
+    return int(round(quarter_length * DIVISIONS))
+
+
+def _articulation_bits(names):
+    bits = 0
+    for name in names:
+        bits |= ARTICULATION_BITS.get(name, OTHER_ARTICULATION)
+    return bits
+
+
+def _voice_number(voice):
+    try:
+        return int(voice)
+    except (TypeError, ValueError):
+        return 0
+
+
+@functools.lru_cache(maxsize=4096)
+def spelling_code(pitches):
+    """
+    Pack spelled pitch names (e.g. ('C#4', 'E4'), as in fingerprints) into a
+    64-bit integer, so respellings that sound the same still differ.
+    """
+    if not pitches:
+        return 0
+    return int.from_bytes(hashlib.blake2b(repr(pitches).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _pitch_fields(midis):
+    mask = 0
+    for midi in midis:
+        mask |= 1 << (midi % 12)
+    return min(midis), mask
+
+
+def _finish(part_id, part_name, rows, measure_rows):
+    # Rows are kept in fingerprint order, so measures with equal fingerprints have equal rows
+    notes = np.array(rows, dtype=NOTE_DTYPE)
+    return {
+        'part_id': part_id,
+        'part_name': part_name,
+        'notes': notes,
+        'measures': np.array(measure_rows, dtype=MEASURE_DTYPE),
+    }
+
+
+def _notation_part_columns(part):
+    rows, measure_rows = [], []
+    for index, measure in enumerate(part.measures):
+        beats, beat_type = (measure.time_signature.split('/') if measure.time_signature else (0, 0))
+        clef = measure.clef
+        measure_rows.append((
+            measure.number,
+            int(beats) if str(beats).isdigit() else 0,
+            int(beat_type) if str(beat_type).isdigit() else 0,
+            clef_code(clef.sign, clef.line, clef.octave_change) if clef is not None else 0,
+        ))
+        # Same order as Measure.fingerprint: by voice, then by onset
+        voices = {}
+        for element in measure.notes:
+            voices.setdefault(element.voice, []).append(element)
+        for element in (e for elements in voices.values() for e in sorted(elements, key=lambda e: e.onset)):
+            pitches = element.pitches
+            if element.is_rest:
+                kind, pitch, mask = KIND_REST, -1, 0
+            else:
+                kind = KIND_CHORD if len(pitches) > 1 else KIND_NOTE
+                notes = element.notes if isinstance(element, notation.Chord) else (element,)
+                pitch, mask = _pitch_fields([n.midi for n in notes])
+            rows.append((index, _voice_number(element.voice), _ticks(element.onset),
+                         _ticks(element.duration), kind, pitch, mask, spelling_code(pitches),
+                         _articulation_bits(element.articulations), STEM_CODES.get(element.stem, 0)))
+    return _finish(part.id, part.name, rows, measure_rows)
+
+
+def _music21_row(element, index=0, voice=None, onset=0):
+    if element.isRest:
+        kind, pitch, mask = KIND_REST, -1, 0
+    else:
+        kind = KIND_CHORD if element.isChord else KIND_NOTE
+        pitch, mask = _pitch_fields([p.midi for p in element.pitches])
+    return (index, _voice_number(voice), _ticks(onset), _ticks(element.duration.quarterLength), kind, pitch, mask,
+            spelling_code(tuple(p.nameWithOctave for p in element.pitches)),
+            _articulation_bits(type(a).__name__ for a in element.articulations),
+            STEM_CODES.get(getattr(element, 'stemDirection', None), 0))
+
+
+def note_rows(elements):
+    """
+    NOTE_DTYPE rows of music21 notes, chords and rests, e.g. to compare
+    them with core.calculate_differences. Measure, voice and onset are 0.
+    """
+    return np.array([_music21_row(element) for element in elements], dtype=NOTE_DTYPE)
+
+
+def _music21_part_columns(part):
+    rows, measure_rows = [], []
+    for index, measure in enumerate(part.getElementsByClass('Measure')):
+        time_signature = measure.timeSignature
+        clef = measure.clef
+        measure_rows.append((
+            measure.number,
+            time_signature.numerator if time_signature is not None else 0,
+            time_signature.denominator if time_signature is not None else 0,
+            clef_code(clef.sign, clef.line, clef.octaveChange) if clef is not None else 0,
+        ))
+        for element in measure.recurse().notesAndRests:
+            site = element.activeSite
+            voice = site.id if site is not measure and 'Voice' in site.classes else None
+            rows.append(_music21_row(element, index, voice, element.getOffsetInHierarchy(measure)))
+    return _finish(part.id, part.partName, rows, measure_rows)
+
+
+@tracing.traced('columns')
+def score_columns(score):
+    """
+    Build the columnar representation of a score: one NumPy structured array
+    of notes (NOTE_DTYPE) and one of measures (MEASURE_DTYPE) per part.
+
+    `score` may be a music21 Score, a compact notation.Score or a path to a
+    MusicXML file (read with notation.read_score, without music21).
+    Returns:
+        List of dicts, one per part in score order:
+        {'part_id': str, 'part_name': str, 'notes': np.ndarray, 'measures': np.ndarray}
+    """
+    if isinstance(score, (str, Path)):
+        score = notation.read_score(score)
+    if isinstance(score, notation.Score):
+        return [_notation_part_columns(part) for part in score.parts]
+    return [_music21_part_columns(part) for part in score.parts]
+
+
+def differing_measures(part1, part2):
+    """
+    Find the measures that differ between two parts with the same number of
+    measures, using whole-array operations only. Pitches are compared as
+    spelled, like fingerprints, so a respelling (C# vs Db) is a difference.
+    Returns:
+        Sorted array of measure indices that differ, or None if the parts
+        have different numbers of measures and need aligning first.
+    """
+    measures1, measures2 = part1['measures'], part2['measures']
+    if len(measures1) != len(measures2):
+        return None
+    count = len(measures1)
+    notes1, notes2 = part1['notes'], part2['notes']
+
+    # Time signature / clef changes, and measures with a different number of rows
+    diff = measures1[['beats', 'beat_type', 'clef']] != measures2[['beats', 'beat_type', 'clef']]
+    diff |= np.bincount(notes1['measure'], minlength=count) != np.bincount(notes2['measure'], minlength=count)
+
+    # Remaining measures have equal row counts, so their rows line up one to one
+    rows1 = notes1[~diff[notes1['measure']]]
+    rows2 = notes2[~diff[notes2['measure']]]
+    diff[rows1['measure'][rows1 != rows2]] = True
+
+    return np.flatnonzero(diff)
+
+
+def measure_keys(part):
+    """
+    One bytes key per measure of a part's columns, covering everything
+    differing_measures compares except the measure number: two measures
+    have equal keys exactly when their rows are equal.
+    """
+    notes, measures = part['notes'], part['measures']
+    rows = repack_fields(notes[[name for name in NOTE_DTYPE.names if name != 'measure']])
+    heads = repack_fields(measures[['beats', 'beat_type', 'clef']])
+    data, size = rows.tobytes(), rows.dtype.itemsize
+    head, head_size = heads.tobytes(), heads.dtype.itemsize
+    bounds = np.searchsorted(notes['measure'], np.arange(len(measures) + 1)).tolist()
+    return [head[k * head_size:(k + 1) * head_size] + data[bounds[k] * size:bounds[k + 1] * size]
+            for k in range(len(measures))]
+
+
+def align_part_columns(part1, part2):
+    """
+    align_measures for two parts given as columns, without fingerprints:
+    parts of equal length are compared with differing_measures, and the
+    measure keys are only built when a realignment has to be tried.
+    Returns:
+        Edits as from align_measures
+    """
+    mismatches = differing_measures(part1, part2)
+    if mismatches is not None and len(mismatches) == 0:
+        return []
+    return align_measures(measure_keys(part1), measure_keys(part2), mismatches)
@@ -1,12 +1,36 @@
-from music21 import converter, stream, note, chord, expressions
 import copy
 
-from music21.musicxml.testPrimitive import articulations01
+import numpy as np
 
+from . import notation, tracing
+from .align import align_measures, align_notes
+from .columnar import DIVISIONS, align_part_columns, note_rows
+from .fingerprint import measure_fingerprint, part_fingerprints, score_fingerprints
+from .index import ScoreIndex
+from .mxl import DEFAULT_COMPRESSION, write_score
+from .prefilter import prefiltered_alignment
+from .splice import write_merge
 
-def compare_scores(score1, score2):
+
+@tracing.traced('compare_scores')
+def compare_scores(score1, score2, fingerprints1=None, fingerprints2=None,
+                   columns1=None, columns2=None):
     """
         Compare two scores and return differences organized by part.
+
+        Measures of each part are aligned with a Myers diff over their
+        fingerprints, so inserted or deleted bars do not shift every later
+        measure. Measures whose fingerprints match are skipped without a
+        note-by-note walk. For compact scores, measures whose MusicXML is
+        the same in both files (but for layout) are matched first and not
+        fingerprinted at all (see prefilter). Pass the result of score_fingerprints() for either
+        score to reuse hashes computed when the score was loaded. Pass the
+        result of columnar.score_columns() for both scores to align the parts
+        from their columns instead: measures are compared with whole-array
+        operations, and only the measures reported are fingerprinted.
+
+        Works on music21 scores or on compact notation.Score objects from
+        notation.read_score; the measures in the result are of the same kind.
         Returns:
 
         List of dictionaries, where each dict represents a part and its differing measures.
@@ -17,8 +41,12 @@ def compare_scores(score1, score2):
                 'differences': [      # List of differing measures
                     {
                         'measure_number': int,
-                        'score1_measure': music21.stream.Measure,
-                        'score2_measure': music21.stream.Measure
+                        'operation': str,     # 'modify', 'insert' or 'delete'
+                        'score1_measure': music21.stream.Measure,  # None for 'insert'
+                        'score2_measure': music21.stream.Measure,  # None for 'delete'
+                        'score1_fingerprint': str,
+                        'score2_fingerprint': str,
+                        'after_measure_number': int   # 'insert' only, None at the start
                     },
                     ...
                 ]
@@ -28,182 +56,375 @@ def compare_scores(score1, score2):
     """
 
     differences = []
-
-    for part1, part2 in zip(score1.parts, score2.parts):
-        part_diff = {
-            'part_id': part1.id,
-            'part_name': part1.partName,
-            'differences': []
-        }
-
-        # Ensure both parts have the same number of measures
-        measures1 = list(part1.getElementsByClass('Measure'))
-        measures2 = list(part2.getElementsByClass('Measure'))
-
-        if len(measures1) != len(measures2):
-            raise ValueError("Parts have different numbers of measures!")
-
-        # Compare each measure
-        for measure1, measure2 in zip(measures1, measures2):
-            # Check for differences in notes/chords
-            has_diff = False
-            if len(measure1.notes) != len(measure2.notes):
-                has_diff = True
-            else:
-                for n1, n2 in zip(measure1.notes, measure2.notes):
-                    if (isinstance(n1, note.Note)) and (isinstance(n2, note.Note)):
-                        if calculate_difference(n1, n2) >= 0:
-                            has_diff = True
-                            break
-                    elif (isinstance(n1, chord.Chord)) and (isinstance(n2, chord.Chord)):
-                        if n1.pitches != n2.pitches or n1.duration != n2.duration:
-                            has_diff = True
-                            break
-                    else:
-                        # Handle cases where one is a Note and the other is a Chord
-                        has_diff = True
-                        break
-
-            # Check other elements (time signatures, clefs, etc.)
-            if (measure1.timeSignature != measure2.timeSignature or
-                measure1.clef != measure2.clef):
-                has_diff = True
-
-            if has_diff:
-                part_diff['differences'].append({
-                    'measure_number': measure1.number,
-                    'score1_measure': measure1,
-                    'score2_measure': measure2
-                })
-
+    for _, _, part_diff in iter_compare_parts(score1, score2, fingerprints1, fingerprints2,
+                                              columns1, columns2):
         # Only add parts with differences
         if part_diff['differences']:
             differences.append(part_diff)
 
     return differences
 
-def show_differences(measure1, measure2):
+def iter_compare_parts(score1, score2, fingerprints1=None, fingerprints2=None,
+                       columns1=None, columns2=None):
     """
-    Show a measure with differing notes/chords highlighted in red.
-    Works for both Notes and Chords.
+    compare_scores one part at a time, for callers that show progress or
+    start on the first parts early.
+    Yields:
+        (k, count, part_diff) for every part in score order, including parts
+        whose 'differences' list is empty
     """
-    # Create a new measure to hold the highlighted version
-    highlighted_measure = stream.Measure(number=measure1.number)
+    use_columns = columns1 is not None and columns2 is not None
+    # Unless the caller already has fingerprints or columns, measures that
+    # are the same in both files are found first and never fingerprinted
+    prefilter = (not use_columns and fingerprints1 is None and fingerprints2 is None and
+                 isinstance(score1, notation.Score) and isinstance(score2, notation.Score))
+    if fingerprints1 is None:
+        fingerprints1 = [None] * len(score1.parts) if prefilter or use_columns else score_fingerprints(score1)
+    if fingerprints2 is None:
+        fingerprints2 = [None] * len(score2.parts) if prefilter or use_columns else score_fingerprints(score2)
+    if not use_columns:
+        columns1 = columns2 = [None] * len(fingerprints1)
+
+    count = min(len(score1.parts), len(score2.parts))
+    for k, (part1, part2, part_fps1, part_fps2, part_cols1, part_cols2) in enumerate(zip(
+            score1.parts, score2.parts, fingerprints1, fingerprints2, columns1, columns2)):
+        with tracing.span('compare part', part=k, measures=len(_part_measures(part1))):
+            part_diff = compare_part(part1, part2, part_fps1, part_fps2, part_cols1, part_cols2, prefilter)
+        yield k, count, part_diff
+
+def compare_part(part1, part2, fingerprints1=None, fingerprints2=None, columns1=None, columns2=None,
+                 prefilter=False):
+    """
+    Compare one pair of parts, as compare_scores does for each: from their
+    columns if given, else measures identical in the file first (with `prefilter`,
+    compact parts only), else from their fingerprints (computed if None).
+    Returns:
+        The part entry of compare_scores, with a possibly empty 'differences' list
+    """
+    prefiltered = prefiltered_alignment(part1, part2) if prefilter else None
+    if prefiltered is not None:
+        edits, fingerprints1, fingerprints2 = prefiltered
+    elif columns1 is not None:
+        # Fingerprints of the measures reported are computed by part_differences
+        edits = align_part_columns(columns1, columns2)
+    else:
+        if fingerprints1 is None:
+            fingerprints1, fingerprints2 = part_fingerprints(part1), part_fingerprints(part2)
+        # Align measures; identical content hashes are matched without a note walk
+        edits = align_measures(fingerprints1, fingerprints2)
+    return part_differences(part1, part2, fingerprints1, fingerprints2, edits)
+
+def _fingerprint_at(fingerprints, measures, index):
+    if fingerprints is None:
+        return measure_fingerprint(measures[index])
+    return fingerprints[index]
+
+def part_differences(part1, part2, fingerprints1, fingerprints2, edits):
+    """
+    Turn the measure alignment of one part (from align_measures) into the
+    part entry returned by compare_scores. Modified measures that turn out
+    to be equal note by note are dropped. Either list of fingerprints may be
+    None, to fingerprint only the measures in `edits`.
+    """
+    part_diff = {
+        'part_id': part1.id,
+        'part_name': _part_name(part1),
+        'differences': []
+    }
 
-    # Copy all elements (clefs, time signatures, etc.) from measure1
-    for elem in measure1.elements:
-        if not isinstance(elem, (note.Note, chord.Chord, note.Rest)):
-            highlighted_measure.insert(elem.offset, copy.deepcopy(elem))
+    measures1 = _part_measures(part1)
+    measures2 = _part_measures(part2)
+
+    for operation, i, j in edits:
+        if operation == 'modify':
+            measure1, measure2 = measures1[i], measures2[j]
+            if not measures_differ(measure1, measure2):
+                continue
+            measure_diff = {
+                'measure_number': measure1.number,
+                'operation': operation,
+                'score1_measure': measure1,
+                'score2_measure': measure2,
+                'score1_fingerprint': _fingerprint_at(fingerprints1, measures1, i),
+                'score2_fingerprint': _fingerprint_at(fingerprints2, measures2, j)
+            }
+        elif operation == 'delete':
+            measure_diff = {
+                'measure_number': measures1[i].number,
+                'operation': operation,
+                'score1_measure': measures1[i],
+                'score2_measure': None,
+                'score1_fingerprint': _fingerprint_at(fingerprints1, measures1, i),
+                'score2_fingerprint': None
+            }
+        else:
+            measure_diff = {
+                'measure_number': measures2[j].number,
+                'operation': operation,
+                'score1_measure': None,
+                'score2_measure': measures2[j],
+                'score1_fingerprint': None,
+                'score2_fingerprint': _fingerprint_at(fingerprints2, measures2, j),
+                'after_measure_number': measures1[i - 1].number if i > 0 else None
+            }
 
-    if len(measure1.notesAndRests) != len(measure2.notesAndRests):
-        for n in measure1.notesAndRests:
-            nc = copy.deepcopy(n)
-            nc.style.color = '#ff0000'  # Highlight in red
-            highlighted_measure.insert(n.offset, nc)
-        return highlighted_measure
+        part_diff['differences'].append(measure_diff)
 
-    # Compare notes/chords
-    for n1, n2 in zip(measure1.notesAndRests, measure2.notesAndRests):
-        # Case 1: Both are Notes/Chords and differ
-        if ((isinstance(n1, (note.Note, chord.Chord)) and
-             isinstance(n2, (note.Note, chord.Chord)))):
+    return part_diff
 
-            diff_met = calculate_difference(n1, n2)
+def _part_name(part):
+    return part.name if isinstance(part, notation.Part) else part.partName
 
-            colored_note = copy.deepcopy(n1)
-            if diff_met >= 0.8: # Major -> Red
-                colored_note.style.color = '#ff0000'
-            elif diff_met >= 0.3: # Moderate -> Reddish Orange
-                colored_note.style.color = '#ff5500'
-            elif diff_met >= 0.1: # Minor -> Orange
-                colored_note.style.color = '#ffbb00'
-            highlighted_measure.insert(n1.offset, colored_note)
+def _part_measures(part):
+    if isinstance(part, notation.Part):
+        return part.measures
+    return list(part.getElementsByClass('Measure'))
 
-        # Case 2: Rest or no difference -> copy as-is
-        else:
-            highlighted_measure.insert(n1.offset, copy.deepcopy(n1))
+def measures_differ(measure1, measure2):
+    """
+    Note-by-note comparison of two measures whose fingerprints differ.
+    """
+    # Compact measures carry no more detail than their fingerprints
+    if isinstance(measure1, notation.Measure):
+        return measure1.fingerprint() != measure2.fingerprint()
+
+    # Check for differences in notes/chords/rests, aligned by onset
+    for aligned in align_notes(measure1, measure2, calculate_differences):
+        if aligned['operation'] != 'match' or aligned['distance'] > 0:
+            return True
+        if (aligned['note1'].getOffsetInHierarchy(measure1) !=
+                aligned['note2'].getOffsetInHierarchy(measure2)):
+            return True
+
+    # Check other elements (time signatures, clefs, etc.)
+    if (measure1.timeSignature != measure2.timeSignature or
+        measure1.clef != measure2.clef):
+        return True
+
+    return False
+
+@tracing.traced('show_differences')
+def show_differences(measure1, measure2):
+    """
+    Show a measure with differing notes/chords highlighted in red.
+    Works for both Notes and Chords. Compact measures are converted to
+    music21 first.
+    """
+    measure1 = notation.to_music21(measure1)
+    measure2 = notation.to_music21(measure2)
+
+    # A measure that only exists in one score is highlighted in full
+    if measure1 is None or measure2 is None:
+        highlighted_measure = copy.deepcopy(measure1 if measure1 is not None else measure2)
+        for n in highlighted_measure.recurse().notesAndRests:
+            n.style.color = '#ff0000'
+        return highlighted_measure
+
+    # Copy measure1, keeping clefs, time signatures and voices intact
+    highlighted_measure = copy.deepcopy(measure1)
+    copies = dict(zip((id(n) for n in measure1.recurse().notesAndRests),
+                      highlighted_measure.recurse().notesAndRests))
+
+    # Compare notes/chords aligned by onset rather than by index
+    for aligned in align_notes(measure1, measure2, calculate_differences):
+        if aligned['operation'] == 'insert':
+            # Only present in measure2, nothing to colour in measure1
+            continue
+
+        colored_note = copies[id(aligned['note1'])]
+        if aligned['operation'] == 'delete':
+            colored_note.style.color = '#ff0000'
+            continue
+
+        diff_met = aligned['distance']
+        if diff_met >= 0.8: # Major -> Red
+            colored_note.style.color = '#ff0000'
+        elif diff_met >= 0.3: # Moderate -> Reddish Orange
+            colored_note.style.color = '#ff5500'
+        elif diff_met >= 0.1: # Minor -> Orange
+            colored_note.style.color = '#ffbb00'
 
     # Display in MuseScore
     return highlighted_measure
 
+def measure_severity(measure1, measure2):
+    """
+    How much a measure changed between two versions, on the scale of
+    calculate_difference: the largest difference of any aligned note pair.
+    Added or removed notes, clef or time signature changes, and measures
+    only present in one score count as 1.0.
+    """
+    measure1 = notation.to_music21(measure1)
+    measure2 = notation.to_music21(measure2)
+    if measure1 is None or measure2 is None:
+        return 1.0
+    if measure1.timeSignature != measure2.timeSignature or measure1.clef != measure2.clef:
+        return 1.0
+
+    severity = 0.0
+    for aligned in align_notes(measure1, measure2, calculate_differences):
+        if aligned['operation'] != 'match':
+            return 1.0
+        severity = max(severity, float(aligned['distance']))
+    return severity
+
+
+# Weight of each feature in calculate_difference(s)
+DIFFERENCE_WEIGHTS = {
+    'pitch': 0.8,  # Most musically significant
+    'duration': 0.5,
+    'articulation': 0.2,
+    'stem_direction': 0.1  # Least disruptive
+}
+
+def calculate_differences(notes1, notes2):
+    """
+    Weighted differences of many aligned note pairs in one NumPy pass.
 
-def calculate_difference(note1, note2):
-    weights = {
-        'pitch': 0.8,  # Most musically significant
-        'duration': 0.5,
-        'articulation': 0.2,
-        'stem_direction': 0.1  # Least disruptive
-    }
-
-    differences = {
-        'pitch': 0 if note1.pitch == note2.pitch else 1,
-        'duration': abs(note1.duration.quarterLength - note2.duration.quarterLength),
-        'articulation': 0 if note1.articulations == note2.articulations else 1,
-        'stem_direction': 0 if note1.stemDirection == note2.stemDirection else 1
-    }
+    notes1[k] is compared with notes2[k]. Both may be sequences of music21
+    notes, chords and rests (e.g. the note1/note2 of align_notes matches
+    across a whole part or score), which are turned into columnar rows
+    first, or columnar NOTE_DTYPE arrays. Pitches are compared as spelled,
+    like Measure.fingerprint, so a respelling (C# vs Db) is a difference.
+    Returns:
+        Float array with one weighted difference per pair
+    """
+    if not isinstance(notes1, np.ndarray):
+        notes1, notes2 = note_rows(notes1), note_rows(notes2)
+    pitch = (notes1['kind'] != notes2['kind']) | (notes1['spelling'] != notes2['spelling'])
+    duration = np.abs(notes1['duration'] - notes2['duration']) / DIVISIONS
+    articulation = notes1['articulation'] != notes2['articulation']
+    stem_direction = notes1['stem'] != notes2['stem']
 
     # Normalize duration difference to [0,1]
-    differences['duration'] = min(differences['duration'] / 4.0, 1.0)
-    to_return = sum(weights[feat] * differences[feat] for feat in weights)
-    return to_return
+    duration = np.minimum(duration / 4.0, 1.0)
+    # Summed in the same order as calculate_difference always has
+    return (DIFFERENCE_WEIGHTS['pitch'] * pitch +
+            DIFFERENCE_WEIGHTS['duration'] * duration +
+            DIFFERENCE_WEIGHTS['articulation'] * articulation +
+            DIFFERENCE_WEIGHTS['stem_direction'] * stem_direction)
+
+def calculate_difference(note1, note2):
+    return float(calculate_differences([note1], [note2])[0])
 
-def update_measure(target_score, part_name, measure_number, new_measure):
+def update_measure(target_score, part_name, measure_number, new_measure, index=None):
     """
     Replace a measure in `target_score` with `new_measure`.
+    `part_name` may also be a part id, which is unambiguous for PartStaffs.
+    Pass a ScoreIndex of target_score to avoid rebuilding it on every call.
     """
-    for part in target_score.parts:
-        if part.partName == part_name:
-            for m in part.getElementsByClass('Measure'):
-                if m.number == measure_number:
-                    part.replace(m, new_measure, recurse=True)
-                    break
-            break
+    if index is None:
+        index = ScoreIndex(target_score)
+    index.replace(part_name, measure_number, new_measure)
 
+def insert_measure(target_score, part_id, after_measure_number, new_measure, index=None):
+    """
+    Insert `new_measure` into `target_score` after measure `after_measure_number`
+    (at the start of the part when it is None), shifting later measures along.
+    """
+    if index is None:
+        index = ScoreIndex(target_score)
+    index.insert(part_id, after_measure_number, new_measure)
+
+def remove_measure(target_score, part_id, measure_number, index=None):
+    """
+    Remove a measure from `target_score`, shifting later measures back.
+    """
+    if index is None:
+        index = ScoreIndex(target_score)
+    index.remove(part_id, measure_number)
+
+@tracing.traced('show_highlighted_score')
 def show_highlighted_score(score, differences):
     """
     Display the score with highlighted differences.
+    Highlighted measures are built once per pair of measure fingerprints.
+    Parts without differences are shared with `score`, not copied.
     """
-    highlighted_score = copy.deepcopy(score)
-    for part in highlighted_score.parts:
-        for measure in part.getElementsByClass('Measure'):
-            for diff in differences:
-                if part.id == diff['part_id']:
-                    for measure_diff in diff['differences']:
-                        if measure.number == measure_diff['measure_number']:
-                            #print("\n measure number: " + str(measure_diff['measure_number']))
-                            #print(measure, measure_diff['score2_measure'], measure_diff['score1_measure'])
-                            highlighted_measure = show_differences(measure_diff['score2_measure'], measure_diff['score1_measure'])
-                            #print(highlighted_measure)
-                            part.replace(measure, highlighted_measure)
+    highlighted = {}
+    if isinstance(score, notation.Score):
+        highlighted_score = score.to_music21()
+    else:
+        highlighted_score = share_score(score, {diff['part_id'] for diff in differences})
+    index = ScoreIndex(highlighted_score)
+
+    for diff in differences:
+        for measure_diff in diff['differences']:
+            # Inserted measures have no counterpart in this score
+            if measure_diff['score1_measure'] is None:
+                continue
+            measure = index.measure(diff['part_id'], measure_diff['measure_number'])
+            if measure is None:
+                continue
+            key = (measure_diff.get('score2_fingerprint'), measure_diff.get('score1_fingerprint'))
+            if None not in key and key in highlighted:
+                highlighted_measure = copy.deepcopy(highlighted[key])
+                highlighted_measure.number = measure.number
+            else:
+                highlighted_measure = show_differences(measure_diff['score2_measure'], measure_diff['score1_measure'])
+                highlighted[key] = highlighted_measure
+            index.replace(diff['part_id'], measure.number, highlighted_measure)
 
     return highlighted_score
 
-def interactive_merge(score1, score2):
+def interactive_merge(score1, score2, differences=None, merge=None, session=None, build=True):
     """
     Interactively merge two scores, letting the user choose which measures to keep.
+    Either music21 scores or compact notation.Score objects may be passed;
+    music21 is only used for the measures shown and for the merged score.
+    `differences` and `merge` let a caller review only some differences
+    (e.g. the conflicts and overlay from threeway.three_way_merge).
+    With a session.MergeSession, its differences are reviewed instead,
+    differences decided in an earlier run are skipped, and every choice is
+    logged to the session so quitting loses nothing.
     Returns:
-        The merged score (initially a copy of score1, updated with user choices).
+        The merged score (a music21 score built from score1 and the user's
+        choices), or with build=False the MergeOverlay itself, e.g. for merge_export.
     """
 
+    if session is not None:
+        differences, merge = session.differences, session.merge
     # Step 1: Detect differences
-    differences = compare_scores(score1, score2)
+    if differences is None:
+        differences = compare_scores(score1, score2)
+    # Step 2: Record choices on an overlay of score1; only chosen measures are copied
+    if merge is None:
+        merge = MergeOverlay(score1)
     if not differences:
         print("No differences found. Scores are identical.")
-        return copy.deepcopy(score1)
+        return merge.build() if build else merge
 
-    # Step 2: Initialize new_score as a copy of score1
-    new_score = copy.deepcopy(score1)
-    print("New score created as a copy of score1.")
+    def decide(part_id, measure_diff, source):
+        if session is None:
+            merge.choose(part_id, measure_diff, source)
+            return
+        session.decide(part_id, measure_diff, source)
+        session.position = index + 1
+        session.log_decision(part_id, measure_diff)
 
     # Step 3: Iterate through parts with differences
+    index = -1
     for part_diff in differences:
+        part_id = part_diff['part_id']
         part_name = part_diff['part_name']
+        if session is not None and all(id(m) in session.decisions for m in part_diff['differences']):
+            index += len(part_diff['differences'])
+            continue
         print(f"\nChecking part: {part_name}")
 
         # Step 4: Iterate through differing measures in this part
         for measure_diff in part_diff['differences']:
+            index += 1
+            if session is not None and id(measure_diff) in session.decisions:
+                continue  # Decided before the session was resumed
             measure_number = measure_diff['measure_number']
-            print(f"\nMeasure {measure_number}: Differences detected.")
+            operation = measure_diff.get('operation', 'modify')
+            if operation == 'insert':
+                print(f"\nMeasure {measure_number}: Only present in score2.")
+            elif operation == 'delete':
+                print(f"\nMeasure {measure_number}: Only present in score1.")
+            else:
+                print(f"\nMeasure {measure_number}: Differences detected.")
 
             while True:
                 # Prompt user for action
@@ -219,32 +440,163 @@ def interactive_merge(score1, score2):
                 ).strip().lower()
 
                 # Handle user input
-                if user_input == 's1':
-                    measure_diff['score1_measure'].show('musicxml')
-                elif user_input == 's2':
-                    measure_diff['score2_measure'].show('musicxml')
+                if user_input in ('s1', 's2'):
+                    measure = measure_diff[f'score{user_input[1]}_measure']
+                    if measure is None:
+                        print(f"Measure {measure_number} is not present in score{user_input[1]}.")
+                    else:
+                        notation.to_music21(measure).show('musicxml')
                 elif user_input == 'n':
                     measure = show_differences(measure_diff['score1_measure'], measure_diff['score2_measure'])
                     measure.show()
                 elif user_input == 'c1':
                     print(f"Keeping measure {measure_number} from score1.")
+                    decide(part_id, measure_diff, 'score1')
                     break
                 elif user_input == 'c2':
                     print(f"Keeping measure {measure_number} from score2.")
-                    update_measure(new_score, part_name, measure_number, measure_diff['score2_measure'])
+                    decide(part_id, measure_diff, 'score2')
                     break
                 elif user_input == 'q':
                     print("Quitting merge early.")
-                    return new_score
+                    if session is not None:
+                        session.position = index
+                        session.save()
+                        print("Progress saved; run the same command again to resume.")
+                    return merge.build() if build else merge
                 else:
                     print("Invalid option. Try again.")
 
     print("\nMerge complete!")
-    return new_score
+    return merge.build() if build else merge
+
+@tracing.traced('copy score')
+def merge_base(score1):
+    """
+    Return a music21 copy of score1 to merge into.
+    """
+    if isinstance(score1, notation.Score):
+        return score1.to_music21()
+    return copy.deepcopy(score1)
+
+@tracing.traced('share score')
+def share_score(score, touched):
+    """
+    New music21 score holding the elements of `score` by reference. Parts
+    whose id is in `touched` get a new container holding the same measures,
+    so measures can be replaced, inserted or removed in them without
+    changing `score`.
+    """
+    from music21 import spanner, stream
+
+    merged = stream.Score()
+    containers = {}
+    for element in score:
+        offset = score.elementOffset(element)
+        if isinstance(element, stream.Part) and element.id in touched:
+            part = type(element)(id=element.id)
+            part.partName = element.partName
+            part.partAbbreviation = element.partAbbreviation
+            for part_element in element:
+                part.coreInsert(element.elementOffset(part_element), part_element)
+            part.coreElementsChanged()
+            containers[id(element)] = (element, part)
+            element = part
+        merged.coreInsert(offset, element)
+    merged.coreElementsChanged()
+
+    # Staff groups and other spanners must point at the new containers
+    for group in list(merged.getElementsByClass(spanner.Spanner)):
+        replaced = [containers[id(e)] for e in group.getSpannedElements() if id(e) in containers]
+        if replaced:
+            new_group = copy.deepcopy(group)  # Keeps references to the spanned parts
+            for old, new in replaced:
+                new_group.replaceSpannedElement(old, new)
+            merged.replace(group, new_group)
+    return merged
+
+class MergeOverlay:
+    """
+    Copy-on-write view of score1 with the measures chosen from score2.
+
+    Choosing only records the measure_diff (from compare_scores) under
+    (part_id, measure_number, operation); nothing is copied until build().
+    build() shares every untouched part and measure of score1 with the
+    merged score and copies only the measures taken from score2.
+    """
+    def __init__(self, score1):
+        self.score1 = score1
+        self.choices = {}
+
+    def choose(self, part_id, measure_diff, source='score2'):
+        """
+        Record which score a differing measure is taken from. score1 is the
+        base, so choosing it just drops any earlier choice of score2.
+        """
+        key = (part_id, measure_diff['measure_number'], measure_diff.get('operation', 'modify'))
+        self.choices.pop(key, None)
+        if source == 'score2':
+            self.choices[key] = measure_diff
+
+    def chosen_source(self, part_id, measure_number, operation='modify'):
+        return 'score2' if (part_id, measure_number, operation) in self.choices else 'score1'
+
+    def __len__(self):
+        return len(self.choices)
+
+    def rebase(self, score1, differences):
+        """
+        Overlay of a newer version of score1 keeping the choices whose
+        measure_diff is still part of `differences` (as after
+        watch.update_differences); choices on measures that changed since
+        are dropped.
+        """
+        current = {id(measure_diff) for part_diff in differences for measure_diff in part_diff['differences']}
+        merge = MergeOverlay(score1)
+        for (part_id, _, _), measure_diff in self.choices.items():
+            if id(measure_diff) in current:
+                merge.choose(part_id, measure_diff)
+        return merge
+
+    @tracing.traced('build merge')
+    def build(self):
+        """
+        Build the merged music21 score, applying choices in the order made.
+        """
+        if isinstance(self.score1, notation.Score):
+            # A fresh parse is already private to the merged score
+            merged = self.score1.to_music21()
+        else:
+            merged = share_score(self.score1, {part_id for part_id, _, _ in self.choices})
+        index = ScoreIndex(merged)
+
+        for (part_id, measure_number, operation), measure_diff in self.choices.items():
+            if operation == 'delete':
+                remove_measure(merged, part_id, measure_number, index)
+                continue
+            new_measure = measure_diff['score2_measure']
+            if isinstance(new_measure, notation.Measure):
+                new_measure = new_measure.to_music21()
+            else:
+                new_measure = copy.deepcopy(new_measure)
+            if operation == 'insert':
+                insert_measure(merged, part_id, measure_diff['after_measure_number'], new_measure, index)
+            else:
+                new_measure.number = measure_number  # Preserve measure number
+                update_measure(merged, part_id, measure_number, new_measure, index)
+        return merged
 
-def merge_export(merged_score, output_file):
+@tracing.traced('merge_export')
+def merge_export(merged_score, output_file, compression=DEFAULT_COMPRESSION):
     """
-    Save the merged score to a file.
+    Save the merged score to a file, as compressed MusicXML (at zlib level
+    `compression`) if its name ends in .mxl. A MergeOverlay of compact
+    scores is spliced into score1's own MusicXML (see splice.splice_export);
+    other overlays are built first.
     """
-    merged_score.write('musicxml', fp=output_file)
-    print(f"Merged score saved as {output_file}")
\ No newline at end of file
+    if isinstance(merged_score, MergeOverlay):
+        write_merge(merged_score, output_file, compression)
+    else:
+        with tracing.span('write musicxml'):
+            write_score(merged_score, output_file, compression)
+    print(f"Merged score saved as {output_file}")
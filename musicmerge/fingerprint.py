@@ -0,0 +1,80 @@
+import hashlib
+
+from . import notation, tracing
+
+
+def _clef_token(clef):
+    if clef is None:
+        return None
+    return (clef.sign, clef.line, clef.octaveChange)
+
+
+def _element_token(element, measure):
+    """
+    Reduce a note, chord or rest to the features compared by compare_scores.
+    """
+    # Class checks by name, so fingerprinting compact scores never imports music21
+    site = element.activeSite
+    voice = site.id if site is not None and 'Voice' in site.classes else None
+    if element.isChord:
+        kind = 'C'
+        pitches = tuple(p.nameWithOctave for p in element.pitches)
+    elif element.isNote:
+        kind = 'N'
+        pitches = (element.pitch.nameWithOctave,)
+    else:
+        kind = 'R'
+        pitches = ()
+
+    return (
+        voice,
+        float(element.getOffsetInHierarchy(measure)),
+        kind,
+        pitches,
+        float(element.duration.quarterLength),
+        tuple(type(a).__name__ for a in element.articulations),
+        getattr(element, 'stemDirection', None),
+    )
+
+
+def measure_fingerprint(measure):
+    """
+    Return a stable content hash for a measure.
+
+    The hash covers notes, chords, rests, durations, articulations, stem
+    directions, the time signature and the clef. Two measures with the same
+    fingerprint are treated as equal by compare_scores. Compact
+    notation.Measure objects hash the same features themselves.
+    """
+    if isinstance(measure, notation.Measure):
+        return measure.fingerprint()
+
+    time_signature = measure.timeSignature.ratioString if measure.timeSignature else None
+    tokens = [
+        time_signature,
+        _clef_token(measure.clef),
+    ]
+    for element in measure.recurse().notesAndRests:
+        tokens.append(_element_token(element, measure))
+
+    return hashlib.blake2b(repr(tokens).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def part_fingerprints(part):
+    """
+    Fingerprint every measure of a part, in order.
+    """
+    if isinstance(part, notation.Part):
+        return [m.fingerprint() for m in part.measures]
+    return [measure_fingerprint(m) for m in part.getElementsByClass('Measure')]
+
+
+@tracing.traced('fingerprint')
+def score_fingerprints(score):
+    """
+    Fingerprint every measure of a score.
+    Returns:
+        List with one entry per part (in score order), each a list of
+        measure fingerprints (in measure order).
+    """
+    return [part_fingerprints(part) for part in score.parts]
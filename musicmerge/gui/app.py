@@ -1,13 +1,30 @@
+import os
+import queue
+import threading
 import tkinter as tk
-import copy
+from pathlib import Path
 from tkinter import ttk
 
 from . import utils
+from .loading import LoadJob, load_pipeline
+from .prefetch import Prefetcher
 from .screens import FileSelectScreen, MergeScreen, CompletionScreen, FailureScreen
-from music21 import converter, environment
 
-from .utils import update_measure_in_score
-from ..core import compare_scores, show_differences, show_highlighted_score
+from .. import tracing
+from ..core import show_differences, show_highlighted_score, MergeOverlay
+from ..fingerprint import score_fingerprints
+from ..splice import write_merge
+from ..parallel import compare_scores_parallel
+from ..render import MeasureRenderer, measure_render_key, render_key
+from ..session import default_session_path
+from ..watch import FileWatcher, reload_score, update_differences
+
+# Differences prepared ahead of the one on screen
+PREFETCH_DEPTH = 3
+# How often the Tk thread checks on a background load, in milliseconds
+LOAD_POLL_MS = 50
+# How often watched input files are checked for changes, in milliseconds
+WATCH_POLL_MS = 500
 
 
 class MusicMergeApp:
@@ -19,6 +36,8 @@ class MusicMergeApp:
         # Application state
         self.score1 = None
         self.score2 = None
+        self.fingerprints1 = None
+        self.fingerprints2 = None
 
         self.differences = []
         self.current_part_index = 0
@@ -26,7 +45,28 @@ class MusicMergeApp:
         self.current_measure_index = 0
         self.current_overall_index = 1
 
-        self.merged_score = None
+        # Measures taken from score2, recorded on an overlay of score1 and built on save
+        self.merge = None
+        # Measures merged without review by a three-way merge
+        self.auto_resolved = 0
+        # Decisions made so far, saved as they are made so a review can be resumed
+        self.session = None
+        self.saved_decisions = None
+        # Renders measures through MuseScore into an image cache, made on first use
+        self.renderer = None
+        # Highlighted measures by render key, used on the Tk thread only. The
+        # prefetch thread builds them ahead of time and hands them over through
+        # `prepared`, which the Tk thread drains into `highlighted`.
+        self.highlighted = {}
+        self.prepared = queue.Queue()
+        self.prefetcher = Prefetcher(self.prepare_diff, self._flush_renders)
+        # Background load and compare, and whether the reviewer has caught up with it
+        self.load_job = None
+        self.waiting_for_differences = False
+        # Input files watched for changes after loading, and a re-read in progress
+        self.watch_paths = None
+        self.watcher = None
+        self.reloading = None
         self.error_message = tk.StringVar()
 
         self.style = ttk.Style()
@@ -35,10 +75,14 @@ class MusicMergeApp:
         self.screens = {}
         self._setup_screens()
         self.show_screen("FileSelectScreen")
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
-        # Musescore installtion
+        # Musescore installtion, looked for in the background
         self.musescore_path = None
+        self.music21_ready = False
         self._check_musescore()
+        # music21 takes seconds to import; load it while the user picks files
+        threading.Thread(target=self._warm_up, name="music21-import", daemon=True).start()
 
     def _setup_screens(self):
         container = tk.Frame(self.root)
@@ -73,19 +117,216 @@ class MusicMergeApp:
         return self.current_overall_index
 
     def set_musescore_path(self, path):
-        env = environment.Environment()
-        env['musicxmlPath'] = path
-
-    def load_scores(self, file1, file2):
-        self.score1 = converter.parse(file1)
-        self.score2 = converter.parse(file2)
-        self.differences = self.compare_scores()
-
-        self.current_part_index = 0
-        self.current_measure_set = (self.differences[self.current_part_index]['differences'] if self.differences else "")
+        self.musescore_path = path
+        self.renderer = None
+        # Otherwise _warm_up passes the path on once music21 is imported
+        if self.music21_ready:
+            self._configure_music21()
+
+    def _configure_music21(self):
+        # music21's own show() opens measures with the same MuseScore
+        if self.musescore_path:
+            from music21 import environment
+            environment.Environment()['musicxmlPath'] = self.musescore_path
+
+    def _warm_up(self):
+        """Import music21 on a background thread, ahead of the first merge"""
+        with tracing.span('import music21'):
+            import music21  # noqa: F401
+        self.music21_ready = True
+        self._configure_music21()
+
+    def load_scores(self, file1, file2, base=None):
+        """Load and compare (or three-way merge) two files on the calling thread"""
+        for event, payload in load_pipeline(file1, file2, base):
+            self._apply_load_event(event, payload)
+        self.prefetch()
+
+    def start_loading(self, file1, file2, base=None, watch=False, resume=True):
+        """
+        Load and compare two files on a worker thread; with a `base` file,
+        only conflicts of a three-way merge are reviewed. Progress, the
+        first differences and the outcome are picked up by _poll_loading.
+        With `watch`, both files are watched for changes once loaded (not
+        in a three-way merge). With `resume`, a review of the same files
+        left unfinished earlier continues where it stopped.
+        """
+        self.cancel_loading()
+        self.stop_watching()
+        self.watch_paths = (file1, file2) if watch and not base else None
+        session_path = default_session_path({'score1': file1, 'score2': file2, 'base': base})
+        cancelled = threading.Event()
+        self.load_job = LoadJob(load_pipeline(file1, file2, base, session_path, resume, cancelled), cancelled)
+        self.root.after(LOAD_POLL_MS, self._poll_loading)
+
+    def cancel_loading(self):
+        if self.load_job is not None:
+            self.load_job.cancel()
+            self.load_job = None
+
+    def is_loading(self):
+        return self.load_job is not None
+
+    def _apply_load_event(self, event, payload):
+        if event == 'scores':
+            self.score1, self.score2 = payload
+            self.fingerprints1 = self.fingerprints2 = None
+            self.differences = []
+            self.current_part_index = 0
+            self.current_measure_set = []
+            self.current_measure_index = 0
+            self.current_overall_index = 1
+            self.waiting_for_differences = False
+            self.merge = MergeOverlay(self.score1)
+            self.auto_resolved = 0
+            self.session = None
+            self.saved_decisions = None
+            self.highlighted = {}
+        elif event == 'three_way':
+            # Measures changed on one side only are already chosen
+            self.merge = payload['merge']
+            self.auto_resolved = payload['auto_resolved']
+        elif event == 'session':
+            self.session, self.saved_decisions = payload
+            self.session.differences = self.differences
+            self.merge = self.session.merge
+            self.auto_resolved = self.session.auto_resolved
+        elif event == 'part':
+            self.differences.append(payload)
+            if self.saved_decisions:
+                # Files changed since the session was saved; keep the choices that still apply
+                self.session.reapply(payload, self.saved_decisions)
+            if len(self.differences) == 1:
+                self.current_measure_set = payload['differences']
+
+    def _poll_loading(self):
+        job = self.load_job
+        if job is None:
+            # Cancelled; a new job polls for itself
+            return
+        file_screen = self.screens["FileSelectScreen"]
+        merge_screen = self.screens["MergeScreen"]
+        for event, payload in job.poll():
+            if event == 'progress':
+                file_screen.set_progress(*payload)
+            elif event == 'error':
+                self.load_job = None
+                file_screen.show_load_error(payload)
+                return
+            elif event == 'done':
+                self.load_job = None
+                file_screen.loading_finished()
+                if self.watch_paths:
+                    self.start_watching(*self.watch_paths)
+                if not self.differences:
+                    self.show_screen("CompletionScreen")
+                elif self.waiting_for_differences:
+                    # Every remaining part was equal
+                    self.waiting_for_differences = False
+                    self.show_screen("CompletionScreen")
+                else:
+                    merge_screen.update_display()
+                return
+            else:
+                self._apply_load_event(event, payload)
+                if event == 'part' and len(self.differences) == 1:
+                    # Start reviewing while the remaining parts are compared
+                    self.show_screen("MergeScreen")
+                    if self.is_decided(self.get_current_diff()):
+                        # Resuming: continue at the first difference not yet decided
+                        self.move_to_next_measure()
+                    merge_screen.update_display()
+                    self.prefetch()
+                elif event == 'part' and self.waiting_for_differences:
+                    self.waiting_for_differences = False
+                    self.move_to_next_measure()
+                    merge_screen.update_display()
+                elif event == 'part':
+                    merge_screen.update_display()
+        self.root.after(LOAD_POLL_MS, self._poll_loading)
+
+    def start_watching(self, file1, file2):
+        """Re-compare whenever either input file is saved again"""
+        self.watcher = FileWatcher([file1, file2])
+        self.root.after(WATCH_POLL_MS, self._poll_watch)
+
+    def stop_watching(self):
+        self.watcher = None
+        self.reloading = None
+
+    def _poll_watch(self):
+        watcher = self.watcher
+        if watcher is None:
+            return
+        if self.reloading is None:
+            changed = watcher.poll()
+            if changed:
+                # Only the files that changed are read again
+                paths = {index: watcher.paths[index] for index in changed}
+                self.reloading = utils.in_background(
+                    lambda: {index: reload_score(path) for index, path in paths.items()}, name="reload")
+        elif self.reloading.done():
+            reloading, self.reloading = self.reloading, None
+            try:
+                self._apply_reload(reloading.result())
+            except Exception as e:
+                self.screens["MergeScreen"].show_status(f"Could not re-read the changed score: {e}", "red")
+        self.root.after(WATCH_POLL_MS, self._poll_watch)
+
+    def _apply_reload(self, reloaded):
+        """
+        Take in re-read scores (index -> reload_score result), updating only
+        the differences in parts that changed. Choices on unchanged measures
+        are kept, and review resumes at the first difference not yet seen.
+        """
+        self.ensure_fingerprints()
+        previous = (self.score1, self.score2, self.fingerprints1, self.fingerprints2)
+        if 0 in reloaded:
+            self.score1, self.fingerprints1 = reloaded[0]
+        if 1 in reloaded:
+            self.score2, self.fingerprints2 = reloaded[1]
+        differences, changed = update_differences(self.differences, self.score1, self.score2,
+                                                  self.fingerprints1, self.fingerprints2, previous)
+
+        # Differences before the one on screen have been reviewed already
+        current = self.get_current_diff()
+        reviewed = set()
+        for part_diff in self.differences:
+            for measure_diff in part_diff['differences']:
+                if measure_diff is current:
+                    break
+                reviewed.add(id(measure_diff))
+            else:
+                continue
+            break
+
+        self.prefetcher.cancel()
+        self.merge = self.merge.rebase(self.score1, differences)
+        self.differences = differences
+        if self.session is not None:
+            self.session.refresh(self.score1, self.score2, differences, self.merge)
+            self.session.save()
+
+        position = 1
+        for part_index, part_diff in enumerate(differences):
+            for measure_index, measure_diff in enumerate(part_diff['differences']):
+                if id(measure_diff) not in reviewed:
+                    self.current_part_index = part_index
+                    self.current_measure_set = part_diff['differences']
+                    self.current_measure_index = measure_index
+                    self.current_overall_index = position
+                    self.show_screen("MergeScreen")
+                    merge_screen = self.screens["MergeScreen"]
+                    merge_screen.update_display()
+                    merge_screen.show_status(f"{len(changed)} changed part(s) compared again", "blue")
+                    self.prefetch()
+                    return
+                position += 1
+        # Everything left has been reviewed
+        self.current_part_index = len(differences)
+        self.current_measure_set = []
         self.current_measure_index = 0
-
-        self.merged_score = copy.deepcopy(self.score1)
+        self.show_screen("CompletionScreen")
 
     def get_current_diff(self):
         if self.current_part_index < len(self.differences):
@@ -93,14 +334,120 @@ class MusicMergeApp:
                 return self.current_measure_set[self.current_measure_index]
         return None
 
+    def ensure_fingerprints(self):
+        # Loading leaves fingerprinting to the comparison, which skips the
+        # measures that are the same in both files
+        if self.fingerprints1 is None:
+            self.fingerprints1 = score_fingerprints(self.score1)
+        if self.fingerprints2 is None:
+            self.fingerprints2 = score_fingerprints(self.score2)
+
     def compare_scores(self):
-        return compare_scores(self.score1, self.score2)
+        # Large parts are aligned in worker processes
+        return compare_scores_parallel(self.score1, self.score2, self.fingerprints1, self.fingerprints2)
+
+    def get_renderer(self):
+        if self.renderer is None:
+            musescore_path = self.musescore_path
+            if musescore_path is None:
+                from music21 import environment
+                musescore_path = environment.Environment()['musicxmlPath']
+            self.renderer = MeasureRenderer(musescore_path)
+        return self.renderer
+
+    def _take_prepared(self):
+        while True:
+            try:
+                key, measure = self.prepared.get_nowait()
+            except queue.Empty:
+                return
+            self.highlighted.setdefault(key, measure)
+
+    def highlighted_measure(self, current, key):
+        """Measure of score2 with differences highlighted, built once per render key"""
+        self._take_prepared()
+        if key not in self.highlighted:
+            self.highlighted[key] = show_differences(current['score2_measure'], current['score1_measure'])
+        return self.highlighted[key]
+
+    def diff_keys(self, current):
+        """
+        Render keys of a difference: a dict of 'score1' / 'score2' /
+        'differences' -> key, without the sides missing from the diff.
+        """
+        keys = {source: measure_render_key(current[f'{source}_measure'])
+                for source in ('score1', 'score2') if current[f'{source}_measure'] is not None}
+        keys['differences'] = render_key('differences', keys.get('score2'), keys.get('score1'))
+        return keys
+
+    def _diff_measure(self, current, source, key):
+        if source == 'differences':
+            return self.highlighted_measure(current, key)
+        return current[f'{source}_measure']
+
+    def prepare_diff(self, current):
+        """
+        Build the highlighted measure of a difference and queue its measures
+        for rendering, on the prefetch thread. The highlighted measure is
+        handed to the Tk thread through `prepared`. Returns its diff_keys.
+        """
+        renderer = self.renderer
+        keys = self.diff_keys(current)
+        for source, key in keys.items():
+            if renderer.path(key) is not None:
+                continue
+            if source == 'differences':
+                measure = show_differences(current['score2_measure'], current['score1_measure'])
+                self.prepared.put((key, measure))
+            else:
+                measure = current[f'{source}_measure']
+            renderer.request(key, measure)
+        return keys
+
+    def render_diff(self, current):
+        """
+        Render both measures of a difference and their highlighted comparison
+        in one MuseScore run (nothing is run if they were prefetched). The
+        run does not wait for, or include, prefetched measures still queued.
+        Returns a dict of 'score1' / 'score2' / 'differences' -> image path.
+        """
+        renderer = self.get_renderer()
+        keys = self.diff_keys(current)
+        renderer.render({key: self._diff_measure(current, source, key)
+                         for source, key in keys.items() if renderer.path(key) is None})
+        return {source: renderer.path(key) for source, key in keys.items()}
+
+    def upcoming_diffs(self, count=PREFETCH_DEPTH):
+        """The next `count` differences after the current one, across parts"""
+        upcoming = []
+        part_index, measure_index = self.current_part_index, self.current_measure_index + 1
+        while part_index < len(self.differences) and len(upcoming) < count:
+            measure_diffs = self.differences[part_index]['differences']
+            upcoming.extend(measure_diffs[measure_index:measure_index + count - len(upcoming)])
+            part_index, measure_index = part_index + 1, 0
+        return upcoming
+
+    def prefetch(self):
+        """Prepare the current and upcoming differences in the background"""
+        current = self.get_current_diff()
+        # Made here, so the prefetch thread only reads it
+        self.get_renderer()
+        self.prefetcher.schedule(([current] if current else []) + self.upcoming_diffs())
+
+    def _flush_renders(self):
+        # Without MuseScore only the highlighted measures are prefetched
+        renderer = self.renderer
+        if renderer is not None and renderer.musescore_path and Path(renderer.musescore_path).exists():
+            renderer.flush()
 
     def show_measure(self, source):
+        """Return the rendered image of the current measure from `source`"""
         current = self.get_current_diff()
         if current:
-            measure = current[f'{source}_measure']
-            measure.show('musicxml')
+            if current[f'{source}_measure'] is None:
+                raise ValueError(f"Measure {current['measure_number']} is not present in {source}")
+            return self.render_diff(current)[source]
+        return None
 
     def show_score(self, source):
         score = self.score1
@@ -109,46 +456,107 @@ class MusicMergeApp:
             to_show.show('musicxml')
 
     def show_differences(self):
+        """Return the rendered image of the current measure with differences highlighted"""
         current = self.get_current_diff()
         if current:
-            compared_measure = show_differences(current['score2_measure'], current['score1_measure'])
-            compared_measure.show('musicxml')
+            return self.render_diff(current)['differences']
+        return None
 
-    def move_to_next_measure(self):
-        if self.current_measure_index + 1 < len(self.current_measure_set):
-            self.current_measure_index += 1
-            self.current_overall_index += 1
-        elif self.current_part_index + 1 < len(self.differences):
-            self.current_part_index += 1
-            self.current_measure_set = (self.differences[self.current_part_index]['differences'] if self.differences else "")
-            self.current_measure_index = 0
-            self.current_overall_index += 1
-        else:
-            self.show_screen("CompletionScreen")
+    def is_decided(self, measure_diff):
+        """Whether a difference was decided in an earlier run of a resumed session"""
+        return self.session is not None and measure_diff is not None and id(measure_diff) in self.session.decisions
 
-    def keep_measure(self):
+    def move_to_next_measure(self):
+        while True:
+            if self.current_measure_index + 1 < len(self.current_measure_set):
+                self.current_measure_index += 1
+                self.current_overall_index += 1
+            elif self.current_part_index + 1 < len(self.differences):
+                self.current_part_index += 1
+                self.current_measure_set = (self.differences[self.current_part_index]['differences'] if self.differences else "")
+                self.current_measure_index = 0
+                self.current_overall_index += 1
+            elif self.is_loading():
+                # The next difference is still being compared
+                self.waiting_for_differences = True
+                return
+            else:
+                self.prefetcher.cancel()
+                self.show_screen("CompletionScreen")
+                return
+            if not self.is_decided(self.get_current_diff()):
+                break
+        self.prefetch()
+
+    def keep_measure(self, source='score2'):
         current = self.get_current_diff()
-        new_measure = current['score2_measure']
         part_id = self.differences[self.current_part_index]['part_id']
-        measure_id = current['measure_number']
-        update_measure_in_score(self.merged_score, part_id, measure_id, new_measure)
+        if self.session is None:
+            self.merge.choose(part_id, current, source)
+            return
+        self.session.decide(part_id, current, source)
+        self.session.position = self.current_overall_index
+        self.session.log_decision(part_id, current)
+
+    def build_merged_score(self):
+        """Build score1 with the kept measures; only those measures are copied"""
+        return self.merge.build()
 
     def quit_merge(self):
+        self.cancel_loading()
+        self.stop_watching()
+        self.prefetcher.cancel()
+        if self.session is not None:
+            # Keep what was decided, to be resumed the next time these files are merged
+            self.session.position = self.current_overall_index - 1
+            self.session.save()
         self.show_screen("CompletionScreen")
 
+    def close(self):
+        """Stop the background work and close the window"""
+        self.cancel_loading()
+        self.stop_watching()
+        self.prefetcher.stop()
+        if self.session is not None and self.session.journaled:
+            # Fold the journal into the session file
+            self.session.save()
+        self.root.destroy()
+
     def save_merge(self, output_path):
-        if self.merged_score:
-            self.merged_score.write('musicxml', output_path)
+        if self.score1 is not None:
+            # Spliced into score1's file when possible; see splice.write_merge
+            write_merge(self.merge, output_path)
+            if self.session is not None and not self.is_loading() and not self.session.undecided():
+                # The review is finished; nothing left to resume
+                self.session.delete()
 
     def _check_musescore(self):
-        """Check for MuseScore at startup"""
-        detected_path = utils.detect_musescore()
-        if detected_path:
+        """Look for MuseScore on a background thread at startup"""
+        self.musescore_detection = utils.detect_musescore_async()
+        self.root.after(LOAD_POLL_MS, self._poll_musescore)
+
+    def _poll_musescore(self):
+        if not self.musescore_detection.done():
+            self.root.after(LOAD_POLL_MS, self._poll_musescore)
+            return
+        detected_path = self.musescore_detection.result()
+        # A path the user set in the meantime wins
+        if detected_path and self.musescore_path is None:
             self.set_musescore_path(detected_path)
+            self.screens["FileSelectScreen"].show_detected_musescore(detected_path)
 
 def run_gui():
+    # MUSICMERGE_TRACE=trace.json records a Chrome trace of the session, written on exit
+    trace_path = os.environ.get('MUSICMERGE_TRACE')
+    if trace_path:
+        tracing.start()
     root = tk.Tk()
     app = MusicMergeApp(root)
-    root.mainloop()
-
-run_gui()
\ No newline at end of file
+    try:
+        root.mainloop()
+    finally:
+        if trace_path:
+            tracing.write(trace_path)
+
+if __name__ == "__main__":
+    run_gui()
@@ -0,0 +1,148 @@
+import queue
+import threading
+
+from ..loader import iter_load_scores
+from ..parallel import iter_compare_parts_parallel
+from ..session import (MergeSession, SessionError, inputs_unchanged, load_saved, restore_session,
+                       saved_decisions)
+from ..threeway import three_way_merge
+
+# Progress bar share of parsing; comparing parts takes the rest
+PARSE_SHARE = 0.4
+
+
+def _is_set(cancelled):
+    return cancelled is not None and cancelled.is_set()
+
+
+def load_pipeline(file1, file2, base=None, session_path=None, resume=True, cancelled=None):
+    """
+    Load two MusicXML files and compare them one stage at a time. With a
+    `base` file the scores are three-way merged against it instead, and
+    only the conflicts are reported as differences.
+
+    With a `session_path`, the review is kept in a session.MergeSession
+    saved there. If a session saved earlier for the same, unchanged files
+    is found (and `resume` is set), its differences are reported without
+    comparing the scores.
+
+    Setting the threading.Event `cancelled` ends the pipeline within the
+    current stage: running parses are stopped, and the comparison stops
+    before the next part.
+    Yields:
+        (event, payload) pairs:
+        ('progress', (fraction, text))
+        ('scores', (score1, score2))
+        ('three_way', result)   # three_way_merge result, with a base only
+        ('session', (session, saved))  # with a session_path; saved decisions to
+                                       # take over from changed files, or None
+        ('part', part_diff)     # each part with differences, in score order
+    Raises:
+        loader.ScoreLoadError: naming each file that could not be read
+    """
+    paths = [file1, file2] + ([base] if base else [])
+    names = ["Score 1", "Score 2", "Base"]
+    parsing = names[:len(paths)]
+    yield 'progress', (0.0, f"Parsing {', '.join(parsing[:-1])} and {parsing[-1]}...")
+    scores = [None] * len(paths)
+    for index, score in iter_load_scores(paths, cancelled=cancelled):
+        scores[index] = score
+        parsed = sum(s is not None for s in scores)
+        yield 'progress', (PARSE_SHARE * parsed / len(paths), f"Parsed {names[index]}")
+    if _is_set(cancelled):
+        return
+    score1, score2 = scores[:2]
+
+    # Not fingerprinted here: compare_scores first matches the measures that
+    # are the same in both files, and fingerprints only the others
+    yield 'scores', (score1, score2)
+
+    files = {'score1': file1, 'score2': file2, 'base': base}
+    data = load_saved(session_path, files) if session_path and resume else None
+    if data is not None and inputs_unchanged(data):
+        try:
+            session = restore_session(session_path, files, score1, score2, data)
+        except SessionError:
+            pass  # Compared again below; decisions are taken over where they still apply
+        else:
+            yield 'session', (session, None)
+            for part_diff in session.differences:
+                yield 'part', part_diff
+            yield 'progress', (1.0, "Resumed the previous review")
+            return
+
+    if base:
+        result = three_way_merge(scores[2], score1, score2)
+        yield 'three_way', result
+        if session_path:
+            session = MergeSession(session_path, files, score1, score2, [], result['merge'],
+                                   result['auto_resolved'])
+            yield 'session', (session, saved_decisions(data) if data else None)
+        for part_diff in result['conflicts']:
+            yield 'part', part_diff
+        yield 'progress', (1.0, f"{result['auto_resolved']} measure(s) merged automatically")
+        return
+
+    if session_path:
+        session = MergeSession(session_path, files, score1, score2, [])
+        yield 'session', (session, saved_decisions(data) if data else None)
+    yield 'progress', (PARSE_SHARE, "Comparing parts...")
+
+    compare_share = 1.0 - PARSE_SHARE
+    for k, count, part_diff in iter_compare_parts_parallel(score1, score2, cancelled=cancelled):
+        if _is_set(cancelled):
+            return
+        if part_diff['differences']:
+            yield 'part', part_diff
+        yield 'progress', (PARSE_SHARE + compare_share * (k + 1) / count,
+                           f"Compared part {k + 1}/{count}")
+
+
+class LoadJob:
+    """
+    Runs a pipeline generator on a worker thread and hands its events to the
+    Tk thread through a queue, to be drained with poll().
+
+    After the pipeline's own events, exactly one of ('done', None),
+    ('cancelled', None) or ('error', exception) is queued. cancel() sets
+    `cancelled` (a threading.Event, which load_pipeline also watches to stop
+    work in progress), stops the worker before the next event and closes
+    the pipeline.
+    """
+    def __init__(self, pipeline, cancelled=None):
+        self.pipeline = pipeline
+        self.events = queue.Queue()
+        self._cancelled = cancelled if cancelled is not None else threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _run(self):
+        try:
+            for event in self.pipeline:
+                if self._cancelled.is_set():
+                    break
+                self.events.put(event)
+        except Exception as e:
+            self.events.put(('error', e))
+            return
+        finally:
+            self.pipeline.close()
+        self.events.put(('cancelled', None) if self._cancelled.is_set() else ('done', None))
+
+    def poll(self):
+        """
+        Return the events queued so far without blocking.
+        """
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
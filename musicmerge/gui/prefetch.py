@@ -0,0 +1,65 @@
+import threading
+
+
+class Prefetcher:
+    """
+    Prepares upcoming differences on a background thread.
+
+    schedule() replaces whatever was waiting with a new list of differences;
+    the worker calls `prepare(diff)` for each and then `finish()` once, e.g.
+    to render everything prepared in a single MuseScore run. Scheduling
+    again or calling cancel() makes in-flight work stale: the worker stops
+    before its next difference and skips `finish()`. Errors are ignored,
+    since the same work is repeated (and reported) when the user clicks.
+    """
+    def __init__(self, prepare, finish=None):
+        self.prepare = prepare
+        self.finish = finish
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._queue = []
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def schedule(self, diffs):
+        with self._condition:
+            self._generation += 1
+            self._queue = list(diffs)
+            self._condition.notify()
+
+    def cancel(self):
+        self.schedule([])
+
+    def stop(self):
+        with self._condition:
+            self._generation += 1
+            self._queue = []
+            self._stopped = True
+            self._condition.notify()
+
+    def _is_current(self, generation):
+        return generation == self._generation and not self._stopped
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                generation, diffs, self._queue = self._generation, self._queue, []
+
+            for diff in diffs:
+                if not self._is_current(generation):
+                    break
+                try:
+                    self.prepare(diff)
+                except Exception:
+                    pass
+            else:
+                if self.finish is not None and self._is_current(generation):
+                    try:
+                        self.finish()
+                    except Exception:
+                        pass
@@ -3,7 +3,7 @@ from pathlib import Path
 from tkinter import ttk, filedialog, messagebox
 import threading
 
-from musicmerge.gui import utils
+from musicmerge.loader import ScoreLoadError
 
 
 class BaseScreen(tk.Frame):
@@ -27,11 +27,6 @@ class BaseScreen(tk.Frame):
 
 class FileSelectScreen(BaseScreen):
 
-    def __init__(self, master, controller):
-        super().__init__(master, controller)
-        # Auto-detect MuseScore on initialization
-        self.auto_detect_musescore()
-
     def create_widgets(self):
         # File 1 Selection
         self.file1_var = tk.StringVar()
@@ -47,37 +42,58 @@ class FileSelectScreen(BaseScreen):
         ttk.Button(self, text="Browse",
                    command=lambda: self.browse_file(self.file2_var)).grid(row=1, column=2)
 
+        # Common ancestor for a three-way merge (optional)
+        self.base_var = tk.StringVar()
+        ttk.Label(self, text="Base (optional):").grid(row=2, column=0, padx=5, pady=5)
+        ttk.Entry(self, textvariable=self.base_var, width=40).grid(row=2, column=1)
+        ttk.Button(self, text="Browse",
+                   command=lambda: self.browse_file(self.base_var)).grid(row=2, column=2)
+
         # Visual Indicators
         self.status_label = ttk.Label(self, text="Select both files to enable merge")
-        self.status_label.grid(row=2, column=0, columnspan=3, pady=10)
+        self.status_label.grid(row=3, column=0, columnspan=3, pady=10)
 
         # MuseScore Path Configuration
         self.musescore_var = tk.StringVar()
-        ttk.Label(self, text="MuseScore Path:").grid(row=3, column=0, padx=5, pady=5)
-        ttk.Entry(self, textvariable=self.musescore_var, width=40).grid(row=3, column=1)
+        ttk.Label(self, text="MuseScore Path:").grid(row=4, column=0, padx=5, pady=5)
+        ttk.Entry(self, textvariable=self.musescore_var, width=40).grid(row=4, column=1)
         ttk.Button(self, text="Set Path",
-                   command=self.set_musescore_path).grid(row=3, column=2)
+                   command=self.set_musescore_path).grid(row=4, column=2)
 
         # Merge Button
         self.merge_btn = ttk.Button(self, text="Merge",
                                     state=tk.DISABLED,
                                     command=self.start_merge)
-        self.merge_btn.grid(row=4, column=1, pady=20)
+        self.merge_btn.grid(row=5, column=1, pady=20)
+
+        # Re-compare when either score is saved again during the review
+        self.watch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self, text="Watch for changes",
+                        variable=self.watch_var).grid(row=5, column=2)
+
+        # Continue an unfinished review of the same files where it stopped
+        self.resume_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(self, text="Resume saved review",
+                        variable=self.resume_var).grid(row=5, column=0)
+
+        # Loading progress, shown while files are parsed and compared
+        self.progress = ttk.Progressbar(self, mode='determinate', maximum=1.0, length=300)
+        self.progress_label = ttk.Label(self, text="")
+        self.cancel_btn = ttk.Button(self, text="Cancel", command=self.cancel_merge)
 
         # Track file selection
         self.file1_var.trace_add('write', self.check_files)
         self.file2_var.trace_add('write', self.check_files)
 
-    def auto_detect_musescore(self):
-        detected_path = utils.detect_musescore()
-        if detected_path:
-            self.musescore_var.set(detected_path)
-            self.controller.set_musescore_path(detected_path)
-            self.status_label.config(text=f"Auto-detected MuseScore at: {detected_path}",
-                                     foreground="green")
+    def show_detected_musescore(self, detected_path):
+        """Show the MuseScore found by the controller's background detection"""
+        self.musescore_var.set(detected_path)
+        self.status_label.config(text=f"Auto-detected MuseScore at: {detected_path}",
+                                 foreground="green")
 
     def browse_file(self, target_var):
-        filepath = filedialog.askopenfilename(filetypes=[("MusicXML", "*.musicxml")])
+        filepath = filedialog.askopenfilename(filetypes=[("MusicXML", "*.musicxml *.mxl *.xml"),
+                                                         ("Compressed MusicXML", "*.mxl")])
         if filepath:
             target_var.set(filepath)
 
@@ -102,18 +118,45 @@ class FileSelectScreen(BaseScreen):
             self.status_label.config(text="Select both files to enable merge", foreground="black")
 
     def start_merge(self):
-        try:
-            self.controller.load_scores(
-                self.file1_var.get(),
-                self.file2_var.get()
-            )
-            if len(self.controller.differences) > 0:
-                self.controller.show_screen("MergeScreen")
-                self.controller.screens["MergeScreen"].update_display()
-            else:
-                self.controller.show_screen("CompletionScreen")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load files:\n{str(e)}\nScore is likely empty, invalid or corrupted.")
+        """Load and compare in the background, showing progress"""
+        self.merge_btn.config(state=tk.DISABLED)
+        self.progress['value'] = 0.0
+        self.progress.grid(row=6, column=0, columnspan=3, pady=5)
+        self.progress_label.grid(row=7, column=0, columnspan=3)
+        self.cancel_btn.grid(row=8, column=1, pady=5)
+        self.controller.start_loading(self.file1_var.get(), self.file2_var.get(),
+                                      self.base_var.get() or None, self.watch_var.get(),
+                                      self.resume_var.get())
+
+    def cancel_merge(self):
+        self.controller.cancel_loading()
+        self.loading_finished()
+        self.status_label.config(text="Loading cancelled", foreground="orange")
+
+    def set_progress(self, fraction, text):
+        self.progress['value'] = fraction
+        self.progress_label.config(text=text)
+
+    def loading_finished(self):
+        self.progress.grid_remove()
+        self.progress_label.grid_remove()
+        self.cancel_btn.grid_remove()
+        self.check_files()
+
+    def show_load_error(self, error):
+        self.loading_finished()
+        if isinstance(error, ScoreLoadError):
+            failed = "\n".join(f"{self._input_label(path)}: {e}" for path, e in error.errors.items())
+        else:
+            failed = str(error)
+        messagebox.showerror("Error", f"Failed to load files:\n{failed}\nScore is likely empty, invalid or corrupted.")
+
+    def _input_label(self, path):
+        if path == self.file1_var.get():
+            return f"Score 1 ({Path(path).name})"
+        if path == self.base_var.get():
+            return f"Base ({Path(path).name})"
+        return f"Score 2 ({Path(path).name})"
 
 
 class MergeScreen(BaseScreen):        
@@ -172,12 +215,20 @@ class MergeScreen(BaseScreen):
     def update_title(self):
         try:
             """Update the title with current difference information"""
+            if self.controller.waiting_for_differences:
+                self.title_var.set("Comparing the remaining parts...")
+                return
             current = self.controller.get_current_diff_overall_number()
             total = self.controller.get_total_differences()
+            if self.controller.is_loading():
+                total = f"{total}+"  # More parts still being compared
             diff = self.controller.differences[self.controller.current_part_index]
+            measure_diff = diff['differences'][self.controller.current_measure_index]
+            operation = measure_diff.get('operation', 'modify')
+            suffix = {'insert': " (only in Score 2)", 'delete': " (only in Score 1)"}.get(operation, "")
 
             self.title_var.set(
-                f"Looking at difference {current} of {total} in part {diff['part_name']}, measure {diff['differences'][self.controller.current_measure_index]['measure_number']}"
+                f"Looking at difference {current} of {total} in part {diff['part_name']}, measure {measure_diff['measure_number']}{suffix}"
             )
             self.title_label.config(textvariable=self.title_var)
         except Exception as e:
@@ -185,8 +236,10 @@ class MergeScreen(BaseScreen):
 
     def show_measure(self, source):
         try:
+            self.status_label.config(text=f"Rendering {source}...", foreground="blue")
+            image_path = self.controller.show_measure(source)
+            self.after(0, lambda: self.show_image(image_path, f"Measure from {source}"))
             self.status_label.config(text=f"Showing {source}", foreground="blue")
-            self.controller.show_measure(source)
         except Exception as e:
             self.status_label.config(text=f"Error: {str(e)}", foreground="red")
 
@@ -212,7 +265,9 @@ class MergeScreen(BaseScreen):
 
     def show_differences(self):
         try:
-            self.controller.show_differences()
+            self.status_label.config(text="Rendering differences...", foreground="blue")
+            image_path = self.controller.show_differences()
+            self.after(0, lambda: self.show_image(image_path, "Bar differences"))
             self.status_label.config(text="Showing differences", foreground="blue")
         except Exception as e:
             self.status_label.config(text=f"Error: {str(e)}", foreground="red")
@@ -224,7 +279,19 @@ class MergeScreen(BaseScreen):
 
         threading.Thread(target=worker, daemon=True).start()
 
+    def show_image(self, image_path, title):
+        """Open a rendered measure in a preview window (runs on the Tk thread)"""
+        if image_path is None:
+            return
+        window = tk.Toplevel(self)
+        window.title(title)
+        image = tk.PhotoImage(file=str(image_path))
+        label = ttk.Label(window, image=image)
+        label.image = image  # Keep a reference, Tk does not
+        label.pack(padx=10, pady=10)
+
     def keep_measure_score1(self):
+        self.controller.keep_measure('score1')
         self.controller.move_to_next_measure()
         self.update_display()
 
@@ -236,8 +303,15 @@ class MergeScreen(BaseScreen):
     def quit(self):
         self.controller.quit_merge()
 
+    def show_status(self, text, color):
+        self.status_label.config(text=text, foreground=color)
+
     def update_display(self):
         self.update_title()
+        if self.controller.auto_resolved:
+            self.status_label.config(
+                text=f"{self.controller.auto_resolved} measure(s) changed on one side only were merged automatically",
+                foreground="green")
 
 class CompletionScreen(BaseScreen):
     def create_widgets(self):
@@ -252,12 +326,12 @@ class CompletionScreen(BaseScreen):
 
         # Action Buttons
         ttk.Button(self, text="Save", command=self.save).pack(pady=10)
-        ttk.Button(self, text="Quit", command=self.master.destroy).pack()
+        ttk.Button(self, text="Quit", command=self.controller.close).pack()
 
     def browse_output(self):
         filepath = filedialog.asksaveasfilename(
             defaultextension=".musicxml",
-            filetypes=[("MusicXML", "*.musicxml")]
+            filetypes=[("MusicXML", "*.musicxml"), ("Compressed MusicXML", "*.mxl")]
         )
         if filepath:
             self.output_var.set(filepath)
@@ -266,7 +340,7 @@ class CompletionScreen(BaseScreen):
         try:
             self.controller.save_merge(self.output_var.get())
             messagebox.showinfo("Success", "File saved successfully!")
-            self.master.destroy()
+            self.controller.close()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save file:\n{str(e)}")
 
@@ -278,4 +352,4 @@ class FailureScreen(BaseScreen):
 
         ttk.Label(self, textvariable=self.controller.error_message).pack(pady=10)
 
-        ttk.Button(self, text="Quit", command=self.master.destroy).pack(pady=20)
\ No newline at end of file
+        ttk.Button(self, text="Quit", command=self.controller.close).pack(pady=20)
\ No newline at end of file
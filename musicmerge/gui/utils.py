@@ -3,12 +3,20 @@ import subprocess
 import tempfile
 import threading
 import copy
+import functools
+from concurrent.futures import Future
 from pathlib import Path
-from music21 import stream, note, chord
 
+from ..index import ScoreIndex
 
+
+# Future of the detect_musescore() result, started by detect_musescore_async()
+_detection = None
+
+
+@functools.cache
 def detect_musescore():
-    """Try to automatically find MuseScore installation path"""
+    """Try to automatically find MuseScore installation path (looked up once per process)"""
     system = platform.system()
 
     # Common installation paths by OS
@@ -44,6 +52,34 @@ def detect_musescore():
 
     return None
 
+def in_background(function, *args, name=None):
+    """
+    Call function(*args) on a daemon thread.
+    Returns:
+        concurrent.futures.Future of the result, for the Tk thread to poll
+    """
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+def detect_musescore_async():
+    """
+    Run detect_musescore() on a background thread, once per process.
+    Returns:
+        concurrent.futures.Future of the path (or None)
+    """
+    global _detection
+    if _detection is None:
+        _detection = in_background(detect_musescore, name="musescore-detect")
+    return _detection
+
 def show_in_musescore(score_obj, musescore_path=None):
     """
     Show a music21 object in MuseScore without blocking the GUI
@@ -74,7 +110,7 @@ def show_in_musescore(score_obj, musescore_path=None):
     # Schedule file deletion after 30 seconds
     threading.Timer(30, lambda: Path(tmp_path).unlink(missing_ok=True)).start()
 
-def update_measure_in_score(target_score, part_id, measure_number, new_measure):
+def update_measure_in_score(target_score, part_id, measure_number, new_measure, index=None):
     """
     Replace a specific measure in the target score
     Args:
@@ -82,15 +118,38 @@ def update_measure_in_score(target_score, part_id, measure_number, new_measure):
         part_id: ID of the part to update (str)
         measure_number: Measure number to replace (int)
         new_measure: The measure to insert (music21.stream.Measure)
+        index: ScoreIndex of target_score, reused across calls (optional)
+    """
+    if index is None:
+        index = ScoreIndex(target_score)
+    # Clone the measure to avoid reference issues
+    new_measure_copy = copy.deepcopy(new_measure)
+    new_measure_copy.number = measure_number  # Preserve measure number
+    return index.replace(part_id, measure_number, new_measure_copy)
+
+def insert_measure_in_score(target_score, part_id, after_measure_number, new_measure, index=None):
+    """
+    Insert a measure that only exists in the other score
+    Args:
+        target_score: The score being modified (music21.stream.Score)
+        part_id: ID of the part to update (str)
+        after_measure_number: Measure the new one follows, None for the start (int)
+        new_measure: The measure to insert (music21.stream.Measure)
+        index: ScoreIndex of target_score, reused across calls (optional)
+    """
+    if index is None:
+        index = ScoreIndex(target_score)
+    return index.insert(part_id, after_measure_number, copy.deepcopy(new_measure))
+
+def remove_measure_from_score(target_score, part_id, measure_number, index=None):
+    """
+    Remove a measure that the other score deleted
+    Args:
+        target_score: The score being modified (music21.stream.Score)
+        part_id: ID of the part to update (str)
+        measure_number: Measure number to remove (int)
+        index: ScoreIndex of target_score, reused across calls (optional)
     """
-    for part in target_score.parts:
-        if part.id == part_id:
-            for measure in part.getElementsByClass('Measure'):
-                if measure.number == measure_number:
-                    # Clone the measure to avoid reference issues
-                    new_measure_copy = copy.deepcopy(new_measure)
-                    new_measure_copy.number = measure_number  # Preserve measure number
-
-                    part.replace(measure, new_measure_copy, recurse=True)
-                    return True
-    return False
\ No newline at end of file
+    if index is None:
+        index = ScoreIndex(target_score)
+    return index.remove(part_id, measure_number)
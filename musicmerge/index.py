@@ -0,0 +1,110 @@
+class ScoreIndex:
+    """
+    Lookup tables from part id / part name and measure number to the parts
+    and measures of a music21 score, built once with a single pass.
+
+    Edits made through replace(), insert() and remove() keep the index
+    valid. Offsets are read from the part when asked for, so they stay
+    correct after measures are shifted.
+    """
+    def __init__(self, score):
+        self.score = score
+        self.parts_by_id = {}
+        self.parts_by_name = {}
+        # id(part) -> {measure number: [measures with that number, in order]}
+        self.measures = {}
+        # (id(part), after_measure_number) -> measure inserted last at that point
+        self.inserted = {}
+        for part in score.parts:
+            self.parts_by_id.setdefault(part.id, part)
+            self.parts_by_name.setdefault(part.partName, part)
+            numbers = {}
+            for measure in part.getElementsByClass('Measure'):
+                numbers.setdefault(measure.number, []).append(measure)
+            self.measures[id(part)] = numbers
+
+    def part(self, part_key):
+        """
+        Find a part by id, falling back to its name. None if there is none.
+        """
+        part = self.parts_by_id.get(part_key)
+        if part is None:
+            part = self.parts_by_name.get(part_key)
+        return part
+
+    def measure(self, part_key, measure_number):
+        """
+        Return the (first) measure numbered `measure_number`, or None.
+        """
+        part = self.part(part_key)
+        if part is None:
+            return None
+        found = self.measures[id(part)].get(measure_number)
+        return found[0] if found else None
+
+    def offset(self, part_key, measure_number):
+        measure = self.measure(part_key, measure_number)
+        if measure is None:
+            return None
+        return self.part(part_key).elementOffset(measure)
+
+    def replace(self, part_key, measure_number, new_measure):
+        """
+        Put `new_measure` in the place of a measure. Returns False if the
+        part or measure does not exist.
+        """
+        part = self.part(part_key)
+        old = self.measure(part_key, measure_number)
+        if old is None:
+            return False
+        part.replace(old, new_measure, recurse=True)
+        numbers = self.measures[id(part)]
+        _forget(numbers, measure_number, old)
+        numbers.setdefault(new_measure.number, []).append(new_measure)
+        return True
+
+    def insert(self, part_key, after_measure_number, new_measure):
+        """
+        Insert `new_measure` after measure `after_measure_number` (at the
+        start of the part when it is None), shifting later measures along.
+        Several measures inserted at the same point keep the order in which
+        they were inserted. Returns False if the part or measure does not exist.
+        """
+        part = self.part(part_key)
+        if part is None:
+            return False
+        previous = self.inserted.get((id(part), after_measure_number))
+        if previous is None and after_measure_number is not None:
+            previous = self.measure(part_key, after_measure_number)
+            if previous is None:
+                return False
+        offset = 0.0
+        if previous is not None:
+            offset = part.elementOffset(previous) + previous.duration.quarterLength
+        part.shiftElements(new_measure.duration.quarterLength, startOffset=offset)
+        part.insert(offset, new_measure)
+        self.measures[id(part)].setdefault(new_measure.number, []).append(new_measure)
+        self.inserted[(id(part), after_measure_number)] = new_measure
+        return True
+
+    def remove(self, part_key, measure_number):
+        """
+        Remove a measure, shifting later measures back. Returns False if
+        the part or measure does not exist.
+        """
+        part = self.part(part_key)
+        old = self.measure(part_key, measure_number)
+        if old is None:
+            return False
+        part.remove(old, shiftOffsets=True)
+        _forget(self.measures[id(part)], measure_number, old)
+        self.inserted = {key: m for key, m in self.inserted.items() if m is not old}
+        return True
+
+
+def _forget(numbers, measure_number, measure):
+    remaining = [m for m in numbers[measure_number] if m is not measure]
+    if remaining:
+        numbers[measure_number] = remaining
+    else:
+        del numbers[measure_number]
@@ -0,0 +1,300 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from importlib import metadata
+from pathlib import Path
+
+from . import __version__, tracing
+from .notation import MODEL_VERSION, read_score
+
+# Default cache size cap, in bytes
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# How often a wait on worker processes checks whether it was cancelled, in seconds
+CANCEL_POLL_SECONDS = 0.1
+
+
+def _music21_version():
+    # Read from the package metadata so a warm cache never imports music21
+    try:
+        return metadata.version('music21')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+
+def _parse(path, trace=False):
+    """
+    read_score in a worker process.
+    Returns:
+        (score, trace events) - events only if `trace` is set
+    """
+    if not trace:
+        return read_score(path), []
+    tracing.start()
+    with tracing.span('parse', path=str(path)):
+        score = read_score(path)
+    return score, tracing.stop()
+
+
+def stop_pool(pool, futures):
+    """
+    Shut down a process pool without waiting. Workers still busy with one
+    of `futures` are terminated, so abandoned work does not keep running.
+    """
+    busy = any(not future.done() for future in futures)
+    # ProcessPoolExecutor has no public way to stop running tasks (before Python 3.14)
+    processes = list((getattr(pool, '_processes', None) or {}).values()) if busy else []
+    results = getattr(pool, '_result_queue', None)
+    pool.shutdown(wait=False, cancel_futures=True)
+    if not processes:
+        return
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+    if results is None:
+        return
+    # A worker killed while sending a result leaves half a message in the pipe,
+    # which the pool's manager thread would wait on forever. Closing our end of
+    # the pipe turns that into EOF, so the manager marks the pool broken and exits.
+    results._writer.close()
+
+
+def wait_as_completed(futures, cancelled=None):
+    """
+    Like concurrent.futures.as_completed, but stops (without raising) as
+    soon as the threading.Event `cancelled` is set.
+    """
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+        if cancelled is not None and cancelled.is_set():
+            return
+        yield from done
+
+
+def default_cache_dir():
+    """
+    Cache directory used when none is given: $MUSICMERGE_CACHE_DIR, else
+    $XDG_CACHE_HOME/musicmerge, else ~/.cache/musicmerge.
+    """
+    if os.environ.get('MUSICMERGE_CACHE_DIR'):
+        return Path(os.environ['MUSICMERGE_CACHE_DIR'])
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'musicmerge'
+
+
+class ParseCache:
+    """
+    Content-addressed on-disk cache of compact scores.
+
+    Entries are keyed by a hash of the file contents together with the
+    compact model version (notation.MODEL_VERSION) and the musicmerge and
+    music21 versions, so editing a file, changing the model or upgrading
+    either package never returns a stale parse. Each hit refreshes the entry's
+    modification time; when the directory grows past `max_bytes` the least
+    recently used entries are removed.
+    """
+    SUFFIX = '.pickle'
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory) if directory is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def key(self, data):
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"model={MODEL_VERSION};musicmerge={__version__};"
+                      f"music21={_music21_version()};".encode('utf-8'))
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return self.directory / (key + self.SUFFIX)
+
+    def get(self, key):
+        """
+        Return the cached score for `key`, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                score = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated or unreadable entry: drop it and parse again
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return score
+
+    def put(self, key, score):
+        """
+        Store a score under `key`, then evict old entries if over the cap.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(score, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for path in self.directory.glob('*' + self.SUFFIX):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for path in self.directory.glob('*' + self.SUFFIX):
+            path.unlink(missing_ok=True)
+
+
+class ScoreLoadError(Exception):
+    """
+    Raised by load_scores_parallel when one or more inputs cannot be read.
+    `errors` maps each failing path to its exception, so callers can tell
+    the user which file is corrupt.
+    """
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("\n".join(f"{path}: {error}" for path, error in errors.items()))
+
+
+def load_score(path, cache=None):
+    """
+    Read a MusicXML file into the compact notation model, going through
+    `cache` (a ParseCache; a default one if None). Pass cache=False to
+    always parse.
+    """
+    if cache is False:
+        with tracing.span('parse', path=str(path)):
+            return read_score(path)
+    if cache is None:
+        cache = ParseCache()
+
+    with tracing.span('cache lookup', path=str(path)):
+        with open(path, 'rb') as f:
+            data = f.read()
+        key = cache.key(data)
+        score = cache.get(key)
+    if score is None:
+        with tracing.span('parse', path=str(path)):
+            score = read_score(path)
+        try:
+            cache.put(key, score)
+        except OSError:
+            # A read-only or full cache directory must not stop a merge
+            pass
+    # The same contents may have been cached from another path
+    score.source = str(path)
+    return score
+
+
+def iter_load_scores(paths, cache=None, max_workers=None, cancelled=None):
+    """
+    Read several MusicXML files into compact scores, parsing the ones that
+    are not cached in parallel worker processes. `cache` works as in
+    load_score. Closing the generator early, or setting the threading.Event
+    `cancelled`, ends it and stops the parses still running.
+    Yields:
+        (index, score) for each file as soon as it is ready; cached files first
+    Raises:
+        ScoreLoadError: listing every file that failed, after all have been tried.
+    """
+    if cache is None:
+        cache = ParseCache()
+
+    errors = {}
+    misses = []
+    for index, path in enumerate(paths):
+        try:
+            if cache is False:
+                misses.append((index, path, None))
+                continue
+            with tracing.span('cache lookup', path=str(path)):
+                with open(path, 'rb') as f:
+                    key = cache.key(f.read())
+                score = cache.get(key)
+        except OSError as e:
+            errors[path] = e
+            continue
+        if score is None:
+            misses.append((index, path, key))
+        else:
+            score.source = str(path)
+            yield index, score
+
+    pool = ProcessPoolExecutor(max_workers=max_workers or len(misses)) if len(misses) > 1 else None
+    futures = {}
+    try:
+        if pool is not None:
+            futures = {pool.submit(_parse, path, tracing.enabled()): (index, path, key)
+                       for index, path, key in misses}
+            done = (futures[future] + (future,) for future in wait_as_completed(futures, cancelled))
+        else:
+            done = ((index, path, key, None) for index, path, key in misses)
+
+        for index, path, key, future in done:
+            if cancelled is not None and cancelled.is_set():
+                return
+            try:
+                if future is not None:
+                    score, events = future.result()
+                    tracing.add(events)
+                else:
+                    with tracing.span('parse', path=str(path)):
+                        score = read_score(path)
+            except Exception as e:
+                errors[path] = e
+                continue
+            if key is not None:
+                try:
+                    cache.put(key, score)
+                except OSError:
+                    # A read-only or full cache directory must not stop a merge
+                    pass
+            score.source = str(path)
+            yield index, score
+    finally:
+        if pool is not None:
+            stop_pool(pool, futures)
+
+    if errors:
+        raise ScoreLoadError({path: errors[path] for path in paths if path in errors})
+
+
+def load_scores_parallel(paths, cache=None, max_workers=None):
+    """
+    Read several MusicXML files at once (see iter_load_scores).
+    Returns:
+        List of scores in the order of `paths`
+    Raises:
+        ScoreLoadError: listing every file that failed, after all have been tried.
+    """
+    scores = [None] * len(paths)
+    for index, score in iter_load_scores(paths, cache, max_workers):
+        scores[index] = score
+    return scores
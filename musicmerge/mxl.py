@@ -0,0 +1,119 @@
+"""
+Compressed MusicXML (.mxl): a zip container holding the MusicXML document.
+
+Documents are streamed in and out of the container: reading inflates the
+document as it is parsed, and writing deflates it as it is serialized, so
+neither the compressed nor the uncompressed file is held in memory whole.
+"""
+import contextlib
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+
+MXL_SUFFIX = '.mxl'
+MIMETYPE = 'application/vnd.recordare.musicxml'
+# zlib level of .mxl output: 0 (fastest, largest) to 9 (slowest, smallest)
+DEFAULT_COMPRESSION = 6
+# Name of the MusicXML document in containers written here
+ROOT_FILE = 'score.musicxml'
+
+CONTAINER_XML = f"""<?xml version="1.0" encoding="UTF-8"?>
+<container>
+  <rootfiles>
+    <rootfile full-path="{ROOT_FILE}" media-type="{MIMETYPE}+xml"/>
+  </rootfiles>
+</container>
+"""
+
+
+def is_compressed(path):
+    """Whether a file is an .mxl container, judged by its contents rather than its name."""
+    with open(path, 'rb') as f:
+        return f.read(4) == b'PK\x03\x04'
+
+
+def _root_file(archive):
+    """Name of the MusicXML document in an .mxl container."""
+    names = archive.namelist()
+    if 'META-INF/container.xml' in names:
+        container = ET.fromstring(archive.read('META-INF/container.xml'))
+        for rootfile in container.iter('rootfile'):
+            # The first root file is the score; others may be e.g. PDF renderings
+            media_type = rootfile.get('media-type')
+            if media_type is None or media_type.endswith('+xml') or media_type.endswith('/xml'):
+                return rootfile.get('full-path')
+    for name in names:
+        if not name.startswith('META-INF/') and name.lower().endswith(('.musicxml', '.xml')):
+            return name
+    raise ValueError(f"No MusicXML document in {archive.filename}")
+
+
+@contextlib.contextmanager
+def open_musicxml(path):
+    """
+    Open the MusicXML document of a .musicxml or .mxl file as a binary
+    stream. The document of an .mxl is inflated as it is read.
+    """
+    if not is_compressed(path):
+        with open(path, 'rb') as f:
+            yield f
+        return
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Damaged .mxl file: {e}") from e
+    with archive, archive.open(_root_file(archive)) as f:
+        yield f
+
+
+@contextlib.contextmanager
+def create_musicxml(path, compression=DEFAULT_COMPRESSION):
+    """
+    Open a binary stream to write a MusicXML document to `path`. If the
+    name ends in .mxl, the stream is a member of a new .mxl container,
+    deflated at zlib level `compression` as it is written.
+    """
+    if Path(path).suffix.lower() != MXL_SUFFIX:
+        with open(path, 'wb') as f:
+            yield f
+        return
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=compression) as archive:
+        # The mimetype entry comes first and uncompressed, as the format requires
+        archive.writestr('mimetype', MIMETYPE, compress_type=zipfile.ZIP_STORED)
+        archive.writestr('META-INF/container.xml', CONTAINER_XML)
+        with archive.open(ROOT_FILE, 'w') as document:
+            yield document
+
+
+def write_mxl(score, path, compression=DEFAULT_COMPRESSION):
+    """
+    Write a music21 score as compressed MusicXML. The XML is deflated as it
+    is serialized, instead of being written out and compressed afterwards
+    as music21's own .mxl export does.
+    """
+    from music21.musicxml import helpers, m21ToXml
+
+    exporter = m21ToXml.ScoreExporter(m21ToXml.GeneralObjectExporter().fromGeneralObject(score))
+    root = exporter.parse()
+    # Laid out as music21 writes .musicxml files: indented, attributes sorted
+    helpers.indent(root)
+    for element in root.iter():
+        if len(element.attrib) > 1:
+            attributes = sorted(element.attrib.items())
+            element.attrib.clear()
+            element.attrib.update(attributes)
+
+    with create_musicxml(path, compression) as document:
+        document.write(exporter.xmlHeader())
+        ET.ElementTree(root).write(document, encoding='utf-8', xml_declaration=False)
+
+
+def write_score(score, path, compression=DEFAULT_COMPRESSION):
+    """
+    Write a music21 score to `path` as MusicXML, compressed if the name
+    ends in .mxl.
+    """
+    if Path(path).suffix.lower() == MXL_SUFFIX:
+        write_mxl(score, path, compression)
+    else:
+        score.write('musicxml', fp=path)
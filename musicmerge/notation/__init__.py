@@ -0,0 +1,27 @@
+"""
+Compact score model used as the fast path for diffing.
+
+read_score() fills it from MusicXML without music21; music21 objects are
+only built for the measures (or score) that are rendered or exported.
+"""
+from .chord import Chord
+from .clef import Clef
+from .measure import Attributes, Measure
+from .note import Note
+from .part import Part
+from .reader import read_score
+from .score import Score
+
+# Version of the classes above as stored by loader.ParseCache; bump it
+# whenever their attributes or meaning change, so older entries are not read
+MODEL_VERSION = 2
+
+
+def to_music21(obj):
+    """
+    Return the music21 equivalent of a compact Score or Measure. music21
+    objects and None are returned unchanged.
+    """
+    if isinstance(obj, (Score, Measure)):
+        return obj.to_music21()
+    return obj
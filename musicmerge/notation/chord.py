@@ -0,0 +1,49 @@
+class Chord:
+    """
+    Notes struck together in one voice. Duration, onset and articulations
+    are taken from the first note, as MusicXML writes them.
+    """
+    __slots__ = ('notes',)
+
+    def __init__(self, notes):
+        self.notes = notes
+
+    def add_note(self, note):
+        self.notes.append(note)
+
+    def get_notes(self):
+        return self.notes
+
+    is_rest = False
+
+    @property
+    def pitches(self):
+        return tuple(n.pitch for n in self.notes)
+
+    @property
+    def duration(self):
+        return self.notes[0].duration
+
+    @property
+    def onset(self):
+        return self.notes[0].onset
+
+    @property
+    def voice(self):
+        return self.notes[0].voice
+
+    @property
+    def articulations(self):
+        return self.notes[0].articulations
+
+    @property
+    def stem(self):
+        # music21 keeps stems on the chord's notes, leaving the chord unspecified
+        return 'unspecified'
+
+    @property
+    def grace(self):
+        return self.notes[0].grace
+
+    def __str__(self):
+        return f"Chord: {self.pitches}"
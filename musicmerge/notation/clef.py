@@ -0,0 +1,28 @@
+class Clef:
+    __slots__ = ('sign', 'line', 'octave_change')
+
+    def __init__(self, sign, line, octave_change=0):
+        self.sign = sign
+        self.line = line
+        self.octave_change = octave_change
+
+    def key(self):
+        return (self.sign, self.line, self.octave_change)
+
+    def __eq__(self, other):
+        return isinstance(other, Clef) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __str__(self):
+        return f'Clef: {self.sign} on line {self.line}'
+
+
+def parse_clef(clef_element):
+    sign = clef_element.findtext('sign')
+    line = clef_element.findtext('line')
+    octave_change = clef_element.findtext('clef-octave-change')
+    return Clef(sign,
+                int(line) if line is not None else None,
+                int(octave_change) if octave_change is not None else 0)
@@ -0,0 +1,201 @@
+import hashlib
+import xml.etree.ElementTree as ET
+
+from .clef import parse_clef
+
+
+class Attributes:
+    """
+    The attribute state (divisions, key, time, staves, clefs) in effect at a
+    point in a part.
+    """
+    __slots__ = ('divisions', 'fifths', 'mode', 'beats', 'beat_type', 'staves', 'clefs')
+
+    def __init__(self, divisions=1, fifths=None, mode=None, beats=None, beat_type=None, staves=1, clefs=None):
+        self.divisions = divisions
+        self.fifths = fifths
+        self.mode = mode
+        self.beats = beats
+        self.beat_type = beat_type
+        self.staves = staves
+        self.clefs = clefs if clefs is not None else {}
+
+    def copy(self):
+        return Attributes(self.divisions, self.fifths, self.mode, self.beats,
+                          self.beat_type, self.staves, dict(self.clefs))
+
+    def update(self, element):
+        """
+        Apply a MusicXML <attributes> element to this state.
+        Returns:
+            (time signature, clefs) set by the element: the time signature as
+            'beats/beat-type' or None, and a list of (staff, Clef)
+        """
+        time_signature = None
+        divisions = element.findtext('divisions')
+        if divisions is not None:
+            self.divisions = int(divisions)
+        key = element.find('key')
+        if key is not None and key.findtext('fifths') is not None:
+            self.fifths = int(key.findtext('fifths'))
+            self.mode = key.findtext('mode')
+        time = element.find('time')
+        if time is not None and time.findtext('beats') is not None:
+            self.beats = time.findtext('beats')
+            self.beat_type = time.findtext('beat-type')
+            time_signature = f"{self.beats}/{self.beat_type}"
+        staves = element.findtext('staves')
+        if staves is not None:
+            self.staves = int(staves)
+        clefs = []
+        for clef_element in element.findall('clef'):
+            staff = int(clef_element.get('number', '1'))
+            clef = parse_clef(clef_element)
+            self.clefs[staff] = clef
+            clefs.append((staff, clef))
+        return time_signature, clefs
+
+    def get_divisions(self):
+        return self.divisions
+
+    def get_key(self):
+        return self.fifths
+
+    def get_staves(self):
+        return self.staves
+
+    def get_clefs(self):
+        return self.clefs
+
+    def to_xml(self, since=None):
+        """
+        Write this state as a MusicXML <attributes> element. Given the state
+        `since` in effect before, only what differs from it is written (the
+        element is empty if nothing does).
+        """
+        attributes = ET.Element('attributes')
+        if since is None or self.divisions != since.divisions:
+            ET.SubElement(attributes, 'divisions').text = str(self.divisions)
+        if self.fifths is not None and (since is None or (self.fifths, self.mode) != (since.fifths, since.mode)):
+            key = ET.SubElement(attributes, 'key')
+            ET.SubElement(key, 'fifths').text = str(self.fifths)
+            if self.mode:
+                ET.SubElement(key, 'mode').text = self.mode
+        if self.beats is not None and (since is None or
+                                       (self.beats, self.beat_type) != (since.beats, since.beat_type)):
+            time = ET.SubElement(attributes, 'time')
+            ET.SubElement(time, 'beats').text = self.beats
+            ET.SubElement(time, 'beat-type').text = self.beat_type
+        if self.staves > 1 and (since is None or self.staves != since.staves):
+            ET.SubElement(attributes, 'staves').text = str(self.staves)
+        for staff, clef in sorted(self.clefs.items()):
+            if since is not None and since.clefs.get(staff) == clef:
+                continue
+            element = ET.SubElement(attributes, 'clef', number=str(staff))
+            ET.SubElement(element, 'sign').text = clef.sign
+            if clef.line is not None:
+                ET.SubElement(element, 'line').text = str(clef.line)
+            if clef.octave_change:
+                ET.SubElement(element, 'clef-octave-change').text = str(clef.octave_change)
+        return attributes
+
+    def __str__(self):
+        return f"Attributes: {self.divisions} {self.fifths} {self.beats}/{self.beat_type}"
+
+
+class Measure:
+    """
+    One measure of one staff.
+
+    Keeps the notes needed for diffing, the attribute state at the start of
+    the measure and the measure's original MusicXML, so a music21 Measure
+    can be built on demand with to_music21().
+    """
+    __slots__ = ('number', 'attributes', 'staff', 'xml', 'notes',
+                 'time_signature', 'clef', '_fingerprint')
+
+    def __init__(self, number, attributes, staff=None, xml=None):
+        self.number = number
+        self.attributes = attributes
+        self.staff = staff
+        self.xml = xml
+        self.notes = []
+        # Set only when this measure itself changes them, like music21
+        self.time_signature = None
+        self.clef = None
+        self._fingerprint = None
+
+    def add_note(self, note):
+        self.notes.append(note)
+
+    def get_notes(self):
+        return self.notes
+
+    def get_measure_number(self):
+        return self.number
+
+    def get_time_signature(self):
+        return self.time_signature
+
+    def fingerprint(self):
+        """
+        Content hash over the same features as fingerprint.measure_fingerprint:
+        notes, chords, rests, durations, articulations, stem directions, the
+        time signature and the clef.
+        """
+        if self._fingerprint is None:
+            tokens = [
+                self.time_signature,
+                self.clef.key() if self.clef is not None else None,
+            ]
+            voices = {}
+            for element in self.notes:
+                voices.setdefault(element.voice, []).append(element)
+            for elements in voices.values():
+                for element in sorted(elements, key=lambda e: e.onset):
+                    tokens.append((
+                        element.voice,
+                        float(element.onset),
+                        'R' if element.is_rest else ('C' if len(element.pitches) > 1 else 'N'),
+                        element.pitches,
+                        float(element.duration),
+                        element.articulations,
+                        element.stem,
+                    ))
+            self._fingerprint = hashlib.blake2b(repr(tokens).encode('utf-8'), digest_size=16).hexdigest()
+        return self._fingerprint
+
+    def to_music21(self):
+        """
+        Build a music21 Measure from this measure's original MusicXML.
+
+        Only this measure is parsed. The attribute state in effect at its
+        start is prepended so pitches and durations read correctly, then
+        removed again so only the measure's own attributes remain.
+        """
+        from music21 import converter
+
+        element = ET.fromstring(self.xml)
+        element.insert(0, self.attributes.to_xml())
+        injected = {
+            'Clef': (self.staff or 1) in self.attributes.clefs,
+            'TimeSignature': self.attributes.beats is not None,
+            'KeySignature': self.attributes.fifths is not None,
+        }
+
+        document = ET.Element('score-partwise', version='4.0')
+        score_part = ET.SubElement(ET.SubElement(document, 'part-list'), 'score-part', id='P1')
+        ET.SubElement(score_part, 'part-name')
+        ET.SubElement(document, 'part', id='P1').append(element)
+
+        score = converter.parseData(ET.tostring(document, encoding='unicode'), format='musicxml')
+        part = score.parts[self.staff - 1 if self.staff else 0]
+        measure = part.getElementsByClass('Measure').first()
+        for class_name, present in injected.items():
+            first = measure.recurse().getElementsByClass(class_name).first() if present else None
+            if first is not None:
+                first.activeSite.remove(first)
+        return measure
+
+    def __str__(self):
+        return f"Measure {self.number} - {self.time_signature}"
@@ -0,0 +1,61 @@
+# Semitones above C for each step name
+STEP_SEMITONES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+# music21-style accidental spelling for <alter> values
+ALTER_NAMES = {-2: '--', -1: '-', 0: '', 1: '#', 2: '##'}
+
+
+class Note:
+    """
+    A single note or rest. Onset and duration are in quarter lengths
+    (fractions.Fraction), relative to the start of the measure.
+    """
+    __slots__ = ('step', 'alter', 'octave', 'duration', 'onset', 'voice',
+                 'articulations', 'stem', 'grace')
+
+    def __init__(self, step, alter, octave, duration, onset, voice=None,
+                 articulations=(), stem=None, grace=False):
+        self.step = step
+        self.alter = alter
+        self.octave = octave
+        self.duration = duration
+        self.onset = onset
+        self.voice = voice
+        self.articulations = articulations
+        self.stem = stem
+        self.grace = grace
+
+    @property
+    def is_rest(self):
+        return self.step is None
+
+    @property
+    def pitch(self):
+        """Spelled pitch name, e.g. 'C#4' or 'B-3'; None for rests."""
+        if self.step is None:
+            return None
+        return f"{self.step}{ALTER_NAMES.get(round(self.alter), '')}{self.octave}"
+
+    @property
+    def pitches(self):
+        return () if self.step is None else (self.pitch,)
+
+    @property
+    def midi(self):
+        if self.step is None:
+            return None
+        return 12 * (self.octave + 1) + STEP_SEMITONES[self.step] + round(self.alter)
+
+    def get_pitch(self):
+        return self.pitch
+
+    def get_duration(self):
+        return self.duration
+
+    def get_articulations(self):
+        return self.articulations
+
+    def __str__(self):
+        if self.step is None:
+            return f"Rest ({self.duration})"
+        return f"Note: {self.pitch} ({self.duration}, {self.articulations}, {self.stem})"
@@ -0,0 +1,20 @@
+class Part:
+    """
+    One staff of a part. Multi-staff parts (e.g. piano) are split into one
+    Part per staff with ids '<part id>-Staff<n>', matching music21's PartStaff.
+    """
+    def __init__(self, id, name, xml_id=None, staff=None):
+        self.id = id
+        self.name = name
+        self.xml_id = xml_id if xml_id is not None else id
+        self.staff = staff
+        self.measures = []
+
+    def add_bar(self, bar):
+        self.measures.append(bar)
+
+    def get_measures(self):
+        return self.measures
+
+    def __str__(self):
+        return f'Part: {self.name} ({self.id}) measures: {len(self.measures)}'
@@ -0,0 +1,288 @@
+import re
+import xml.etree.ElementTree as ET
+from fractions import Fraction
+
+from ..mxl import open_musicxml
+
+from .chord import Chord
+from .measure import Attributes, Measure
+from .note import Note
+from .part import Part
+from .score import Score
+
+# MusicXML <stem> values spelled the way music21 reports stemDirection
+STEM_DIRECTIONS = {'none': 'noStem'}
+
+METADATA_TAGS = ('work-title', 'work-number', 'movement-title', 'movement-number')
+
+# Measure tags, and what may hold text that looks like one
+_SKIPPED = rb'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<\?.*?\?>'
+MEASURE_START = re.compile(_SKIPPED + rb'|<measure[\s/>]', re.DOTALL)
+MEASURE_END = re.compile(_SKIPPED + rb'|</measure\s*>', re.DOTALL)
+MEASURE_NUMBER = re.compile(rb'\snumber\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+XML_ENCODING = re.compile(rb'<\?xml[^>]*?encoding\s*=\s*["\']([^"\']+)')
+# Bytes of the document before the next measure kept by _MeasureSource, at most
+KEEP_BYTES = 1 << 16
+
+
+def _measure_number(value):
+    match = re.match(r'\d+', value or '')
+    return int(match.group()) if match else 0
+
+
+def _articulation_name(tag):
+    """'strong-accent' -> 'StrongAccent', matching music21 class names."""
+    return ''.join(word.capitalize() for word in tag.split('-'))
+
+
+class _MeasureSource:
+    """
+    The document stream as read by iterparse, keeping the bytes read so the
+    MusicXML of each <measure> can be cut out of the source rather than
+    serialized again from the parsed element.
+
+    Measures are found by scanning for their tags in document order,
+    skipping comments, CDATA and processing instructions; if the scan ever
+    disagrees with the parser or the document is not UTF-8, measure()
+    returns None from then on and the elements are serialized instead.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = bytearray()
+        self.cursor = 0
+        self.enabled = None
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        if self.enabled is None:
+            match = XML_ENCODING.match(data.removeprefix(b'\xef\xbb\xbf'))
+            encoding = match.group(1).decode('ascii', 'replace').lower() if match else 'utf-8'
+            self.enabled = not data.startswith((b'\xff\xfe', b'\xfe\xff')) and encoding in ('utf-8', 'utf8', 'us-ascii')
+        if self.enabled:
+            self.buffer += data
+        return data
+
+    def measure(self, element):
+        """
+        Returns:
+            The source bytes of `element`, the next <measure> of the document, or None
+        """
+        if not self.enabled:
+            return None
+        start = self._find(MEASURE_START, self.cursor)
+        tag_end = self.buffer.find(b'>', start) + 1 if start is not None else 0
+        tag = self.buffer[start:tag_end] if tag_end else b''
+        end = tag_end if tag.endswith(b'/>') else self._find(MEASURE_END, tag_end, end=True)
+        number = MEASURE_NUMBER.search(tag)
+        number = (number.group(1) or number.group(2) or b'').decode('utf-8') if number else None
+        if not tag or end is None or number != element.get('number'):
+            self.enabled = False
+            self.buffer = bytearray()
+            return None
+        xml = bytes(self.buffer[start:end])
+        self.cursor = end
+        if self.cursor > KEEP_BYTES:
+            del self.buffer[:self.cursor]
+            self.cursor = 0
+        return xml
+
+    def _find(self, pattern, position, end=False):
+        """Start (or end) of the next match of `pattern` that is not skipped, or None"""
+        for match in pattern.finditer(self.buffer, position):
+            if not match.group().startswith((b'<!', b'<?')):
+                return match.end() if end else match.start()
+        return None
+
+
+class _PartReader:
+    """
+    Running state for one <part> while its measures stream past.
+    """
+    def __init__(self, xml_id):
+        self.xml_id = xml_id
+        self.attributes = Attributes()
+        self.measures = []
+        self._chord_notes = None
+
+    def read_measure(self, element, xml=None):
+        """
+        Read a <measure> element; `xml` is its source bytes if known.
+        """
+        start_attributes = self.attributes.copy()
+        number = _measure_number(element.get('number'))
+        position = Fraction(0)
+        notes_by_staff = {}
+        time_signature = None
+        clefs = {}
+        self._chord_notes = None
+
+        for child in element:
+            tag = child.tag
+            if tag == 'attributes':
+                time_signature = self._read_attributes(child, clefs if position == 0 else {}) or time_signature
+            elif tag == 'note':
+                position = self._read_note(child, position, notes_by_staff)
+            elif tag == 'backup':
+                position -= Fraction(int(child.findtext('duration', '0')), self.attributes.divisions)
+            elif tag == 'forward':
+                # music21 fills forwards with hidden rests; keep them so fingerprints agree
+                duration = Fraction(int(child.findtext('duration', '0')), self.attributes.divisions)
+                rest = Note(None, None, None, duration, position, child.findtext('voice', '1'))
+                notes_by_staff.setdefault(int(child.findtext('staff', '1')), []).append(rest)
+                position += duration
+
+        if xml is None:
+            xml = ET.tostring(element)
+        staves = max([self.attributes.staves] + list(notes_by_staff))
+        measures = []
+        for staff in range(1, staves + 1):
+            measure = Measure(number, start_attributes, staff if staves > 1 else None, xml)
+            measure.time_signature = time_signature
+            measure.clef = clefs.get(staff)
+            notes = notes_by_staff.get(staff, [])
+            # music21 only creates voices when a staff has more than one
+            if len({n.voice for n in notes}) <= 1:
+                for n in notes:
+                    for single in (n.notes if isinstance(n, Chord) else (n,)):
+                        single.voice = None
+            measure.notes = notes
+            measures.append(measure)
+        self.measures.append(measures)
+
+    def _read_attributes(self, element, clefs):
+        time_signature, changed = self.attributes.update(element)
+        for staff, clef in changed:
+            clefs.setdefault(staff, clef)
+        return time_signature
+
+    def _read_note(self, element, position, notes_by_staff):
+        grace = element.find('grace') is not None
+        in_chord = element.find('chord') is not None
+        duration = Fraction(0) if grace else Fraction(int(element.findtext('duration', '0')),
+                                                      self.attributes.divisions)
+        # Chords stay on the staff of their first note, even when they cross staves
+        if in_chord and self._chord_notes:
+            notes = self._chord_notes
+        else:
+            notes = notes_by_staff.setdefault(int(element.findtext('staff', '1')), [])
+            self._chord_notes = notes
+
+        step = alter = octave = None
+        pitch = element.find('pitch')
+        if pitch is None:
+            pitch = element.find('unpitched')
+            if pitch is not None:
+                step, octave = pitch.findtext('display-step'), int(pitch.findtext('display-octave'))
+                alter = 0
+        else:
+            step, octave = pitch.findtext('step'), int(pitch.findtext('octave'))
+            alter = float(pitch.findtext('alter', '0'))
+
+        stem = element.findtext('stem')
+        if step is not None and stem is None:
+            stem = 'unspecified'
+        stem = STEM_DIRECTIONS.get(stem, stem)
+
+        articulations = tuple(_articulation_name(a.tag) for a in element.iterfind('notations/articulations/*'))
+        articulations += tuple(_articulation_name(a.tag) for a in element.iterfind('notations/technical/*'))
+
+        onset = notes[-1].onset if in_chord and notes else position
+        note = Note(step, alter, octave, duration, onset, element.findtext('voice', '1'),
+                    articulations, stem if step is not None else None, grace)
+
+        if in_chord and notes:
+            previous = notes[-1]
+            if isinstance(previous, Chord):
+                previous.add_note(note)
+            else:
+                notes[-1] = Chord([previous, note])
+            return position
+
+        notes.append(note)
+        return position + duration
+
+    def parts(self, names):
+        """
+        Build the finished Part(s): one per staff, like music21's PartStaff.
+        """
+        staves = max((len(measures) for measures in self.measures), default=1)
+        name = names.get(self.xml_id)
+        if staves == 1:
+            part = Part(name or self.xml_id, name, self.xml_id)
+            for measures in self.measures:
+                part.add_bar(measures[0])
+            return [part]
+
+        parts = []
+        for staff in range(1, staves + 1):
+            part = Part(f"{self.xml_id}-Staff{staff}", name, self.xml_id, staff)
+            for measures in self.measures:
+                if staff <= len(measures):
+                    part.add_bar(measures[staff - 1])
+            parts.append(part)
+        return parts
+
+
+def read_measure(xml, attributes):
+    """
+    Read one <measure> element (XML bytes) written against the attribute
+    state `attributes`.
+    Returns:
+        List of Measure, one per staff
+    """
+    reader = _PartReader(None)
+    reader.attributes = attributes.copy()
+    reader.read_measure(ET.fromstring(xml))
+    return reader.measures[0]
+
+
+def read_score(path):
+    """
+    Read a MusicXML (score-partwise) file, plain or compressed (.mxl), into
+    the compact score model.
+
+    The file is streamed with iterparse and every <measure> element is cleared
+    as soon as it has been read, so no DOM of the whole document is kept.
+    Each measure keeps its MusicXML as written in the file (see
+    _MeasureSource). A compressed document is inflated as it is parsed.
+    Raises:
+        ValueError: if the document is not a score-partwise MusicXML file.
+    """
+    score = Score(source=str(path))
+    names = {}
+    part_reader = None
+    root = None
+
+    with open_musicxml(path) as document:
+        source = _MeasureSource(document)
+        for event, element in ET.iterparse(source, events=('start', 'end')):
+            tag = element.tag
+            if event == 'start':
+                if root is None:
+                    root = element
+                    if tag != 'score-partwise':
+                        raise ValueError(f"Unsupported MusicXML document <{tag}>, expected <score-partwise>")
+                elif tag == 'part' and element.get('id') is not None:
+                    part_reader = _PartReader(element.get('id'))
+                continue
+
+            if tag == 'measure':
+                # Every measure moves the source on, including those of parts without an id
+                xml = source.measure(element)
+                if part_reader is not None:
+                    part_reader.read_measure(element, xml)
+                element.clear()
+            elif tag == 'part' and part_reader is not None:
+                for part in part_reader.parts(names):
+                    score.add_part(part)
+                part_reader = None
+                element.clear()
+            elif tag == 'score-part':
+                # Same preference as music21's Instrument.bestName()
+                names[element.get('id')] = (element.findtext('part-name') or
+                                            element.findtext('part-abbreviation') or
+                                            element.findtext('score-instrument/instrument-name'))
+            elif tag in METADATA_TAGS:
+                score.add_metadata(tag, element.text)
+
+    return score
@@ -0,0 +1,30 @@
+class Score:
+    """
+    Compact score model filled by notation.reader.read_score.
+    """
+    def __init__(self, source=None):
+        self.parts = []
+        self.metadata = {}
+        self.source = source
+
+    def add_part(self, part):
+        self.parts.append(part)
+
+    def get_part_by_id(self, id):
+        for part in self.parts:
+            if part.id == id:
+                return part
+        return None
+
+    def add_metadata(self, key, value):
+        self.metadata[key] = value
+
+    def to_music21(self):
+        """
+        Parse the source file with music21. Each call returns a fresh score.
+        """
+        from music21 import converter
+        return converter.parse(self.source)
+
+    def __str__(self):
+        return "Score: " + str(self.metadata) + " " + str([str(p) for p in self.parts])
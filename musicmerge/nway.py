@@ -0,0 +1,156 @@
+from . import notation, tracing
+from .core import MergeOverlay, _part_name, part_differences, show_differences
+from .fingerprint import score_fingerprints
+from .threeway import _chunk_edits, _chunks, _matching
+
+@tracing.traced('n_way_merge')
+def n_way_merge(base, versions, base_fingerprints=None, version_fingerprints=None):
+    """
+    Merge many edited versions of a score against their common ancestor.
+
+    Every version is aligned with the base by measure fingerprints and each
+    part is split into diff3-style chunks. In a chunk, versions whose measures are identical
+    are grouped into one variant. A chunk with a single variant besides the
+    base (however many versions made it) is merged automatically; a chunk
+    with several distinct variants is a conflict, to be settled once with
+    choose_variant() whatever the number of contributors behind each variant.
+    Returns:
+        {
+            'merge': MergeOverlay,   # base with the automatic changes
+            'auto_resolved': int,    # measures resolved without review
+            'conflicts': [
+                {
+                    'part_id': str,
+                    'part_name': str,
+                    'measure_number': int,    # first base measure of the chunk
+                    'variants': [
+                        {
+                            'versions': [int],    # indices into `versions`
+                            'fingerprints': [str],
+                            'differences': [...]  # compare_scores-format edits from the base
+                        },
+                        ...
+                    ]
+                },
+                ...
+            ]
+        }
+    """
+    if base_fingerprints is None:
+        base_fingerprints = score_fingerprints(base)
+    if version_fingerprints is None:
+        version_fingerprints = [score_fingerprints(version) for version in versions]
+
+    matchings = [[_matching(base_fps, fps) for base_fps, fps in zip(base_fingerprints, fingerprints)]
+                 for fingerprints in version_fingerprints]
+
+    merge = MergeOverlay(base)
+    result = {'merge': merge, 'auto_resolved': 0, 'conflicts': []}
+
+    for k, base_part in enumerate(base.parts):
+        base_fps = base_fingerprints[k]
+        versions_fps = [fps[k] for fps in version_fingerprints]
+        part_matchings = [matching[k] for matching in matchings]
+
+        for stable, (b1, b2), ranges in _chunks(base_fps, versions_fps, part_matchings):
+            if stable:
+                continue
+            base_run = base_fps[b1:b2]
+            variants = {}
+            for v, (v1, v2) in enumerate(ranges):
+                run = tuple(versions_fps[v][v1:v2])
+                if list(run) != base_run:
+                    variants.setdefault(run, []).append(v)
+
+            found = []
+            for run, contributors in variants.items():
+                # Any contributor stands for the whole group: their measures are identical
+                v = contributors[0]
+                edits = _chunk_edits(base_fps, versions_fps[v], (b1, b2), ranges[v])
+                part_diff = part_differences(base_part, versions[v].parts[k], base_fps, versions_fps[v], edits)
+                if part_diff['differences']:
+                    found.append({'versions': contributors, 'fingerprints': list(run),
+                                  'differences': part_diff['differences']})
+            if not found:
+                continue
+
+            if len(found) == 1:
+                for measure_diff in found[0]['differences']:
+                    merge.choose(base_part.id, measure_diff)
+                result['auto_resolved'] += max(b2 - b1, len(found[0]['fingerprints']))
+            else:
+                result['conflicts'].append({
+                    'part_id': base_part.id,
+                    'part_name': _part_name(base_part),
+                    'measure_number': min(variant['differences'][0]['measure_number'] for variant in found),
+                    'variants': found,
+                })
+
+    return result
+
+
+def choose_variant(merge, conflict, variant_index):
+    """
+    Settle an n_way_merge conflict on its overlay: take variant
+    `variant_index`, or keep the base when it is None.
+    """
+    for variant in conflict['variants']:
+        for measure_diff in variant['differences']:
+            merge.choose(conflict['part_id'], measure_diff, source='score1')
+    if variant_index is not None:
+        for measure_diff in conflict['variants'][variant_index]['differences']:
+            merge.choose(conflict['part_id'], measure_diff)
+
+
+def interactive_n_way_merge(result, labels):
+    """
+    Ask the user to settle each conflict of an n_way_merge result, once per
+    distinct variant rather than once per contributor. `labels` names the
+    versions (e.g. their file names).
+    Returns:
+        The merged music21 score
+    """
+    merge = result['merge']
+    for conflict in result['conflicts']:
+        print(f"\nPart {conflict['part_name']}, measure {conflict['measure_number']}: "
+              f"{len(conflict['variants'])} different versions.")
+        for number, variant in enumerate(conflict['variants'], 1):
+            names = ", ".join(labels[v] for v in variant['versions'])
+            print(f"  {number} - from {names}")
+
+        while True:
+            user_input = input(
+                "Options:\n"
+                "  s<k> - Show variant k (highlighted against the base)\n"
+                "  <k>  - Keep variant k\n"
+                "  b    - Keep the base measures\n"
+                "  q    - Quit merging\n"
+                "Choose an option: "
+            ).strip().lower()
+
+            if user_input == 'b':
+                choose_variant(merge, conflict, None)
+                break
+            elif user_input == 'q':
+                print("Quitting merge early.")
+                return merge.build()
+            elif user_input.startswith('s') and user_input[1:].isdigit():
+                number = int(user_input[1:])
+                if not 1 <= number <= len(conflict['variants']):
+                    print("No such variant. Try again.")
+                    continue
+                for measure_diff in conflict['variants'][number - 1]['differences']:
+                    if measure_diff['score1_measure'] is None:
+                        notation.to_music21(measure_diff['score2_measure']).show('musicxml')
+                    elif measure_diff['score2_measure'] is None:
+                        print(f"Measure {measure_diff['measure_number']} is deleted in this variant.")
+                    else:
+                        show_differences(measure_diff['score1_measure'], measure_diff['score2_measure']).show()
+            elif user_input.isdigit() and 1 <= int(user_input) <= len(conflict['variants']):
+                choose_variant(merge, conflict, int(user_input) - 1)
+                break
+            else:
+                print("Invalid option. Try again.")
+
+    print("\nMerge complete!")
+    return merge.build()
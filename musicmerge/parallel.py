@@ -0,0 +1,152 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import notation, tracing
+from .align import align_measures
+from .columnar import align_part_columns
+from .core import _part_measures, compare_part, iter_compare_parts, part_differences
+from .fingerprint import score_fingerprints
+from .loader import stop_pool, wait_as_completed
+
+# Parts with fewer measures than this are compared in the parent process:
+# below it, copying a part to shared memory costs more than aligning it
+MIN_PARALLEL_MEASURES = 2000
+
+
+def _fingerprint_array(fingerprints):
+    return np.array([bytes.fromhex(fp) for fp in fingerprints], dtype='S16')
+
+
+def _share(arrays):
+    """
+    Copy the arrays of one part into a new shared memory block.
+    Returns:
+        (SharedMemory, layout) where layout holds (offset, dtype, length)
+        for each array, in order.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(sum(array.nbytes for array in arrays), 1))
+    layout = []
+    offset = 0
+    for array in arrays:
+        np.ndarray(array.shape, array.dtype, buffer=block.buf, offset=offset)[...] = array
+        layout.append((offset, array.dtype, len(array)))
+        offset += array.nbytes
+    return block, layout
+
+
+def _align_shared(name, layout, trace):
+    """
+    Align one part in a worker process, from the arrays the parent shared
+    under `name`: two fingerprint arrays, or the notes and measures columns
+    of both parts.
+    Returns:
+        (edits, trace events) - events only if the parent is tracing
+    """
+    if trace:
+        tracing.start()
+    # The parent unlinks the block once the part is done; workers only attach
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        with tracing.span('align part', measures=layout[0][2]):
+            arrays = [np.ndarray((length,), dtype, buffer=block.buf, offset=offset)
+                      for offset, dtype, length in layout]
+            if len(arrays) == 2:
+                edits = align_measures(arrays[0].tolist(), arrays[1].tolist())
+            else:
+                edits = align_part_columns({'notes': arrays[0], 'measures': arrays[1]},
+                                           {'notes': arrays[2], 'measures': arrays[3]})
+            del arrays
+    finally:
+        block.close()
+    return edits, tracing.stop() if trace else []
+
+
+def _is_large(part1, part2):
+    return max(len(_part_measures(part1)), len(_part_measures(part2))) >= MIN_PARALLEL_MEASURES
+
+
+@tracing.traced('compare_scores')
+def compare_scores_parallel(score1, score2, fingerprints1=None, fingerprints2=None,
+                            columns1=None, columns2=None, max_workers=None):
+    """
+    compare_scores with the measures of large parts aligned in a pool of
+    worker processes. The result has the same parts in the same order and
+    format as compare_scores.
+    """
+    differences = []
+    for _, _, part_diff in iter_compare_parts_parallel(score1, score2, fingerprints1, fingerprints2,
+                                                       columns1, columns2, max_workers):
+        # Only add parts with differences
+        if part_diff['differences']:
+            differences.append(part_diff)
+
+    return differences
+
+
+def iter_compare_parts_parallel(score1, score2, fingerprints1=None, fingerprints2=None,
+                                columns1=None, columns2=None, max_workers=None, cancelled=None):
+    """
+    core.iter_compare_parts with parts of at least MIN_PARALLEL_MEASURES
+    measures aligned in worker processes. Each such part is copied to its
+    own shared memory block (its columns if both are given, else its
+    fingerprints); workers attach to it and send back only the edits.
+    Smaller parts are compared in this process while the workers run.
+
+    Parts are yielded in score order. Closing the generator early, or
+    setting the threading.Event `cancelled`, stops the workers.
+    """
+    count = min(len(score1.parts), len(score2.parts))
+    large = [k for k in range(count) if _is_large(score1.parts[k], score2.parts[k])]
+    workers = min(max_workers or os.cpu_count() or 1, len(large))
+    use_columns = columns1 is not None and columns2 is not None
+    # Compact scores not hashed yet are prefiltered in this process, which
+    # is cheaper than fingerprinting them to share with the workers
+    prefilter = (not use_columns and fingerprints1 is None and fingerprints2 is None and
+                 isinstance(score1, notation.Score) and isinstance(score2, notation.Score))
+    if workers < 2 or prefilter:
+        yield from iter_compare_parts(score1, score2, fingerprints1, fingerprints2, columns1, columns2)
+        return
+
+    if fingerprints1 is None:
+        fingerprints1 = [None] * count if use_columns else score_fingerprints(score1)
+    if fingerprints2 is None:
+        fingerprints2 = [None] * count if use_columns else score_fingerprints(score2)
+    if not use_columns:
+        columns1 = columns2 = [None] * count
+
+    blocks = []
+    futures = {}
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for k in large:
+            if use_columns:
+                arrays = [columns1[k]['notes'], columns1[k]['measures'],
+                          columns2[k]['notes'], columns2[k]['measures']]
+            else:
+                arrays = [_fingerprint_array(fingerprints1[k]), _fingerprint_array(fingerprints2[k])]
+            block, layout = _share(arrays)
+            blocks.append(block)
+            futures[k] = pool.submit(_align_shared, block.name, layout, tracing.enabled())
+
+        for k, (part1, part2) in enumerate(zip(score1.parts, score2.parts)):
+            if cancelled is not None and cancelled.is_set():
+                return
+            with tracing.span('compare part', part=k, measures=len(_part_measures(part1))):
+                if k not in futures:
+                    part_diff = compare_part(part1, part2, fingerprints1[k], fingerprints2[k],
+                                             columns1[k], columns2[k])
+                else:
+                    if next(wait_as_completed([futures[k]], cancelled), None) is None:
+                        return
+                    edits, events = futures[k].result()
+                    tracing.add(events)
+                    part_diff = part_differences(part1, part2, fingerprints1[k], fingerprints2[k], edits)
+            yield k, count, part_diff
+    finally:
+        stop_pool(pool, futures.values())
+        for block in blocks:
+            block.close()
+            block.unlink()
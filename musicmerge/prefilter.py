@@ -0,0 +1,118 @@
+"""
+Find the measures two compact scores share in the file, before any
+fingerprinting.
+
+Most measures of two versions of a score written by the same editor are
+identical in the file. The reader already keeps each measure's MusicXML
+as written in the file, so comparing those bytes finds the untouched
+measures at the cost of a memory compare. Layout that the fingerprints
+ignore (indentation, <print> elements, default-x and similar positions) is
+removed from the bytes first, so a measure that was only moved on the page
+still counts as untouched. Only the measures in between are fingerprinted
+and aligned as usual.
+"""
+import re
+
+from . import notation, tracing
+from .align import align_measures
+
+# Below this share of score2 measures with an identical measure in score1
+# (e.g. a file re-saved by another editor), the pre-filter is skipped
+MIN_SHARED = 0.5
+
+# Whitespace between two tags, <print> elements and position attributes
+_INDENT = re.compile(rb'>\s+<')
+_PRINT = re.compile(rb'<print\b[^>]*/>|<print\b.*?</print>', re.DOTALL)
+_POSITION = re.compile(rb'\s(?:default|relative)-[xy]=(?:"[^"]*"|\'[^\']*\')')
+
+
+def normalize_layout(xml):
+    """
+    MusicXML bytes without the layout that does not reach a fingerprint:
+    whitespace between tags, <print> elements and default-x, default-y,
+    relative-x and relative-y attributes.
+    """
+    return _POSITION.sub(b'', _PRINT.sub(b'', _INDENT.sub(b'><', xml.strip())))
+
+
+def _without_layout(raw):
+    divisions, staves, xml = raw
+    return divisions, staves, normalize_layout(xml)
+
+
+def raw_content(measure):
+    """
+    What a measure is read from: its MusicXML after the start tag (the
+    number and width are not content) and the divisions and staves in
+    effect. Measures with equal raw content read to equal fingerprints,
+    and so do measures with equal raw content once normalize_layout is
+    applied to it.
+    """
+    xml = measure.xml
+    return (measure.attributes.divisions, measure.attributes.staves, xml[xml.find(b'>') + 1:])
+
+
+def unchanged_measures(measures1, measures2):
+    """
+    Align two parts by the raw content of their measures.
+    Returns:
+        List of (i, j) pairs of measures identical but for their layout, in
+        order, or None if too few measures are shared for this to save any work
+    """
+    if not all(isinstance(m, notation.Measure) and m.xml is not None for m in measures1 + measures2):
+        return None
+    raw1 = [raw_content(m) for m in measures1]
+    raw2 = [raw_content(m) for m in measures2]
+    # Measures without a byte-identical counterpart are compared without their
+    # layout. That may miss a few matches, which are then fingerprinted, but
+    # spares normalizing the bulk of the score.
+    shared = set(raw1).intersection(raw2)
+    raw1 = [raw if raw in shared else _without_layout(raw) for raw in raw1]
+    raw2 = [raw if raw in shared else _without_layout(raw) for raw in raw2]
+    shared = set(raw1).intersection(raw2)
+    if sum(raw in shared for raw in raw2) < MIN_SHARED * len(raw2):
+        return None
+
+    edits = align_measures(raw1, raw2)
+    changed1 = {i for operation, i, _ in edits if operation != 'insert'}
+    changed2 = {j for operation, _, j in edits if operation != 'delete'}
+    # The alignment is monotonic, so what is left pairs up in order
+    return list(zip((i for i in range(len(raw1)) if i not in changed1),
+                    (j for j in range(len(raw2)) if j not in changed2)))
+
+
+@tracing.traced('prefilter')
+def prefiltered_alignment(part1, part2):
+    """
+    align_measures for two compact parts, fingerprinting only the measures
+    that are not identical to their counterpart (but for their layout).
+    Returns:
+        (edits, fingerprints1, fingerprints2) as align_measures and
+        part_fingerprints would give them, except that fingerprints are
+        None for measures that are in no edit; or None if the pre-filter
+        does not apply and the parts should be aligned in full
+    """
+    measures1, measures2 = part1.measures, part2.measures
+    pairs = unchanged_measures(measures1, measures2)
+    if pairs is None:
+        return None
+
+    # Each unchanged pair gets a token of its own (an int, never equal to a
+    # fingerprint), so it is only matched with its counterpart
+    tokens1, tokens2 = [None] * len(measures1), [None] * len(measures2)
+    for k, (i, j) in enumerate(pairs):
+        tokens1[i] = tokens2[j] = k
+    for tokens, measures in ((tokens1, measures1), (tokens2, measures2)):
+        for i, token in enumerate(tokens):
+            if token is None:
+                tokens[i] = measures[i].fingerprint()
+
+    edits = align_measures(tokens1, tokens2)
+    fingerprints1 = [None] * len(measures1)
+    fingerprints2 = [None] * len(measures2)
+    for operation, i, j in edits:
+        if operation != 'insert':
+            fingerprints1[i] = measures1[i].fingerprint()
+        if operation != 'delete':
+            fingerprints2[j] = measures2[j].fingerprint()
+    return edits, fingerprints1, fingerprints2
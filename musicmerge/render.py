@@ -0,0 +1,202 @@
+import hashlib
+import json
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from . import notation, tracing
+from .loader import default_cache_dir
+
+# Image formats MuseScore can write from a job file
+FORMATS = ('png', 'svg')
+
+
+def render_key(*parts):
+    """
+    Cache key for a rendered image, e.g. render_key('measure', ...) or
+    render_key('differences', score2_key, score1_key).
+    """
+    return hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def measure_render_key(measure):
+    """
+    Cache key for the image of a measure (compact or music21), or None for
+    None. Fingerprints leave out things that are drawn (key signature,
+    lyrics, dynamics, ties), so the key is built from the measure's
+    MusicXML instead; for compact measures, together with its staff and
+    the attributes in effect at its start.
+    """
+    if measure is None:
+        return None
+    if isinstance(measure, notation.Measure):
+        return render_key('measure', measure.xml, measure.staff, ET.tostring(measure.attributes.to_xml()))
+    from music21.musicxml.m21ToXml import GeneralObjectExporter
+
+    data = GeneralObjectExporter(measure).parse()
+    # Drop what differs between two exports of the same measure
+    data = re.sub(rb'<encoding-date>[^<]*</encoding-date>', b'', data)
+    data = re.sub(rb' id="[^"]*"', b'', data)
+    return render_key('measure', data)
+
+
+class MeasureRenderer:
+    """
+    Renders measures to images with MuseScore, many per process launch.
+
+    Measures are queued with request() and converted together by flush(),
+    which writes one MusicXML file per measure plus a MuseScore job file
+    (`-j`, a JSON list of {"in": ..., "out": ...}) and runs MuseScore once.
+    Images are kept in a content-addressed cache directory, so a measure
+    whose key (see measure_render_key) was rendered before is never
+    rendered again.
+
+    Safe to use from several threads: MuseScore runs outside the lock, and
+    render() (for a measure the user is waiting on) does not wait for the
+    measures queued with request().
+    """
+    def __init__(self, musescore_path, cache_dir=None, fmt='png', timeout=120):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported render format {fmt!r}, expected one of {FORMATS}")
+        self.musescore_path = musescore_path
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir() / 'renders'
+        self.fmt = fmt
+        self.timeout = timeout
+        self.pending = {}
+        # Keys being rendered by a MuseScore run -> Event set when the run ends
+        self._rendering = {}
+        # Guards `pending` and `_rendering` only; never held while MuseScore runs
+        self._lock = threading.Lock()
+
+    def _cache_path(self, key):
+        return self.cache_dir / f"{key}.{self.fmt}"
+
+    def path(self, key):
+        """
+        Return the cached image for `key`, or None if it was not rendered yet.
+        """
+        path = self._cache_path(key)
+        return path if path.exists() else None
+
+    def request(self, key, measure):
+        """
+        Queue a measure (music21 or compact) for the next flush() unless its
+        image is already cached.
+        """
+        with self._lock:
+            if key not in self.pending and key not in self._rendering and self.path(key) is None:
+                self.pending[key] = measure
+
+    def _check_musescore(self):
+        if not self.musescore_path or not Path(self.musescore_path).exists():
+            raise ValueError("MuseScore path not configured correctly")
+
+    def _claim(self, measures):
+        """Mark `measures` as being rendered; called with the lock held"""
+        done = threading.Event()
+        for key in measures:
+            self._rendering[key] = done
+        return done
+
+    def _render_claimed(self, measures, done):
+        try:
+            with tracing.span('render', measures=len(measures)):
+                return self._run(measures)
+        finally:
+            with self._lock:
+                for key in measures:
+                    if self._rendering.get(key) is done:
+                        del self._rendering[key]
+            done.set()
+
+    def flush(self):
+        """
+        Render every queued measure in a single MuseScore run.
+        Returns:
+            Dict of key -> image path for the measures rendered
+        Raises:
+            ValueError: if MuseScore is not configured
+            RuntimeError: if MuseScore fails or produces no image for a measure
+        """
+        with self._lock:
+            if not self.pending:
+                return {}
+            self._check_musescore()
+            pending, self.pending = self.pending, {}
+            done = self._claim(pending)
+        return self._render_claimed(pending, done)
+
+    def _run(self, pending):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        rendered = {}
+        with tempfile.TemporaryDirectory(prefix='musicmerge-render-') as work:
+            work = Path(work)
+            jobs = []
+            for key, measure in pending.items():
+                source = work / f"{key}.musicxml"
+                notation.to_music21(measure).write('musicxml', source)
+                jobs.append({'in': str(source), 'out': str(work / f"{key}.{self.fmt}")})
+            job_file = work / 'job.json'
+            job_file.write_text(json.dumps(jobs), encoding='utf-8')
+
+            with tracing.span('musescore'):
+                result = subprocess.run([str(self.musescore_path), '-j', str(job_file)],
+                                        capture_output=True, timeout=self.timeout)
+            if result.returncode != 0:
+                raise RuntimeError(f"MuseScore failed ({result.returncode}): "
+                                   f"{result.stderr.decode('utf-8', 'replace').strip()}")
+
+            missing = []
+            for key in pending:
+                # MuseScore numbers the pages of image exports: key-1.png
+                for name in (f"{key}.{self.fmt}", f"{key}-1.{self.fmt}"):
+                    output = work / name
+                    if output.exists():
+                        shutil.move(str(output), self._cache_path(key))
+                        rendered[key] = self._cache_path(key)
+                        break
+                else:
+                    missing.append(key)
+            if missing:
+                raise RuntimeError(f"MuseScore produced no image for {len(missing)} measure(s)")
+        return rendered
+
+    def render(self, measures):
+        """
+        Render a dict of key -> measure, using the cache where possible.
+        The measures not cached are rendered in a MuseScore run of their
+        own, ahead of those queued with request() (they are taken out of the
+        queue); ones another run is rendering already are waited for.
+        Returns:
+            Dict of key -> image path, for every key in `measures`
+        Raises:
+            As flush()
+        """
+        while True:
+            with self._lock:
+                own, running = {}, set()
+                for key, measure in measures.items():
+                    if key in self._rendering:
+                        running.add(self._rendering[key])
+                    elif self.path(key) is None:
+                        own[key] = measure
+                if own:
+                    self._check_musescore()
+                    for key in own:
+                        self.pending.pop(key, None)
+                    done = self._claim(own)
+            if not own and not running:
+                return {key: self._cache_path(key) for key in measures}
+            if own:
+                self._render_claimed(own, done)
+            for event in running:
+                event.wait()
+            # Checked again: a run waited for may have failed
+
+    def clear(self):
+        for path in self.cache_dir.glob('*.' + self.fmt):
+            path.unlink(missing_ok=True)
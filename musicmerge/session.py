@@ -0,0 +1,405 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from . import __version__
+from .core import MergeOverlay, _part_measures, compare_scores
+from .fingerprint import score_fingerprints
+from .loader import default_cache_dir, load_scores_parallel
+from .threeway import three_way_merge
+
+SESSION_VERSION = 1
+# Decisions appended to a session's journal before it is written again in full
+JOURNAL_LIMIT = 1000
+# Input roles, in the order the files are loaded
+ROLES = ('score1', 'score2', 'base')
+
+
+class SessionError(Exception):
+    """Raised when a saved session cannot be read or does not fit its scores."""
+
+
+def file_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def default_session_path(files, directory=None):
+    """
+    Where the session for a set of input files is kept by default: one
+    file per combination of input paths, under `directory` (default: the
+    cache directory).
+    """
+    names = '\0'.join(str(Path(files[role]).resolve()) if files.get(role) else '' for role in ROLES)
+    key = hashlib.blake2b(names.encode('utf-8'), digest_size=16).hexdigest()
+    return Path(directory or default_cache_dir()) / 'sessions' / f"{key}.json"
+
+
+def journal_path(path):
+    """The journal of decisions made since the session at `path` was last written in full"""
+    return Path(path).with_suffix('.journal')
+
+
+def _decision_key(part_id, measure_diff):
+    return (part_id, measure_diff['operation'], measure_diff['measure_number'],
+            measure_diff.get('after_measure_number'),
+            measure_diff['score1_fingerprint'], measure_diff['score2_fingerprint'])
+
+
+def _record_key(part_id, record):
+    return (part_id, record['op'], record['number'], record['after'], record['fp1'], record['fp2'])
+
+
+def _measure_record(measure_diff, indices1, indices2, decision):
+    return {
+        'op': measure_diff['operation'],
+        'number': measure_diff['measure_number'],
+        'after': measure_diff.get('after_measure_number'),
+        # Positions of the measures in their parts, to find them again on resume
+        'i': indices1.get(id(measure_diff['score1_measure'])),
+        'j': indices2.get(id(measure_diff['score2_measure'])),
+        'fp1': measure_diff['score1_fingerprint'],
+        'fp2': measure_diff['score2_fingerprint'],
+        'decision': decision,
+    }
+
+
+class MergeSession:
+    """
+    The progress of one review: the differences of two scores, the decision
+    made on each so far and the position of the next one to review. Saved
+    as a small JSON file holding hashes of the input files, the differences
+    by part id, measure number and fingerprints (no measure content), the
+    decisions and the position. Decisions made since it was last written
+    are appended to a journal next to it (see log_decision).
+    """
+    def __init__(self, path, files, score1, score2, differences, merge=None, auto_resolved=0, hashes=None):
+        self.path = Path(path)
+        self.files = {role: str(files[role]) for role in ROLES if files.get(role)}
+        self.hashes = hashes or {role: file_hash(file) for role, file in self.files.items()}
+        self.score1 = score1
+        self.score2 = score2
+        self.differences = differences
+        self.merge = merge if merge is not None else MergeOverlay(score1)
+        self.auto_resolved = auto_resolved
+        # id(measure_diff) -> 'score1' or 'score2'
+        self.decisions = {}
+        # Index of the next difference to review, counting across parts
+        self.position = 0
+        # Number of differences in the last full save (None: not saved), and
+        # the decisions journaled since
+        self.saved_size = None
+        self.journaled = 0
+
+    def entries(self):
+        """(part_diff, measure_diff) of every difference, in review order"""
+        return [(part_diff, measure_diff) for part_diff in self.differences
+                for measure_diff in part_diff['differences']]
+
+    def decide(self, part_id, measure_diff, source):
+        """Record the reviewer's choice of measure, on the merge overlay too."""
+        self.merge.choose(part_id, measure_diff, source)
+        self.decisions[id(measure_diff)] = source
+
+    def log_decision(self, part_id, measure_diff):
+        """
+        Keep the decision on `measure_diff` and the position: append them to
+        the journal, which read_session replays over the last full save. The
+        session is written in full instead, emptying the journal, when its
+        differences changed since that save or the journal has grown long.
+        """
+        if self.saved_size != self.size() or self.journaled >= JOURNAL_LIMIT:
+            self.save()
+            return
+        entry = {'key': _decision_key(part_id, measure_diff), 'decision': self.decisions.get(id(measure_diff)),
+                 'position': self.position}
+        with open(journal_path(self.path), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self.journaled += 1
+
+    def reapply(self, part_diff, saved):
+        """Take over the saved_decisions that match differences of `part_diff`."""
+        for measure_diff in part_diff['differences']:
+            decision = saved.get(_decision_key(part_diff['part_id'], measure_diff))
+            if decision is not None:
+                self.decide(part_diff['part_id'], measure_diff, decision)
+
+    def first_undecided(self):
+        for index, (_, measure_diff) in enumerate(self.entries()):
+            if id(measure_diff) not in self.decisions:
+                return index
+        return len(self.entries())
+
+    def size(self):
+        return sum(len(part_diff['differences']) for part_diff in self.differences)
+
+    def undecided(self):
+        return sum(id(measure_diff) not in self.decisions for _, measure_diff in self.entries())
+
+    def refresh(self, score1, score2, differences, merge):
+        """
+        Follow new versions of the scores (e.g. after watch.update_differences),
+        keeping the decisions on differences that are still there.
+        """
+        current = {id(measure_diff) for part_diff in differences for measure_diff in part_diff['differences']}
+        self.decisions = {key: source for key, source in self.decisions.items() if key in current}
+        self.hashes = {role: file_hash(file) for role, file in self.files.items()}
+        self.score1, self.score2, self.differences, self.merge = score1, score2, differences, merge
+        self.saved_size = None
+
+    def to_dict(self):
+        parts = {}
+        for k, (part1, part2) in enumerate(zip(self.score1.parts, self.score2.parts)):
+            parts[part1.id] = (k, {id(m): i for i, m in enumerate(_part_measures(part1))},
+                               {id(m): j for j, m in enumerate(_part_measures(part2))})
+
+        differences, listed = [], set()
+        for part_diff in self.differences:
+            k, indices1, indices2 = parts[part_diff['part_id']]
+            records = []
+            for measure_diff in part_diff['differences']:
+                listed.add(id(measure_diff))
+                records.append(_measure_record(measure_diff, indices1, indices2,
+                                                    self.decisions.get(id(measure_diff))))
+            differences.append({'part_id': part_diff['part_id'], 'part_name': part_diff['part_name'],
+                                'part': k, 'differences': records})
+
+        # Choices made without review, e.g. by a three-way merge
+        automatic = []
+        for (part_id, _, _), measure_diff in self.merge.choices.items():
+            if id(measure_diff) not in listed:
+                k, indices1, indices2 = parts[part_id]
+                record = _measure_record(measure_diff, indices1, indices2, 'score2')
+                record.update(part_id=part_id, part=k)
+                automatic.append(record)
+
+        return {
+            'version': SESSION_VERSION,
+            'musicmerge': __version__,
+            'files': self.files,
+            'hashes': self.hashes,
+            'differences': differences,
+            'automatic': automatic,
+            'auto_resolved': self.auto_resolved,
+            'position': self.position,
+        }
+
+    def save(self):
+        """Write the whole session, atomically, and empty its journal."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, separators=(',', ':'))
+            os.replace(tmp, self.path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        # Replaying the journal over the new file would change nothing, so a
+        # crash before this line loses nothing either
+        journal_path(self.path).unlink(missing_ok=True)
+        self.saved_size = self.size()
+        self.journaled = 0
+
+    def delete(self):
+        self.path.unlink(missing_ok=True)
+        journal_path(self.path).unlink(missing_ok=True)
+        self.saved_size = None
+        self.journaled = 0
+
+
+def _replay(data, path):
+    """
+    Apply the journal of the session at `path` to its saved dict.
+    Returns:
+        The number of journal entries
+    """
+    try:
+        with open(journal_path(path), encoding='utf-8') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return 0
+    except OSError as e:
+        raise SessionError(f"Cannot read the journal of session {path}: {e}") from e
+    records = {_record_key(part['part_id'], record): record
+               for part in data['differences'] for record in part['differences']}
+    count = 0
+    for line in lines:
+        try:
+            entry = json.loads(line)
+            key = tuple(entry['key'])
+        except (ValueError, KeyError, TypeError):
+            # Cut short by a crash while it was appended
+            break
+        record = records.get(key)
+        if record is not None:
+            record['decision'] = entry['decision']
+        data['position'] = entry['position']
+        count += 1
+    return count
+
+
+def read_session(path):
+    """
+    Read a saved session file, with the decisions journaled since it was written.
+    Returns:
+        The saved dict, or None if there is no session at `path`
+    Raises:
+        SessionError: if the file is not a session this version can read
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        raise SessionError(f"Cannot read session {path}: {e}") from e
+    if not isinstance(data, dict) or data.get('version') != SESSION_VERSION:
+        raise SessionError(f"{path} is not a musicmerge session (version {SESSION_VERSION})")
+    data['journaled'] = _replay(data, path)
+    return data
+
+
+def load_saved(path, files):
+    """
+    The session saved at `path` for these input files, or None if there is
+    none or it cannot be used.
+    """
+    try:
+        data = read_session(path)
+    except SessionError:
+        return None
+    if data is None or data['files'] != {role: str(files[role]) for role in ROLES if files.get(role)}:
+        return None
+    return data
+
+
+def inputs_unchanged(data):
+    """Whether every input file of a saved session still has the saved contents."""
+    try:
+        return all(file_hash(data['files'][role]) == digest for role, digest in data['hashes'].items())
+    except OSError:
+        return False
+
+
+def _measure_diff(record, part_id, measures1, measures2):
+    measure1 = measures1[record['i']] if record['i'] is not None else None
+    measure2 = measures2[record['j']] if record['j'] is not None else None
+    measure_diff = {
+        'measure_number': record['number'],
+        'operation': record['op'],
+        'score1_measure': measure1,
+        'score2_measure': measure2,
+        'score1_fingerprint': record['fp1'],
+        'score2_fingerprint': record['fp2'],
+    }
+    if record['op'] == 'insert':
+        measure_diff['after_measure_number'] = record['after']
+    # The file hashes already match; this only guards against a change in how scores are read
+    numbered = measure2 if record['op'] == 'insert' else measure1
+    if numbered is None or numbered.number != record['number']:
+        raise SessionError(f"Part {part_id}, measure {record['number']} does not match the saved session")
+    return measure_diff
+
+
+def restore_session(path, files, score1, score2, data):
+    """
+    Rebuild a saved session on the scores it was saved from, without
+    comparing them: measures are found again by their saved positions.
+    Raises:
+        SessionError: if the scores do not fit the session
+    """
+    session = MergeSession(path, files, score1, score2, [], auto_resolved=data['auto_resolved'],
+                           hashes=data['hashes'])
+    parts1, parts2 = score1.parts, score2.parts
+    measures = {}
+
+    def part_measures(k):
+        if k not in measures:
+            measures[k] = (_part_measures(parts1[k]), _part_measures(parts2[k]))
+        return measures[k]
+
+    try:
+        for saved in data['differences']:
+            measures1, measures2 = part_measures(saved['part'])
+            part_diff = {'part_id': saved['part_id'], 'part_name': saved['part_name'], 'differences': []}
+            for record in saved['differences']:
+                measure_diff = _measure_diff(record, saved['part_id'], measures1, measures2)
+                part_diff['differences'].append(measure_diff)
+                if record['decision'] is not None:
+                    session.decide(saved['part_id'], measure_diff, record['decision'])
+            session.differences.append(part_diff)
+
+        for record in data['automatic']:
+            measures1, measures2 = part_measures(record['part'])
+            session.merge.choose(record['part_id'], _measure_diff(record, record['part_id'], measures1, measures2))
+    except (IndexError, KeyError) as e:
+        raise SessionError(f"The scores do not match the saved session: {e!r}") from e
+    session.position = data['position']
+    # The file on disk and its journal hold this state already
+    session.saved_size = session.size()
+    session.journaled = data['journaled']
+    return session
+
+
+def saved_decisions(data):
+    """
+    The decisions of a saved session, by part id, operation, measure
+    numbers and fingerprints, to be found again after its inputs changed.
+    """
+    saved = {}
+    for part in data['differences']:
+        for record in part['differences']:
+            if record['decision'] is not None:
+                saved[_record_key(part['part_id'], record)] = record['decision']
+    return saved
+
+
+def start_session(files, path=None, cache=None, resume=True):
+    """
+    Open the review of `files` ({'score1': path, 'score2': path, 'base': path
+    or None}), resuming the session saved at `path` (default:
+    default_session_path) if there is one.
+
+    Scores come through the parse cache, so unchanged files are not parsed
+    again. If the input files are unchanged since the session was saved,
+    the differences and decisions are rebuilt from the session without
+    comparing the scores; otherwise they are compared (or three-way merged)
+    again and saved decisions are kept for differences that are still the same.
+    Returns:
+        (MergeSession, resumed) where resumed is 'unchanged', 'changed' or None
+    """
+    path = Path(path) if path is not None else default_session_path(files)
+    data = load_saved(path, files) if resume else None
+
+    roles = [role for role in ROLES if files.get(role)]
+    scores = dict(zip(roles, load_scores_parallel([files[role] for role in roles], cache)))
+    score1, score2 = scores['score1'], scores['score2']
+
+    if data is not None and inputs_unchanged(data):
+        try:
+            return restore_session(path, files, score1, score2, data), 'unchanged'
+        except SessionError:
+            # Compare again instead
+            pass
+
+    if 'base' in scores:
+        fingerprints1, fingerprints2 = score_fingerprints(score1), score_fingerprints(score2)
+        result = three_way_merge(scores['base'], score1, score2, None, fingerprints1, fingerprints2)
+        session = MergeSession(path, files, score1, score2, result['conflicts'], result['merge'],
+                               result['auto_resolved'])
+    else:
+        session = MergeSession(path, files, score1, score2, compare_scores(score1, score2))
+
+    if data is None:
+        return session, None
+    saved = saved_decisions(data)
+    for part_diff in session.differences:
+        session.reapply(part_diff, saved)
+    session.position = session.first_undecided()
+    return session, 'changed'
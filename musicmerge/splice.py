@@ -0,0 +1,452 @@
+"""
+Export a merge by splicing MusicXML: score1's file is copied byte for byte,
+except for the <measure> elements taken from score2, which are replaced by
+score2's own XML for them. Layout, credits and formatting nobody changed
+are kept exactly, and music21 is not involved at all.
+"""
+import math
+import xml.etree.ElementTree as ET
+import xml.parsers.expat
+from fractions import Fraction
+
+from . import notation, tracing
+from .mxl import DEFAULT_COMPRESSION, create_musicxml, open_musicxml, write_score
+from .notation.measure import Attributes
+from .notation.reader import _measure_number, read_measure
+
+# Bytes of score1 read and parsed at a time
+CHUNK_SIZE = 1 << 16
+
+
+class SpliceError(Exception):
+    """Raised when a merge cannot be spliced, e.g. score1's file changed since it was read."""
+
+
+def can_splice(merge):
+    """
+    Whether a MergeOverlay can be exported by splice_export: score1 must be
+    a compact score read from a file, and every chosen measure compact.
+    """
+    if not isinstance(merge.score1, notation.Score) or not merge.score1.source:
+        return False
+    return all(isinstance(measure, notation.Measure)
+               for measure_diff in merge.choices.values()
+               for measure in (measure_diff['score1_measure'], measure_diff['score2_measure'])
+               if measure is not None)
+
+
+def _staff(measure):
+    return measure.staff or 1
+
+
+def _end_state(element, start):
+    """The attribute state after a <measure> element written against `start`."""
+    state = start.copy()
+    for attributes in element.iterfind('attributes'):
+        state.update(attributes)
+    return state
+
+
+def _after_start_tag(xml):
+    return xml.index(b'>') + 1
+
+
+def _with_attributes(xml, attributes):
+    """Measure XML with an <attributes> element put right after its start tag."""
+    if attributes is None:
+        return xml
+    at = _after_start_tag(xml)
+    return xml[:at] + ET.tostring(attributes) + xml[at:]
+
+
+class _Output:
+    """
+    A measure to write in place of (or next to) one of score1's: its XML,
+    the attribute state it was written against and the state after it.
+    """
+    __slots__ = ('xml', 'start', 'end')
+
+    def __init__(self, xml, start, end):
+        self.xml = xml
+        self.start = start
+        self.end = end
+
+
+def _whole(measure, number=None):
+    """A score2 measure as written in score2, for all of its staves."""
+    xml = measure.xml.rstrip()
+    element = ET.fromstring(xml)
+    if number is not None and element.get('number') != number:
+        # Keep score1's numbering, as MergeOverlay.build does
+        element.set('number', number)
+        xml = ET.tostring(element)
+    return _Output(xml, measure.attributes, _end_state(element, measure.attributes))
+
+
+def _scale(element, factor):
+    for child in element:
+        if child.tag in ('duration', 'offset') and child.text:
+            child.text = str(int(Fraction(child.text.strip()) * factor))
+
+
+def _combine(segments, number=None):
+    """
+    One measure made of the given staves of several measures.
+
+    `segments` is a list of (measure, staves, base): the staves of `measure`
+    to keep and whether it is the measure whose print, barline, key and
+    time elements are kept. All durations are brought to a common number
+    of divisions; the segments are joined with <backup>.
+    """
+    elements = [(ET.fromstring(measure.xml), measure, staves, base) for measure, staves, base in segments]
+    divisions = 1
+    for element, measure, _, _ in elements:
+        divisions = math.lcm(divisions, measure.attributes.divisions,
+                             *(int(d.text) for d in element.iterfind('attributes/divisions')))
+
+    base_element, base_measure = next((e, m) for e, m, _, base in elements if base)
+    combined = ET.Element('measure', base_element.attrib)
+    if number is not None:
+        combined.set('number', number)
+    start = base_measure.attributes.copy()
+    start.divisions = divisions
+    cursor = 0
+
+    # Gaps left by dropped notes (e.g. of a voice crossing into a staff that
+    # is not kept) are bridged with <forward>, which readers show as hidden rests
+    def move(position, staff):
+        nonlocal cursor
+        if position != cursor:
+            step = ET.SubElement(combined, 'backup' if position < cursor else 'forward')
+            ET.SubElement(step, 'duration').text = str(abs(position - cursor))
+            if position > cursor:
+                ET.SubElement(step, 'staff').text = str(staff)
+            cursor = position
+
+    for element, measure, staves, base in elements:
+        if not base:
+            for staff in staves:
+                if staff in measure.attributes.clefs:
+                    start.clefs[staff] = measure.attributes.clefs[staff]
+        factor = divisions // measure.attributes.divisions
+        position = onset = 0
+        included = False
+        for child in element:
+            tag = child.tag
+            if tag == 'note':
+                chord = child.find('chord') is not None
+                duration = 0 if child.find('grace') is not None else int(child.findtext('duration', '0')) * factor
+                staff = int(child.findtext('staff', '1'))
+                if not chord:
+                    onset = position
+                    position += duration
+                    included = staff in staves
+                if included:
+                    if not chord:
+                        move(onset, staff)
+                        cursor = onset + duration
+                    _scale(child, factor)
+                    combined.append(child)
+            elif tag in ('backup', 'forward'):
+                duration = int(child.findtext('duration', '0')) * factor
+                staff = int(child.findtext('staff', '1'))
+                if tag == 'forward' and staff in staves:
+                    move(position, staff)
+                    _scale(child, factor)
+                    combined.append(child)
+                    cursor = position + duration
+                position += duration if tag == 'forward' else -duration
+            elif tag == 'attributes':
+                divisions_element = child.find('divisions')
+                if divisions_element is not None:
+                    # Durations are already brought to the combined divisions
+                    factor = divisions // int(divisions_element.text)
+                    child.remove(divisions_element)
+                for item in list(child):
+                    if item.tag == 'clef':
+                        keep = int(item.get('number', '1')) in staves
+                    else:
+                        keep = base
+                    if not keep:
+                        child.remove(item)
+                if len(child):
+                    move(position, min(staves))
+                    combined.append(child)
+            elif tag == 'direction':
+                if int(child.findtext('staff', '1')) in staves:
+                    move(position, min(staves))
+                    _scale(child, factor)
+                    combined.append(child)
+            elif base:
+                move(position, min(staves))
+                _scale(child, factor)
+                combined.append(child)
+        if (measure, staves, base) != segments[-1]:
+            # The next segment starts from the beginning of the measure again
+            move(0, min(staves))
+
+    return _Output(ET.tostring(combined), start, _end_state(combined, start))
+
+
+class _PartPlan:
+    """
+    What happens to the measures of one <part> of score1, by the index of
+    the <measure> element in the part.
+    """
+    def __init__(self):
+        # index -> {staff: score1 Measure}
+        self.measures = {}
+        # index -> {staff: score2 Measure} taken in place of score1's
+        self.replaced = {}
+        # index -> staves of score1's measure dropped
+        self.deleted = {}
+        # index -> [(staff, score2 Measure)] inserted after it; -1 for before the first
+        self.inserted = {}
+
+
+def _plan(merge):
+    """
+    Sort the merge choices by <part> and <measure> element of score1.
+    Returns:
+        {xml part id: _PartPlan}
+    """
+    score1 = merge.score1
+    parts = {part.id: part for part in score1.parts}
+    plans = {}
+    for (part_id, measure_number, operation), measure_diff in merge.choices.items():
+        part = parts.get(part_id)
+        if part is None:
+            raise SpliceError(f"No part {part_id} in score1")
+        plan = plans.get(part.xml_id)
+        if plan is None:
+            plan = plans[part.xml_id] = _PartPlan()
+            # The staves of a <measure> element share its XML
+            staff_parts = [p for p in score1.parts if p.xml_id == part.xml_id]
+            elements = {}
+            for staff_part in staff_parts:
+                for measure in staff_part.measures:
+                    index = elements.setdefault(id(measure.xml), len(elements))
+                    plan.measures.setdefault(index, {})[_staff(measure)] = measure
+            plan.indices = {id(measure): index for index, staves in plan.measures.items()
+                            for measure in staves.values()}
+            plan.numbers = {}
+            for index, staves in sorted(plan.measures.items()):
+                for staff, measure in staves.items():
+                    plan.numbers.setdefault((staff, measure.number), index)
+
+        staff = part.staff or 1
+        if operation == 'insert':
+            after = measure_diff['after_measure_number']
+            index = -1 if after is None else plan.numbers.get((staff, after))
+            if index is None:
+                raise SpliceError(f"No measure {after} in part {part_id} of score1")
+            plan.inserted.setdefault(index, []).append((staff, measure_diff['score2_measure']))
+            continue
+        index = plan.indices.get(id(measure_diff['score1_measure']))
+        if index is None:
+            raise SpliceError(f"Measure {measure_number} of part {part_id} is not from score1")
+        if operation == 'delete':
+            plan.deleted.setdefault(index, set()).add(staff)
+        else:
+            plan.replaced.setdefault(index, {})[staff] = measure_diff['score2_measure']
+    return plans
+
+
+def _siblings(measure):
+    """Every staff of `measure`'s <measure> element, by staff, read again from its XML."""
+    return {_staff(m): m for m in read_measure(measure.xml, measure.attributes)}
+
+
+class _PartWriter:
+    """
+    Works out the measures to write for one part of score1 as its <measure>
+    elements stream past, keeping track of the attribute state in effect.
+    """
+    def __init__(self, plan):
+        self.plan = plan
+        # State in effect in the output, when it differs from score1's own flow
+        self.state = None
+
+    def _emit(self, output):
+        xml = _with_attributes(output.xml, self._change(output.start))
+        self.state = output.end
+        return xml
+
+    def _change(self, expected):
+        if self.state is None:
+            return None
+        attributes = expected.to_xml(since=self.state)
+        return attributes if len(attributes) else None
+
+    def _score1_state(self, index, after=False):
+        """score1's attribute state before (or after) its measure at `index`"""
+        if index < 0:
+            return Attributes()
+        if after:
+            following = self.plan.measures.get(index + 1)
+            if following:
+                return next(iter(following.values())).attributes
+            measure = next(iter(self.plan.measures[index].values()))
+            return _end_state(ET.fromstring(measure.xml), measure.attributes)
+        return next(iter(self.plan.measures[index].values())).attributes
+
+    def _inserted(self, index):
+        outputs = []
+        groups = {}
+        for staff, measure in self.plan.inserted.get(index, ()):
+            groups.setdefault(id(measure.xml), (measure, set()))[1].add(staff)
+        for measure, staves in groups.values():
+            if staves >= set(_siblings(measure)):
+                outputs.append(_whole(measure))
+            else:
+                outputs.append(_combine([(measure, staves, True)]))
+        if outputs and self.state is None:
+            self.state = self._score1_state(index, after=True)
+        return [self._emit(output) for output in outputs]
+
+    def measure(self, index, xml, number):
+        """
+        The XML to write for score1's measure at `index` (original bytes
+        `xml`, number attribute `number`), followed by measures inserted after it.
+        Returns:
+            List of XML byte strings
+        """
+        staves = self.plan.measures.get(index)
+        if staves is None:
+            raise SpliceError("score1 has more measures than were read from it")
+        first = next(iter(staves.values()))
+        if _measure_number(number) != first.number:
+            raise SpliceError(f"Measure {number} of score1 does not match the score that was read")
+
+        written = self._inserted(-1) if index == 0 else []
+        replaced = self.plan.replaced.get(index, {})
+        deleted = self.plan.deleted.get(index, set())
+        if not replaced and not deleted:
+            # Back to score1's own flow; its end state is None again
+            written.append(self._emit(_Output(xml, first.attributes, None)))
+        else:
+            if self.state is None:
+                self.state = first.attributes
+            output = self._replacement(staves, replaced, deleted, number)
+            if output is not None:
+                written.append(self._emit(output))
+        return written + self._inserted(index)
+
+    def _replacement(self, staves, replaced, deleted, number):
+        kept = set(staves) - set(replaced) - deleted
+        if not replaced:
+            if not kept:
+                return None
+            return _combine([(staves[min(kept)], kept, True)], number)
+
+        sources = {}
+        for staff, measure in replaced.items():
+            sources.setdefault(id(measure.xml), (measure, set()))[1].add(staff)
+        if len(sources) == 1 and not deleted:
+            measure, taken = next(iter(sources.values()))
+            siblings = _siblings(measure)
+            # The other staves may come along if they are the same in both scores
+            if all(staff in siblings and siblings[staff].fingerprint() == staves[staff].fingerprint()
+                   for staff in kept):
+                return _whole(measure, number)
+
+        segments = [(staves[min(kept)], kept, True)] if kept else []
+        for measure, taken in sources.values():
+            segments.append((measure, taken, not segments))
+        return _combine(segments, number)
+
+
+class _Splicer:
+    """
+    Streams score1's MusicXML through expat, copying it to `output` and
+    swapping in the measures worked out by a _PartWriter for each part.
+    """
+    def __init__(self, plans, output):
+        self.plans = plans
+        self.output = output
+        self.parser = xml.parsers.expat.ParserCreate()
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        # Bytes not yet written, starting at offset `base` of the input
+        self.buffer = b''
+        self.base = 0
+        self.depth = 0
+        self.part = None
+        self.index = -1
+        self.measure_start = None
+        self.measure_number = None
+
+    def feed(self, data, final=False):
+        self.buffer += data
+        try:
+            self.parser.Parse(data, final)
+        except xml.parsers.expat.ExpatError as e:
+            raise SpliceError(f"Cannot read score1: {e}") from e
+        if final:
+            self.output.write(self.buffer)
+            self.buffer = b''
+
+    def start(self, name, attributes):
+        self.depth += 1
+        if self.depth == 2 and name == 'part':
+            plan = self.plans.get(attributes.get('id'))
+            self.part = _PartWriter(plan) if plan is not None else None
+            self.index = -1
+        elif self.depth == 3 and name == 'measure' and self.part is not None:
+            self.index += 1
+            self.measure_start = self.parser.CurrentByteIndex
+            self.measure_number = attributes.get('number')
+
+    def end(self, name):
+        self.depth -= 1
+        if self.depth != 2 or name != 'measure' or self.part is None:
+            return
+        start = self.measure_start - self.base
+        end = self.buffer.index(b'>', self.parser.CurrentByteIndex - self.base) + 1
+        before = self.buffer[:start]
+        indent = before[len(before.rstrip()):]
+        written = self.part.measure(self.index, self.buffer[start:end], self.measure_number)
+        self.output.write(before)
+        self.output.write(indent.join(written))
+        self.buffer = self.buffer[end:]
+        self.base += end
+
+
+@tracing.traced('splice export')
+def splice_export(merge, output_file, compression=DEFAULT_COMPRESSION):
+    """
+    Write a MergeOverlay by splicing: score1's file is streamed to
+    `output_file` unchanged except for the measures taken from score2,
+    which are written as score2 has them. Where the attribute state
+    (divisions, key, time, clefs) differs at either side of a spliced
+    measure, an <attributes> element restores it. A staff of a multi-staff
+    part is taken alone by joining its notes with the other staves' of
+    score1. The output is compressed if its name ends in .mxl.
+    Raises:
+        SpliceError: if the merge cannot be spliced; the output file may
+            then be incomplete
+    """
+    if not can_splice(merge):
+        raise SpliceError("Only merges of scores read by musicmerge can be spliced")
+    plans = _plan(merge)
+    with open_musicxml(merge.score1.source) as source, create_musicxml(output_file, compression) as output:
+        splicer = _Splicer(plans, output)
+        for data in iter(lambda: source.read(CHUNK_SIZE), b''):
+            splicer.feed(data)
+        splicer.feed(b'', final=True)
+
+
+def write_merge(merge, output_file, compression=DEFAULT_COMPRESSION):
+    """
+    Write a MergeOverlay: spliced (see splice_export) when possible, else
+    built with music21 and written out whole.
+    """
+    if can_splice(merge):
+        try:
+            splice_export(merge, output_file, compression)
+            return
+        except SpliceError:
+            pass
+    merged = merge.build()
+    with tracing.span('write musicxml'):
+        write_score(merged, output_file, compression)
@@ -0,0 +1,122 @@
+from .align import align_measures
+from . import tracing
+from .core import MergeOverlay, part_differences
+from .fingerprint import score_fingerprints
+
+
+def _matching(base_fps, other_fps):
+    """
+    Pair the measures a part has kept unchanged since the base version.
+    Returns:
+        Dict of base measure index -> index of the equal measure in `other`
+    """
+    edited_base, edited_other = set(), set()
+    for operation, i, j in align_measures(base_fps, other_fps):
+        if operation in ('modify', 'delete'):
+            edited_base.add(i)
+        if operation in ('modify', 'insert'):
+            edited_other.add(j)
+    kept_base = [i for i in range(len(base_fps)) if i not in edited_base]
+    kept_other = [j for j in range(len(other_fps)) if j not in edited_other]
+    return dict(zip(kept_base, kept_other))
+
+
+def _chunks(base_fps, versions_fps, matchings=None):
+    """
+    Split a part into diff3 chunks: runs of measures equal in the base and
+    every version, and the changed runs between them. `matchings` may give
+    the _matching of each version, if already computed.
+    Yields:
+        (stable, (b1, b2), [(v1, v2), ...]) index ranges into the base and
+        into each version
+    """
+    if matchings is None:
+        matchings = [_matching(base_fps, fps) for fps in versions_fps]
+    stable = [i for i in range(len(base_fps)) if all(i in matching for matching in matchings)]
+
+    b = 0
+    positions = [0] * len(versions_fps)
+    for i in stable + [None]:
+        if i is None:
+            b_end = len(base_fps)
+            ends = [len(fps) for fps in versions_fps]
+        else:
+            b_end = i
+            ends = [matching[i] for matching in matchings]
+        if b != b_end or positions != ends:
+            yield False, (b, b_end), list(zip(positions, ends))
+        if i is not None:
+            yield True, (i, i + 1), [(end, end + 1) for end in ends]
+            b = i + 1
+            positions = [end + 1 for end in ends]
+
+
+def _chunk_edits(ours_fps, theirs_fps, ours_range, theirs_range):
+    """
+    Edits turning the ours side of a chunk into the theirs side, as
+    align_measures tuples with indices into the whole part.
+    """
+    (o1, o2), (t1, t2) = ours_range, theirs_range
+    return [(operation, o1 + i, t1 + j)
+            for operation, i, j in align_measures(ours_fps[o1:o2], theirs_fps[t1:t2])]
+
+
+@tracing.traced('three_way_merge')
+def three_way_merge(base, ours, theirs, base_fingerprints=None, ours_fingerprints=None,
+                    theirs_fingerprints=None):
+    """
+    Merge two edited versions of a score against their common ancestor.
+
+    Parts are matched by position, as in compare_scores. Each part is split
+    into diff3 chunks by measure fingerprints. A chunk changed in only one
+    version, or changed identically in both, is resolved automatically;
+    changes made in ours are already in place and changes made in theirs
+    are recorded on the returned MergeOverlay. Chunks changed differently
+    on both sides are conflicts, reported in compare_scores format with
+    ours as score1 and theirs as score2, so they can be reviewed with
+    interactive_merge or the merge screen and chosen on the same overlay.
+    Returns:
+        {
+            'merge': MergeOverlay,    # ours with the automatic changes from theirs
+            'auto_resolved': int,     # measures resolved without review
+            'theirs': [...],          # compare_scores-format changes taken from theirs
+            'conflicts': [...]        # compare_scores-format conflicts to review
+        }
+    """
+    if base_fingerprints is None:
+        base_fingerprints = score_fingerprints(base)
+    if ours_fingerprints is None:
+        ours_fingerprints = score_fingerprints(ours)
+    if theirs_fingerprints is None:
+        theirs_fingerprints = score_fingerprints(theirs)
+
+    merge = MergeOverlay(ours)
+    result = {'merge': merge, 'auto_resolved': 0, 'theirs': [], 'conflicts': []}
+
+    for ours_part, theirs_part, base_fps, ours_fps, theirs_fps in zip(
+            ours.parts, theirs.parts, base_fingerprints, ours_fingerprints, theirs_fingerprints):
+        taken, conflicting = [], []
+        for stable, (b1, b2), [(o1, o2), (t1, t2)] in _chunks(base_fps, [ours_fps, theirs_fps]):
+            if stable:
+                continue
+            base_run, ours_run, theirs_run = base_fps[b1:b2], ours_fps[o1:o2], theirs_fps[t1:t2]
+            if ours_run == theirs_run or theirs_run == base_run:
+                # Only ours changed, or both made the same change: keep ours
+                result['auto_resolved'] += max(b2 - b1, o2 - o1)
+            elif ours_run == base_run:
+                taken.extend(_chunk_edits(ours_fps, theirs_fps, (o1, o2), (t1, t2)))
+                result['auto_resolved'] += max(b2 - b1, t2 - t1)
+            else:
+                conflicting.extend(_chunk_edits(ours_fps, theirs_fps, (o1, o2), (t1, t2)))
+
+        part_taken = part_differences(ours_part, theirs_part, ours_fps, theirs_fps, taken)
+        for measure_diff in part_taken['differences']:
+            merge.choose(part_taken['part_id'], measure_diff)
+        if part_taken['differences']:
+            result['theirs'].append(part_taken)
+
+        part_conflicts = part_differences(ours_part, theirs_part, ours_fps, theirs_fps, conflicting)
+        if part_conflicts['differences']:
+            result['conflicts'].append(part_conflicts)
+
+    return result
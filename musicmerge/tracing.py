@@ -0,0 +1,130 @@
+import functools
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+# Chrome trace events recorded since start(), or None while tracing is off
+_events = None
+_thread_names = {}
+
+
+class _NoSpan:
+    """Shared do-nothing span returned while tracing is off."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.time_ns()
+        events = _events
+        if events is None:
+            return False
+        thread = threading.current_thread()
+        _thread_names.setdefault((os.getpid(), thread.ident), thread.name)
+        events.append({
+            'name': self.name,
+            'cat': 'musicmerge',
+            'ph': 'X',
+            # Wall-clock microseconds, so spans from worker processes line up
+            'ts': self.start / 1000,
+            'dur': (end - self.start) / 1000,
+            'pid': os.getpid(),
+            'tid': thread.ident,
+            'args': self.args,
+        })
+        return False
+
+
+def span(name, **args):
+    """
+    Time a block as one trace event while tracing is on:
+
+        with tracing.span('compare part', part=k):
+            ...
+
+    `args` are shown with the event. While tracing is off this returns a
+    shared no-op context manager, so spans can stay in hot paths.
+    """
+    if _events is None:
+        return _NO_SPAN
+    return _Span(name, args)
+
+
+def traced(name):
+    """
+    Decorator recording every call of a function as a span named `name`.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _events is None:
+                return function(*args, **kwargs)
+            with _Span(name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enabled():
+    return _events is not None
+
+
+def start():
+    """Start recording spans in this process, dropping any earlier ones."""
+    global _events
+    _thread_names.clear()
+    _events = []
+
+
+def stop():
+    """
+    Stop recording.
+    Returns:
+        The events recorded since start(), with thread name metadata
+    """
+    global _events
+    events, _events = _events or [], None
+    names = [{'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+              'args': {'name': multiprocessing.current_process().name}}]
+    names += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+              for (pid, tid), name in _thread_names.items()]
+    _thread_names.clear()
+    return names + events
+
+
+def add(events):
+    """Merge events recorded elsewhere (e.g. returned by a worker process's stop())."""
+    if _events is not None:
+        _events.extend(events)
+
+
+def write(path, events=None):
+    """
+    Write events (by default: stop() the current trace) as Chrome trace-event
+    JSON, which chrome://tracing and https://ui.perfetto.dev can open.
+    """
+    if events is None:
+        events = stop()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,144 @@
+import os
+import time
+
+from . import tracing
+from .align import align_measures
+from .core import _part_measures, part_differences
+from .fingerprint import score_fingerprints
+from .loader import load_score
+
+# How long a changed file must stay unchanged before it is re-read, in seconds
+SETTLE_SECONDS = 0.5
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        # Editors may replace a file by renaming over it; wait for it to reappear
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class FileWatcher:
+    """
+    Notices when files change on disk, by polling their modification time
+    and size. A change is only reported once the file has stopped changing
+    for `settle` seconds, so a file is not read while it is being saved.
+    """
+    def __init__(self, paths, settle=SETTLE_SECONDS):
+        self.paths = [str(path) for path in paths]
+        self.settle = settle
+        self.stats = [_stat(path) for path in self.paths]
+        # index -> (stat, time first seen) of changes still settling
+        self.pending = {}
+
+    def poll(self):
+        """
+        Returns:
+            Indices (into `paths`) of the files changed since they were last reported
+        """
+        changed = []
+        now = time.monotonic()
+        for index, path in enumerate(self.paths):
+            stat = _stat(path)
+            if stat is None or stat == self.stats[index]:
+                if stat is not None:
+                    self.pending.pop(index, None)
+                continue
+            seen = self.pending.get(index)
+            if seen is None or seen[0] != stat:
+                self.pending[index] = (stat, now)
+            elif now - seen[1] >= self.settle:
+                del self.pending[index]
+                self.stats[index] = stat
+                changed.append(index)
+        return changed
+
+
+@tracing.traced('reload')
+def reload_score(path, cache=None):
+    """
+    Read a changed file again (through the parse cache, as in load_score).
+    Returns:
+        (score, fingerprints)
+    """
+    score = load_score(path, cache)
+    return score, score_fingerprints(score)
+
+
+def _measure_key(measure_diff):
+    return (measure_diff['operation'], measure_diff['measure_number'], measure_diff.get('after_measure_number'),
+            measure_diff['score1_fingerprint'], measure_diff['score2_fingerprint'])
+
+
+def _part_unchanged(part, fingerprints, previous_part, previous_fingerprints):
+    return (fingerprints == previous_fingerprints and
+            [m.number for m in _part_measures(part)] == [m.number for m in _part_measures(previous_part)])
+
+
+def _rebind(part_diff, previous_part1, previous_part2, part1, part2):
+    """
+    Point the measure differences of an unchanged part at the measures of
+    the newly read scores, which sit at the same positions as before.
+    """
+    positions1 = {id(measure): i for i, measure in enumerate(_part_measures(previous_part1))}
+    positions2 = {id(measure): j for j, measure in enumerate(_part_measures(previous_part2))}
+    measures1, measures2 = _part_measures(part1), _part_measures(part2)
+    for measure_diff in part_diff['differences']:
+        if measure_diff['score1_measure'] is not None:
+            measure_diff['score1_measure'] = measures1[positions1[id(measure_diff['score1_measure'])]]
+        if measure_diff['score2_measure'] is not None:
+            measure_diff['score2_measure'] = measures2[positions2[id(measure_diff['score2_measure'])]]
+
+
+@tracing.traced('update differences')
+def update_differences(differences, score1, score2, fingerprints1, fingerprints2, previous):
+    """
+    Bring a compare_scores result up to date after score1 and/or score2
+    changed on disk. `previous` is the (score1, score2, fingerprints1,
+    fingerprints2) the differences were computed from.
+
+    Parts whose measures (fingerprints and numbers) are unchanged in both
+    scores keep their entry untouched; only the other parts are compared
+    again. In those, measure differences with the same operation, numbers
+    and fingerprints as before keep their original dict, so merge choices
+    recorded on them (see MergeOverlay.rebase) stay valid. Kept dicts are
+    updated in place to refer to the measures of the new scores.
+    Returns:
+        (differences, changed) - the updated result in compare_scores
+        format, and the ids of the parts that were compared again
+    """
+    previous1, previous2, previous_fingerprints1, previous_fingerprints2 = previous
+    old_parts = {part_diff['part_id']: part_diff for part_diff in differences}
+    same_layout = (len(score1.parts) == len(previous1.parts) and len(score2.parts) == len(previous2.parts))
+
+    updated, changed = [], set()
+    for k, (part1, part2) in enumerate(zip(score1.parts, score2.parts)):
+        old = old_parts.get(part1.id)
+        if (same_layout and
+                _part_unchanged(part1, fingerprints1[k], previous1.parts[k], previous_fingerprints1[k]) and
+                _part_unchanged(part2, fingerprints2[k], previous2.parts[k], previous_fingerprints2[k])):
+            if old is not None:
+                _rebind(old, previous1.parts[k], previous2.parts[k], part1, part2)
+                updated.append(old)
+            continue
+
+        changed.add(part1.id)
+        edits = align_measures(fingerprints1[k], fingerprints2[k])
+        part_diff = part_differences(part1, part2, fingerprints1[k], fingerprints2[k], edits)
+        if not part_diff['differences']:
+            continue
+        if old is not None:
+            kept = {_measure_key(measure_diff): measure_diff for measure_diff in old['differences']}
+            merged = []
+            for measure_diff in part_diff['differences']:
+                original = kept.get(_measure_key(measure_diff))
+                if original is not None:
+                    original['score1_measure'] = measure_diff['score1_measure']
+                    original['score2_measure'] = measure_diff['score2_measure']
+                    measure_diff = original
+                merged.append(measure_diff)
+            part_diff['differences'] = merged
+        updated.append(part_diff)
+    return updated, changed
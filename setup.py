@@ -7,11 +7,13 @@ setup(
     packages=find_packages(),
     entry_points={
         "console_scripts": [
+            "musicmerge = musicmerge.cli:main",
             "musicmerge-gui = musicmerge.gui.app:run_gui"
         ],
     },
     install_requires=[
         "music21",
+        "numpy",
     ],
     python_requires=">=3.11",
 )
\ No newline at end of file
@@ -0,0 +1,130 @@
+import random
+from functools import lru_cache
+
+import pytest
+from music21 import note, stream
+
+from musicmerge.align import align_measures, align_notes, myers_diff
+
+
+def _lcs_length(seq1, seq2):
+    @lru_cache(maxsize=None)
+    def lcs(i, j):
+        if i == len(seq1) or j == len(seq2):
+            return 0
+        if seq1[i] == seq2[j]:
+            return 1 + lcs(i + 1, j + 1)
+        return max(lcs(i + 1, j), lcs(i, j + 1))
+    return lcs(0, 0)
+
+
+def _check_script(seq1, seq2, ops):
+    """Check that `ops` walks both sequences in order and turns seq1 into seq2."""
+    i = j = 0
+    for tag, x, y in ops:
+        assert (x, y) == (i, j)
+        if tag == 'equal':
+            assert seq1[i] == seq2[j]
+            i, j = i + 1, j + 1
+        elif tag == 'delete':
+            i += 1
+        else:
+            assert tag == 'insert'
+            j += 1
+    assert (i, j) == (len(seq1), len(seq2))
+
+
+def _edits(ops):
+    return sum(tag != 'equal' for tag, _, _ in ops)
+
+
+def _random_pairs(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        alphabet = 'ab' if rng.random() < 0.5 else 'abcdef'
+        yield ([rng.choice(alphabet) for _ in range(rng.randint(0, 14))],
+               [rng.choice(alphabet) for _ in range(rng.randint(0, 14))])
+
+
+def test_myers_script_is_shortest():
+    for seq1, seq2 in _random_pairs(500):
+        ops = myers_diff(seq1, seq2)
+        _check_script(seq1, seq2, ops)
+        assert _edits(ops) == len(seq1) + len(seq2) - 2 * _lcs_length(seq1, seq2), (seq1, seq2)
+
+
+def test_myers_gives_up_beyond_max_d():
+    for seq1, seq2 in _random_pairs(300, seed=1):
+        d = len(seq1) + len(seq2) - 2 * _lcs_length(seq1, seq2)
+        if d:
+            assert myers_diff(seq1, seq2, max_d=d - 1) is None
+        ops = myers_diff(seq1, seq2, max_d=d)
+        _check_script(seq1, seq2, ops)
+        assert _edits(ops) == d
+
+
+@pytest.mark.parametrize('seq1, seq2, expected', [
+    ([], [], []),
+    ([], ['a', 'b'], [('insert', 0, 0), ('insert', 0, 1)]),
+    (['a', 'b'], [], [('delete', 0, 0), ('delete', 1, 0)]),
+])
+def test_myers_on_empty_sequences(seq1, seq2, expected):
+    assert myers_diff(seq1, seq2) == expected
+    assert myers_diff(seq1, seq2, max_d=len(expected)) == expected
+
+
+def test_equal_lengths_realign_only_for_a_shorter_script():
+    # One bar removed at the start and one added at the end: 2 edits instead of 4 modifications
+    assert align_measures(list('abcd'), list('bcde')) == [('delete', 0, 0), ('insert', 4, 3)]
+    # Swapped bars: the shortest script (2 edits) is not shorter than the 2 mismatches
+    assert align_measures(list('ab'), list('ba')) == [('modify', 0, 0), ('modify', 1, 1)]
+    # Repeated bars are not matched across the score
+    assert align_measures(list('xrrr'), list('rrrx')) == [('modify', 0, 0), ('modify', 3, 3)]
+    assert align_measures(list('abc'), list('abc')) == []
+
+
+def test_given_mismatches_are_used_for_equal_lengths():
+    assert align_measures(list('abc'), list('axc'), mismatches=[1]) == [('modify', 1, 1)]
+    # Only the mismatches given are looked at, not the fingerprints
+    assert align_measures(list('abc'), list('abd'), mismatches=[]) == []
+
+
+def _measure(*pitches):
+    measure = stream.Measure()
+    for offset, pitch in pitches:
+        measure.insert(offset, note.Note(pitch, quarterLength=1))
+    return measure
+
+
+def _by_pitch(notes1, notes2):
+    return [0.0 if n1.pitch == n2.pitch else 1.0 for n1, n2 in zip(notes1, notes2)]
+
+
+def _operations(ops):
+    return [(op['operation'],
+             op['note1'].nameWithOctave if op['note1'] is not None else None,
+             op['note2'].nameWithOctave if op['note2'] is not None else None,
+             op['distance'])
+            for op in ops]
+
+
+def test_align_notes_finds_a_deleted_note():
+    full = _measure((0, 'C4'), (1, 'D4'), (2, 'E4'), (3, 'F4'))
+    gap = _measure((0, 'C4'), (2, 'E4'), (3, 'F4'))
+    assert _operations(align_notes(full, gap, _by_pitch)) == [
+        ('match', 'C4', 'C4', 0.0),
+        ('delete', 'D4', None, None),
+        ('match', 'E4', 'E4', 0.0),
+        ('match', 'F4', 'F4', 0.0),
+    ]
+
+
+def test_align_notes_finds_an_inserted_note():
+    gap = _measure((0, 'C4'), (2, 'E4'), (3, 'F4'))
+    full = _measure((0, 'C4'), (1, 'D4'), (2, 'G4'), (3, 'F4'))
+    assert _operations(align_notes(gap, full, _by_pitch)) == [
+        ('match', 'C4', 'C4', 0.0),
+        ('insert', None, 'D4', None),
+        ('match', 'E4', 'G4', 1.0),
+        ('match', 'F4', 'F4', 0.0),
+    ]
@@ -0,0 +1,42 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from musicmerge.batch import batch_merge, output_paths
+
+TESTFILES = Path(__file__).resolve().parent.parent / 'testfiles'
+
+
+def _pair(folder):
+    folder.mkdir()
+    for name in ('10barsofG.musicxml', '5barsofD.musicxml'):
+        shutil.copy(TESTFILES / name, folder / name)
+    return (folder / '10barsofG.musicxml', folder / '5barsofD.musicxml', None)
+
+
+def test_default_output_names_are_numbered_apart(tmp_path):
+    pairs = [('a/x.musicxml', 'a/y.musicxml', None),
+             ('b/x.musicxml', 'b/y.musicxml', None),
+             ('c/x.musicxml', 'c/y.musicxml', 'x_y_2.musicxml'),
+             ('d/X.musicxml', 'd/Y.musicxml', None)]
+    assert [path.name for path in output_paths(pairs, tmp_path)] == \
+        ['x_y.musicxml', 'x_y_3.musicxml', 'x_y_2.musicxml', 'X_Y_4.musicxml']
+
+
+def test_pairs_with_the_same_stems_are_all_written(tmp_path):
+    pairs = [_pair(tmp_path / 'first'), _pair(tmp_path / 'second')]
+    output_dir = tmp_path / 'merged'
+    summaries = list(batch_merge(pairs, output_dir, 'prefer-score2', cache=False, max_workers=1))
+    assert [summary['status'] for summary in summaries] == ['merged', 'merged']
+    assert sorted(path.name for path in output_dir.iterdir()) == ['10barsofG_5barsofD.musicxml',
+                                                                   '10barsofG_5barsofD_2.musicxml']
+
+
+def test_the_same_output_name_twice_is_refused_before_merging(tmp_path):
+    first, second = _pair(tmp_path / 'first'), _pair(tmp_path / 'second')
+    pairs = [first[:2] + ('out.musicxml',), second[:2] + ('out.musicxml',)]
+    output_dir = tmp_path / 'merged'
+    with pytest.raises(ValueError, match='out.musicxml'):
+        next(batch_merge(pairs, output_dir, 'prefer-score2', cache=False, max_workers=1))
+    assert not output_dir.exists()
@@ -0,0 +1,107 @@
+import itertools
+from pathlib import Path
+
+import numpy as np
+import pytest
+from music21 import converter
+
+from musicmerge.columnar import differing_measures, score_columns
+from musicmerge.core import DIFFERENCE_WEIGHTS, calculate_differences, compare_scores
+from musicmerge.fingerprint import score_fingerprints
+from musicmerge.notation import read_score
+
+TESTFILES = Path(__file__).resolve().parent.parent / 'testfiles'
+
+SCORE = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise version="4.0">
+  <part-list><score-part id="P1"><part-name>Piano</part-name></score-part></part-list>
+  <part id="P1">
+    <measure number="1">
+      <attributes><divisions>1</divisions><time><beats>4</beats><beat-type>4</beat-type></time></attributes>
+      <note><pitch><step>C</step><octave>4</octave></pitch><duration>4</duration><type>whole</type></note>
+    </measure>
+    <measure number="2">
+      <note><pitch><step>{step}</step><alter>{alter}</alter><octave>4</octave></pitch><duration>4</duration><type>whole</type></note>
+    </measure>
+  </part>
+</score-partwise>
+"""
+
+
+def _summary(differences):
+    return [(part_diff['part_id'],
+             [(d['operation'], d['measure_number'], d.get('after_measure_number'),
+               d['score1_fingerprint'], d['score2_fingerprint'], id(d['score1_measure']), id(d['score2_measure']))
+              for d in part_diff['differences']])
+            for part_diff in differences]
+
+
+@pytest.fixture(scope='module')
+def bundled():
+    return {path: read_score(path) for path in sorted(TESTFILES.rglob('*.musicxml'))}
+
+
+def test_columns_and_fingerprints_find_the_same_differences(bundled):
+    columns = {path: score_columns(score) for path, score in bundled.items()}
+    pairs = [(a, b) for a, b in itertools.permutations(bundled, 2)
+             if len(bundled[a].parts) == len(bundled[b].parts)]
+    assert pairs
+    for a, b in pairs:
+        score1, score2 = bundled[a], bundled[b]
+        by_fingerprint = compare_scores(score1, score2, score_fingerprints(score1), score_fingerprints(score2))
+        by_columns = compare_scores(score1, score2, columns1=columns[a], columns2=columns[b])
+        assert _summary(by_columns) == _summary(by_fingerprint), (a.name, b.name)
+
+
+def test_respelling_is_a_difference_on_both_paths(tmp_path):
+    (tmp_path / 'sharp.musicxml').write_text(SCORE.format(step='C', alter=1), encoding='utf-8')
+    (tmp_path / 'flat.musicxml').write_text(SCORE.format(step='D', alter=-1), encoding='utf-8')
+    score1, score2 = read_score(tmp_path / 'sharp.musicxml'), read_score(tmp_path / 'flat.musicxml')
+    columns1, columns2 = score_columns(score1), score_columns(score2)
+
+    assert differing_measures(columns1[0], columns2[0]).tolist() == [1]
+    by_columns = compare_scores(score1, score2, columns1=columns1, columns2=columns2)
+    assert _summary(by_columns) == _summary(compare_scores(score1, score2))
+    assert [d['measure_number'] for d in by_columns[0]['differences']] == [2]
+
+
+NOTES = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise version="4.0">
+  <part-list><score-part id="P1"><part-name>Piano</part-name></score-part></part-list>
+  <part id="P1">
+    <measure number="1">
+      <attributes><divisions>1</divisions><time><beats>4</beats><beat-type>4</beat-type></time></attributes>
+{notes}
+    </measure>
+  </part>
+</score-partwise>
+"""
+
+
+def _note(step, alter=0, duration=1, chord=False, stem=None, staccato=False):
+    return (f"<note>{'<chord/>' if chord else ''}<pitch><step>{step}</step><alter>{alter}</alter><octave>4</octave>"
+            f"</pitch><duration>{duration}</duration>{f'<stem>{stem}</stem>' if stem else ''}"
+            f"{'<notations><articulations><staccato/></articulations></notations>' if staccato else ''}</note>")
+
+
+def test_calculate_differences_agrees_on_music21_notes_and_columns(tmp_path):
+    versions = {
+        'score1': [_note('C', 1), _note('E', staccato=True), '<note><rest/><duration>1</duration></note>',
+                   _note('G', stem='up'), _note('A'), _note('C', chord=True)],
+        # A respelling, no staccato, a longer rest, the other stem, the same chord
+        'score2': [_note('D', -1), _note('E'), '<note><rest/><duration>2</duration></note>',
+                   _note('G', stem='down'), _note('A'), _note('C', chord=True)],
+    }
+    notes, rows = {}, {}
+    for name, elements in versions.items():
+        path = tmp_path / f"{name}.musicxml"
+        path.write_text(NOTES.format(notes="\n".join(elements)), encoding='utf-8')
+        notes[name] = list(converter.parse(path).recurse().notesAndRests)
+        rows[name] = score_columns(read_score(path))[0]['notes']
+
+    by_notes = calculate_differences(notes['score1'], notes['score2'])
+    by_rows = calculate_differences(rows['score1'], rows['score2'])
+    expected = [DIFFERENCE_WEIGHTS['pitch'], DIFFERENCE_WEIGHTS['articulation'],
+                DIFFERENCE_WEIGHTS['duration'] * 0.25, DIFFERENCE_WEIGHTS['stem_direction'], 0.0]
+    np.testing.assert_allclose(by_notes, expected)
+    np.testing.assert_allclose(by_rows, expected)
@@ -0,0 +1,47 @@
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from musicmerge.loader import iter_load_scores, stop_pool, wait_as_completed
+
+TESTFILES = Path(__file__).resolve().parent.parent / 'testfiles'
+
+
+def test_cancel_stops_running_workers():
+    pool = ProcessPoolExecutor(max_workers=2)
+    futures = [pool.submit(time.sleep, 60) for _ in range(2)]
+    while not all(future.running() for future in futures):
+        time.sleep(0.01)
+    processes = list(pool._processes.values())
+
+    cancelled = threading.Event()
+    threading.Timer(0.2, cancelled.set).start()
+    started = time.monotonic()
+    assert list(wait_as_completed(futures, cancelled)) == []
+    stop_pool(pool, futures)
+    for process in processes:
+        process.join(5)
+    assert not any(process.is_alive() for process in processes)
+    assert time.monotonic() - started < 10
+
+
+def test_finished_pool_is_left_to_exit():
+    pool = ProcessPoolExecutor(max_workers=1)
+    futures = [pool.submit(abs, -1)]
+    assert [future.result() for future in wait_as_completed(futures)] == [1]
+    stop_pool(pool, futures)
+
+
+def test_cancelled_load_yields_nothing():
+    cancelled = threading.Event()
+    cancelled.set()
+    paths = [TESTFILES / 'testscore.musicxml', TESTFILES / 'testscore2.musicxml']
+    assert list(iter_load_scores(paths, cache=False, cancelled=cancelled)) == []
+
+
+def test_load_without_cancel_reads_every_file():
+    paths = [TESTFILES / 'testscore.musicxml', TESTFILES / 'testscore2.musicxml']
+    loaded = dict(iter_load_scores(paths, cache=False))
+    assert sorted(loaded) == [0, 1]
+    assert [loaded[index].source for index in (0, 1)] == [str(path) for path in paths]
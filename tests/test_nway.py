@@ -0,0 +1,64 @@
+from musicmerge.notation import read_score
+from musicmerge.nway import choose_variant, n_way_merge
+
+SCORE = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise version="4.0">
+  <part-list><score-part id="P1"><part-name>Piano</part-name></score-part></part-list>
+  <part id="P1">
+{measures}
+  </part>
+</score-partwise>
+"""
+
+MEASURE = """    <measure number="{number}">{attributes}
+      <note><pitch><step>{step}</step><octave>4</octave></pitch><duration>4</duration><type>whole</type></note>
+    </measure>"""
+
+ATTRIBUTES = "<attributes><divisions>1</divisions><time><beats>4</beats><beat-type>4</beat-type></time></attributes>"
+
+
+def _score(tmp_path, name, steps):
+    measures = "\n".join(MEASURE.format(number=k, step=step, attributes=ATTRIBUTES if k == 1 else '')
+                         for k, step in enumerate(steps, 1))
+    path = tmp_path / f"{name}.musicxml"
+    path.write_text(SCORE.format(measures=measures), encoding='utf-8')
+    return read_score(path)
+
+
+def _steps(score):
+    return [measure.notes[0].pitches[0][0] for measure in score.parts[0].measures]
+
+
+def test_identical_edits_are_one_variant(tmp_path):
+    base = _score(tmp_path, 'base', 'CDEFGA')
+    versions = [
+        _score(tmp_path, 'v0', 'CBEFAA'),   # measure 2 to B, measure 5 to A
+        _score(tmp_path, 'v1', 'CBEFGA'),   # measure 2 to B, like v0
+        _score(tmp_path, 'v2', 'CCEFGA'),   # measure 2 to C: a conflict
+    ]
+    result = n_way_merge(base, versions)
+    part_id = base.parts[0].id
+
+    # Measure 5 was changed by v0 alone
+    assert result['auto_resolved'] == 1
+    assert [(conflict['part_id'], conflict['part_name'], conflict['measure_number'])
+            for conflict in result['conflicts']] == [(part_id, 'Piano', 2)]
+    conflict = result['conflicts'][0]
+    assert [variant['versions'] for variant in conflict['variants']] == [[0, 1], [2]]
+    assert [len(variant['differences']) for variant in conflict['variants']] == [1, 1]
+
+    merge = result['merge']
+    assert list(merge.choices) == [(part_id, 5, 'modify')]
+    choose_variant(merge, conflict, 0)
+    assert sorted(number for _, number, _ in merge.choices) == [2, 5]
+    merged = tmp_path / 'merged.musicxml'
+    merge.build().write('musicxml', fp=merged)
+    assert _steps(read_score(merged)) == list('CBEFAA')
+
+
+def test_agreeing_versions_merge_without_conflicts(tmp_path):
+    base = _score(tmp_path, 'base', 'CDEF')
+    versions = [_score(tmp_path, f"v{k}", 'CDGF') for k in range(3)]
+    result = n_way_merge(base, versions)
+    assert result['conflicts'] == []
+    assert result['auto_resolved'] == 1
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+
+from musicmerge import parallel
+from musicmerge.columnar import score_columns
+from musicmerge.core import compare_scores
+from musicmerge.fingerprint import score_fingerprints
+from musicmerge.notation import read_score
+
+TESTFILES = Path(__file__).resolve().parent.parent / 'testfiles'
+
+PAIRS = [
+    ('testscore.musicxml', 'testscore2.musicxml'),
+    ('tests/test3/10barsofGwViolin.musicxml', 'tests/test3/10barsofGwViolinEdited.musicxml'),
+    ('tests/test6/testscore.musicxml', 'tests/test6/testscore_changed.musicxml'),
+    # Different lengths, so measures have to be realigned
+    ('10barsofG.musicxml', '5barsofD.musicxml'),
+]
+
+
+def _summary(differences):
+    return [(part_diff['part_id'], part_diff['part_name'],
+             [(d['operation'], d['measure_number'], d.get('after_measure_number'),
+               d['score1_fingerprint'], d['score2_fingerprint'], id(d['score1_measure']), id(d['score2_measure']))
+              for d in part_diff['differences']])
+            for part_diff in differences]
+
+
+@pytest.fixture
+def every_part_in_the_pool(monkeypatch):
+    monkeypatch.setattr(parallel, 'MIN_PARALLEL_MEASURES', 1)
+
+
+@pytest.mark.parametrize('names', PAIRS, ids=[name2 for _, name2 in PAIRS])
+def test_parallel_matches_serial(names, every_part_in_the_pool):
+    score1, score2 = (read_score(TESTFILES / name) for name in names)
+    expected = _summary(compare_scores(score1, score2))
+    assert expected
+
+    fingerprints1, fingerprints2 = score_fingerprints(score1), score_fingerprints(score2)
+    assert _summary(parallel.compare_scores_parallel(score1, score2, fingerprints1, fingerprints2,
+                                                     max_workers=2)) == expected
+    assert _summary(parallel.compare_scores_parallel(score1, score2, columns1=score_columns(score1),
+                                                     columns2=score_columns(score2), max_workers=2)) == expected
+
+
+def test_small_or_unhashed_parts_are_compared_in_process(monkeypatch):
+    score1, score2 = (read_score(TESTFILES / name) for name in PAIRS[0])
+    expected = _summary(compare_scores(score1, score2))
+    monkeypatch.setattr(parallel, 'ProcessPoolExecutor', None)
+    fingerprints1, fingerprints2 = score_fingerprints(score1), score_fingerprints(score2)
+    assert _summary(parallel.compare_scores_parallel(score1, score2, fingerprints1, fingerprints2,
+                                                     max_workers=2)) == expected
+    # Compact scores without fingerprints are prefiltered instead
+    monkeypatch.setattr(parallel, 'MIN_PARALLEL_MEASURES', 1)
+    assert _summary(parallel.compare_scores_parallel(score1, score2, max_workers=2)) == expected
@@ -0,0 +1,52 @@
+import re
+from pathlib import Path
+
+from musicmerge.core import compare_scores
+from musicmerge.fingerprint import score_fingerprints
+from musicmerge.notation import read_score
+from musicmerge.prefilter import normalize_layout, unchanged_measures
+
+TESTFILES = Path(__file__).resolve().parent.parent / 'testfiles'
+
+
+def _reformatted(text):
+    """The same score as another editor might save it: new line breaks, no layout"""
+    text = re.sub(r'<print\b.*?</print>', '<print new-page="yes"/>', text, flags=re.DOTALL)
+    text = re.sub(r' default-[xy]="[^"]*"', '', text)
+    return re.sub(r'>\s*<', '>\n<', text)
+
+
+def test_formatting_alone_is_no_difference(tmp_path):
+    source = TESTFILES / 'testscore.musicxml'
+    copy = tmp_path / 'reformatted.musicxml'
+    copy.write_text(_reformatted(source.read_text(encoding='utf-8')), encoding='utf-8')
+    score1, score2 = read_score(source), read_score(copy)
+    assert all(m1.xml != m2.xml for p1, p2 in zip(score1.parts, score2.parts)
+               for m1, m2 in zip(p1.measures, p2.measures))
+
+    for part1, part2 in zip(score1.parts, score2.parts):
+        pairs = unchanged_measures(part1.measures, part2.measures)
+        assert pairs == [(k, k) for k in range(len(part1.measures))]
+    assert compare_scores(score1, score2) == []
+    # Every measure was matched by the prefilter, none was fingerprinted
+    assert not any(measure._fingerprint for score in (score1, score2)
+                   for part in score.parts for measure in part.measures)
+
+
+def test_changed_notes_are_still_found(tmp_path):
+    source = TESTFILES / 'testscore.musicxml'
+    changed = tmp_path / 'changed.musicxml'
+    text = _reformatted(source.read_text(encoding='utf-8'))
+    # Move the first A of the score up a tone
+    changed.write_text(text.replace('<step>A</step>', '<step>B</step>', 1), encoding='utf-8')
+    score1, score2 = read_score(source), read_score(changed)
+    differences = compare_scores(score1, score2)
+    assert differences == compare_scores(score1, score2, score_fingerprints(score1), score_fingerprints(score2))
+    assert sum(len(part_diff['differences']) for part_diff in differences) == 1
+
+
+def test_normalize_layout():
+    assert normalize_layout(b'<note default-x="12.5" default-y=\'-5\'>\n  <rest/>\n</note>') == b'<note><rest/></note>'
+    assert normalize_layout(b'<print new-system="yes"><system-layout/></print><print/><note/>') == b'<note/>'
+    # Text is kept, and so are attributes that are not positions
+    assert normalize_layout(b'<text> la </text><note print-object="no"/>') == b'<text> la </text><note print-object="no"/>'
@@ -0,0 +1,150 @@
+import json
+import stat
+import sys
+import textwrap
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from musicmerge.notation import read_score
+from musicmerge.render import MeasureRenderer, measure_render_key
+
+SCORE = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise version="4.0">
+  <part-list><score-part id="P1"><part-name>Piano</part-name></score-part></part-list>
+  <part id="P1">
+    <measure number="1">
+      <attributes>
+        <divisions>1</divisions>
+        <key><fifths>{fifths}</fifths></key>
+        <time><beats>4</beats><beat-type>4</beat-type></time>
+        <clef><sign>G</sign><line>2</line></clef>
+      </attributes>
+      <note><pitch><step>C</step><octave>4</octave></pitch><duration>4</duration><type>whole</type>{lyric}</note>
+    </measure>
+  </part>
+</score-partwise>
+"""
+
+
+def _measure(tmp_path, name, fifths=0, lyric=''):
+    path = tmp_path / f"{name}.musicxml"
+    path.write_text(SCORE.format(fifths=fifths, lyric=lyric), encoding='utf-8')
+    return read_score(path).parts[0].measures[0]
+
+
+@pytest.fixture
+def musescore(tmp_path):
+    """
+    A stand-in for MuseScore that writes a dummy image for every job and logs
+    each run, after sleeping for the seconds in tmp_path / 'delay' if given
+    """
+    log = tmp_path / 'runs.log'
+    script = tmp_path / 'mscore'
+    script.write_text(textwrap.dedent(f"""\
+        #!{sys.executable}
+        import json, pathlib, sys, time
+        delay = pathlib.Path({str(tmp_path / 'delay')!r})
+        if delay.exists():
+            time.sleep(float(delay.read_text()))
+        jobs = json.loads(pathlib.Path(sys.argv[2]).read_text())
+        with open({str(log)!r}, 'a') as log:
+            log.write(json.dumps([job['in'] for job in jobs]) + '\\n')
+        for job in jobs:
+            out = pathlib.Path(job['out'])
+            # Image exports are numbered by page, like MuseScore does
+            out.with_name(out.stem + '-1' + out.suffix).write_bytes(b'image')
+        """), encoding='utf-8')
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return script, log
+
+
+def _runs(log):
+    return [json.loads(line) for line in log.read_text().splitlines()] if log.exists() else []
+
+
+def test_measures_render_in_one_run_and_are_cached(tmp_path, musescore):
+    script, log = musescore
+    renderer = MeasureRenderer(script, cache_dir=tmp_path / 'cache')
+    measures = {measure_render_key(measure): measure
+                for measure in (_measure(tmp_path, 'plain'), _measure(tmp_path, 'sharp', fifths=2))}
+
+    paths = renderer.render(measures)
+    assert set(paths) == set(measures)
+    assert all(path.read_bytes() == b'image' for path in paths.values())
+    assert [len(run) for run in _runs(log)] == [2]
+
+    assert renderer.render(measures) == paths
+    assert len(_runs(log)) == 1
+
+
+def _rendered_keys(log):
+    return [sorted(Path(source).stem for source in run) for run in _runs(log)]
+
+
+def test_render_skips_the_queue_and_waits_for_runs_in_flight(tmp_path, musescore):
+    script, log = musescore
+    renderer = MeasureRenderer(script, cache_dir=tmp_path / 'cache')
+    plain, sharp, flat, more = (_measure(tmp_path, name, fifths=fifths)
+                                for name, fifths in (('plain', 0), ('sharp', 2), ('flat', -2), ('more', 4)))
+    queued = {measure_render_key(measure): measure for measure in (plain, sharp)}
+    for key, measure in queued.items():
+        renderer.request(key, measure)
+
+    clicked = {measure_render_key(flat): flat}
+    renderer.render(clicked)
+    assert _rendered_keys(log) == [list(clicked)]
+    assert set(renderer.pending) == set(queued)
+
+    (tmp_path / 'delay').write_text('1')
+    prefetch = threading.Thread(target=renderer.flush)
+    prefetch.start()
+    while not renderer._rendering:
+        time.sleep(0.01)
+    # Queueing more does not wait for MuseScore
+    renderer.request(measure_render_key(more), more)
+    assert prefetch.is_alive()
+    # A measure that is being rendered is waited for, not rendered again
+    renderer.render({measure_render_key(plain): plain})
+    prefetch.join()
+    assert _rendered_keys(log) == [list(clicked), sorted(queued)]
+    assert set(renderer.pending) == {measure_render_key(more)}
+
+
+def test_render_key_covers_what_the_fingerprint_ignores(tmp_path):
+    plain = _measure(tmp_path, 'plain')
+    sharp = _measure(tmp_path, 'sharp', fifths=2)
+    sung = _measure(tmp_path, 'sung', lyric='<lyric><text>la</text></lyric>')
+
+    assert plain.fingerprint() == sharp.fingerprint() == sung.fingerprint()
+    keys = {measure_render_key(measure) for measure in (plain, sharp, sung)}
+    assert len(keys) == 3
+    assert measure_render_key(plain) == measure_render_key(_measure(tmp_path, 'again'))
+
+
+def test_render_key_of_music21_measures_is_stable(tmp_path):
+    measure = _measure(tmp_path, 'plain').to_music21()
+    assert measure_render_key(measure) == measure_render_key(_measure(tmp_path, 'again').to_music21())
+    measure.notes[0].lyric = 'la'
+    assert measure_render_key(measure) != measure_render_key(_measure(tmp_path, 'again').to_music21())
+
+
+def test_missing_image_is_an_error(tmp_path):
+    script = tmp_path / 'mscore'
+    script.write_text(f"#!{sys.executable}\n", encoding='utf-8')
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    renderer = MeasureRenderer(script, cache_dir=tmp_path / 'cache')
+    measure = _measure(tmp_path, 'plain')
+
+    with pytest.raises(RuntimeError, match='no image'):
+        renderer.render({measure_render_key(measure): measure})
+
+
+def test_unconfigured_musescore_is_an_error(tmp_path):
+    renderer = MeasureRenderer(tmp_path / 'missing', cache_dir=tmp_path / 'cache')
+    measure = _measure(tmp_path, 'plain')
+
+    with pytest.raises(ValueError):
+        renderer.render({measure_render_key(measure): measure})
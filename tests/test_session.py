@@ -0,0 +1,86 @@
+from musicmerge.session import journal_path, start_session
+
+SCORE = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise version="4.0">
+  <part-list><score-part id="P1"><part-name>Piano</part-name></score-part></part-list>
+  <part id="P1">
+{measures}
+  </part>
+</score-partwise>
+"""
+
+MEASURE = """    <measure number="{number}">{attributes}
+      <note><pitch><step>{step}</step><octave>4</octave></pitch><duration>4</duration><type>whole</type></note>
+    </measure>"""
+
+ATTRIBUTES = "<attributes><divisions>1</divisions><time><beats>4</beats><beat-type>4</beat-type></time></attributes>"
+
+
+def _files(tmp_path, steps1, steps2):
+    files = {}
+    for role, steps in (('score1', steps1), ('score2', steps2)):
+        measures = "\n".join(MEASURE.format(number=k, step=step, attributes=ATTRIBUTES if k == 1 else '')
+                             for k, step in enumerate(steps, 1))
+        files[role] = tmp_path / f"{role}.musicxml"
+        files[role].write_text(SCORE.format(measures=measures), encoding='utf-8')
+    return files
+
+
+def _review(session, decisions):
+    """Decide the first differences as the review loop does"""
+    for index, ((part_diff, measure_diff), source) in enumerate(zip(session.entries(), decisions)):
+        session.decide(part_diff['part_id'], measure_diff, source)
+        session.position = index + 1
+        session.log_decision(part_diff['part_id'], measure_diff)
+
+
+def _chosen(session):
+    return [(number, operation, measure_diff['score2_measure'].number)
+            for (_, number, operation), measure_diff in session.merge.choices.items()]
+
+
+def test_resume_replays_the_journal(tmp_path):
+    files = _files(tmp_path, 'CDEFG', 'CAEBD')
+    path = tmp_path / 'session.json'
+    session, resumed = start_session(files, path, cache=False)
+    assert resumed is None
+    assert [measure_diff['measure_number'] for _, measure_diff in session.entries()] == [2, 4, 5]
+
+    _review(session, ['score2', 'score1'])
+    # The first decision wrote the session, the second was only journaled
+    assert session.journaled == 1
+    assert len(journal_path(path).read_text(encoding='utf-8').splitlines()) == 1
+
+    resumed_session, resumed = start_session(files, path, cache=False)
+    assert resumed == 'unchanged'
+    assert resumed_session.undecided() == 1
+    assert resumed_session.position == 2
+    assert [resumed_session.decisions.get(id(measure_diff)) for _, measure_diff in resumed_session.entries()] == \
+        ['score2', 'score1', None]
+    # Measure 4 stays as in score1, so only measure 2 is taken from score2
+    assert _chosen(resumed_session) == _chosen(session) == [(2, 'modify', 2)]
+    [chosen] = resumed_session.merge.choices.values()
+    assert chosen['score2_measure'] is resumed_session.score2.parts[0].measures[1]
+
+    # Writing the session in full empties the journal and keeps the decisions
+    resumed_session.save()
+    assert not journal_path(path).exists()
+    again, _ = start_session(files, path, cache=False)
+    assert again.undecided() == 1
+    assert again.position == 2
+
+
+def test_a_torn_journal_entry_is_ignored(tmp_path):
+    files = _files(tmp_path, 'CDEF', 'CABD')
+    path = tmp_path / 'session.json'
+    session, _ = start_session(files, path, cache=False)
+    _review(session, ['score2', 'score2', 'score2'])
+    journal = journal_path(path)
+    text = journal.read_text(encoding='utf-8')
+    # The last entry was being appended when the program stopped
+    journal.write_text(text[:-5], encoding='utf-8')
+
+    resumed, _ = start_session(files, path, cache=False)
+    assert resumed.position == 2
+    assert [resumed.decisions.get(id(measure_diff)) for _, measure_diff in resumed.entries()] == \
+        ['score2', 'score2', None]
@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import pytest
+
+from musicmerge.core import MergeOverlay, compare_scores
+from musicmerge.notation import read_score
+from musicmerge.splice import can_splice, splice_export
+
+TESTFILES = Path(__file__).resolve().parent.parent / 'testfiles'
+
+PAIRS = [
+    ('tests/test6/testscore.musicxml', 'tests/test6/testscore_changed.musicxml'),
+    ('tests/test3/10barsofGwViolin.musicxml', 'tests/test3/10barsofGwViolinEdited.musicxml'),
+    # Bars deleted and inserted at the end
+    ('10barsofG.musicxml', '5barsofD.musicxml'),
+    ('5barsofD.musicxml', '10barsofG.musicxml'),
+]
+
+
+def _without_restored_state(xml):
+    # After a changed measure, splice_export restores score1's attributes
+    # (e.g. its divisions) in an <attributes> element right after the start tag
+    start = xml.find(b'>') + 1
+    if not xml.startswith(b'<attributes>', start):
+        return xml
+    return xml[:start] + xml[xml.index(b'</attributes>', start) + len(b'</attributes>'):]
+
+
+@pytest.mark.parametrize('names', PAIRS, ids=[name2 for _, name2 in PAIRS])
+def test_taking_every_change_reproduces_score2(names, tmp_path):
+    score1, score2 = (read_score(TESTFILES / name) for name in names)
+    differences = compare_scores(score1, score2)
+    merge = MergeOverlay(score1)
+    for part_diff in differences:
+        for measure_diff in part_diff['differences']:
+            merge.choose(part_diff['part_id'], measure_diff)
+    assert can_splice(merge)
+
+    output = tmp_path / 'merged.musicxml'
+    splice_export(merge, output)
+    merged = read_score(output)
+    assert compare_scores(merged, score2) == []
+
+    # Staves of a part share their measures' MusicXML, so a change on one staff touches all of them
+    touched = {measure_diff['score1_measure'].xml
+               for part_diff in differences for measure_diff in part_diff['differences']
+               if measure_diff['score1_measure'] is not None}
+    for part1, part in zip(score1.parts, merged.parts):
+        untouched = [measure.xml for measure in part1.measures if measure.xml not in touched]
+        kept = set(untouched)
+        written = [_without_restored_state(measure.xml) for measure in part.measures]
+        assert [xml for xml in written if xml in kept] == untouched
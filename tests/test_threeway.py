@@ -0,0 +1,88 @@
+from musicmerge.notation import read_score
+from musicmerge.threeway import _chunks, _matching, three_way_merge
+
+SCORE = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise version="4.0">
+  <part-list><score-part id="P1"><part-name>Piano</part-name></score-part></part-list>
+  <part id="P1">
+{measures}
+  </part>
+</score-partwise>
+"""
+
+MEASURE = """    <measure number="{number}">{attributes}
+      <note><pitch><step>{step}</step><octave>4</octave></pitch><duration>4</duration><type>whole</type></note>
+    </measure>"""
+
+ATTRIBUTES = "<attributes><divisions>1</divisions><time><beats>4</beats><beat-type>4</beat-type></time></attributes>"
+
+
+def _score(tmp_path, name, steps):
+    measures = "\n".join(MEASURE.format(number=k, step=step, attributes=ATTRIBUTES if k == 1 else '')
+                         for k, step in enumerate(steps, 1))
+    path = tmp_path / f"{name}.musicxml"
+    path.write_text(SCORE.format(measures=measures), encoding='utf-8')
+    return read_score(path)
+
+
+def _edits(part_diffs):
+    return [(d['operation'], d['measure_number']) for part_diff in part_diffs for d in part_diff['differences']]
+
+
+def test_matching_pairs_unchanged_measures():
+    assert _matching(list('abcd'), list('abcd')) == {0: 0, 1: 1, 2: 2, 3: 3}
+    assert _matching(list('abcd'), list('abxd')) == {0: 0, 1: 1, 3: 3}
+    assert _matching(list('abcd'), list('abXcd')) == {0: 0, 1: 1, 2: 3, 3: 4}
+    assert _matching(list('abcd'), list('acd')) == {0: 0, 2: 1, 3: 2}
+
+
+def test_chunks_split_around_measures_kept_everywhere():
+    chunks = list(_chunks(list('abcde'), [list('aXcde'), list('abcdeY')]))
+    assert chunks == [
+        (True, (0, 1), [(0, 1), (0, 1)]),
+        (False, (1, 2), [(1, 2), (1, 2)]),
+        (True, (2, 3), [(2, 3), (2, 3)]),
+        (True, (3, 4), [(3, 4), (3, 4)]),
+        (True, (4, 5), [(4, 5), (4, 5)]),
+        # Appended in theirs only
+        (False, (5, 5), [(5, 5), (5, 6)]),
+    ]
+    # Every base measure and every version measure is in exactly one chunk
+    for position, length in enumerate((5, 5, 6)):
+        ranges = [(b1, b2) if position == 0 else versions[position - 1] for _, (b1, b2), versions in chunks]
+        assert [index for start, end in ranges for index in range(start, end)] == list(range(length))
+
+
+def test_non_overlapping_edits_are_both_kept(tmp_path):
+    base = _score(tmp_path, 'base', 'CDEFG')
+    ours = _score(tmp_path, 'ours', 'CAEFG')
+    theirs = _score(tmp_path, 'theirs', 'CDEFB')
+    result = three_way_merge(base, ours, theirs)
+    assert result['auto_resolved'] == 2
+    assert _edits(result['theirs']) == [('modify', 5)]
+    assert result['conflicts'] == []
+    assert len(result['merge']) == 1
+
+
+def test_same_edit_on_both_sides_is_no_conflict(tmp_path):
+    base = _score(tmp_path, 'base', 'CDEFG')
+    ours = _score(tmp_path, 'ours', 'CAEFG')
+    theirs = _score(tmp_path, 'theirs', 'CAEFG')
+    result = three_way_merge(base, ours, theirs)
+    assert result['auto_resolved'] == 1
+    assert result['theirs'] == []
+    assert result['conflicts'] == []
+
+
+def test_different_edits_of_one_measure_conflict(tmp_path):
+    base = _score(tmp_path, 'base', 'CDEFG')
+    ours = _score(tmp_path, 'ours', 'CAEFG')
+    theirs = _score(tmp_path, 'theirs', 'CBEFA')
+    result = three_way_merge(base, ours, theirs)
+    # Measure 5 changed in theirs only
+    assert result['auto_resolved'] == 1
+    assert _edits(result['theirs']) == [('modify', 5)]
+    assert _edits(result['conflicts']) == [('modify', 2)]
+    conflict = result['conflicts'][0]['differences'][0]
+    assert conflict['score1_measure'] is ours.parts[0].measures[1]
+    assert conflict['score2_measure'] is theirs.parts[0].measures[1]
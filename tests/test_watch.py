@@ -0,0 +1,95 @@
+from musicmerge.core import MergeOverlay, compare_scores
+from musicmerge.watch import reload_score, update_differences
+
+SCORE = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise version="4.0">
+  <part-list>
+    <score-part id="P1"><part-name>Flute</part-name></score-part>
+    <score-part id="P2"><part-name>Oboe</part-name></score-part>
+  </part-list>
+  <part id="P1">
+{measures1}
+  </part>
+  <part id="P2">
+{measures2}
+  </part>
+</score-partwise>
+"""
+
+MEASURE = """    <measure number="{number}">{attributes}
+      <note><pitch><step>{step}</step><octave>4</octave></pitch><duration>4</duration><type>whole</type></note>
+    </measure>"""
+
+ATTRIBUTES = "<attributes><divisions>1</divisions><time><beats>4</beats><beat-type>4</beat-type></time></attributes>"
+
+
+def _measures(steps):
+    return "\n".join(MEASURE.format(number=k, step=step, attributes=ATTRIBUTES if k == 1 else '')
+                     for k, step in enumerate(steps, 1))
+
+
+def _write(path, steps1, steps2):
+    path.write_text(SCORE.format(measures1=_measures(steps1), measures2=_measures(steps2)), encoding='utf-8')
+
+
+def _keys(differences):
+    return [(part_diff['part_id'], measure_diff['operation'], measure_diff['measure_number'])
+            for part_diff in differences for measure_diff in part_diff['differences']]
+
+
+def test_unchanged_differences_keep_their_dicts_and_choices(tmp_path):
+    path1, path2 = tmp_path / 'score1.musicxml', tmp_path / 'score2.musicxml'
+    _write(path1, 'CDEFG', 'CDEFG')
+    _write(path2, 'CAEFG', 'GFEDC')
+    (score1, fingerprints1), (score2, fingerprints2) = (reload_score(path, cache=False) for path in (path1, path2))
+    differences = compare_scores(score1, score2, fingerprints1, fingerprints2)
+    flute, oboe = differences
+    kept = flute['differences'][0]
+    merge = MergeOverlay(score1)
+    merge.choose(flute['part_id'], kept)
+
+    # Measure 5 of the flute changes in score2; the oboe part is untouched
+    _write(path2, 'CAEFB', 'GFEDC')
+    new_score2, new_fingerprints2 = reload_score(path2, cache=False)
+    previous = (score1, score2, fingerprints1, fingerprints2)
+    updated, changed = update_differences(differences, score1, new_score2, fingerprints1, new_fingerprints2,
+                                          previous)
+
+    assert changed == {'Flute'}
+    assert _keys(updated) == [('Flute', 'modify', 2), ('Flute', 'modify', 5),
+                              ('Oboe', 'modify', 1), ('Oboe', 'modify', 2), ('Oboe', 'modify', 4),
+                              ('Oboe', 'modify', 5)]
+    assert updated[0]['differences'][0] is kept
+    assert updated[1] is oboe
+    # Kept differences refer to the measures just read
+    new_measures = new_score2.parts[0].measures
+    assert kept['score2_measure'] is new_measures[1]
+    assert updated[0]['differences'][1]['score2_measure'] is new_measures[4]
+    assert all(measure_diff['score2_measure'] is new_score2.parts[1].measures[measure_diff['measure_number'] - 1]
+               for measure_diff in oboe['differences'])
+
+    # The choice made before the change carries over to the new overlay
+    rebased = merge.rebase(score1, updated)
+    assert list(rebased.choices.values()) == [kept]
+
+
+def test_changed_differences_get_new_dicts(tmp_path):
+    path1, path2 = tmp_path / 'score1.musicxml', tmp_path / 'score2.musicxml'
+    _write(path1, 'CDEF', 'CDEF')
+    _write(path2, 'CAEF', 'CDEF')
+    (score1, fingerprints1), (score2, fingerprints2) = (reload_score(path, cache=False) for path in (path1, path2))
+    differences = compare_scores(score1, score2, fingerprints1, fingerprints2)
+    old = differences[0]['differences'][0]
+    merge = MergeOverlay(score1)
+    merge.choose(differences[0]['part_id'], old)
+
+    # Measure 2 is changed again: same position, different content
+    _write(path2, 'CBEF', 'CDEF')
+    new_score2, new_fingerprints2 = reload_score(path2, cache=False)
+    updated, changed = update_differences(differences, score1, new_score2, fingerprints1, new_fingerprints2,
+                                          (score1, score2, fingerprints1, fingerprints2))
+    assert changed == {'Flute'}
+    assert _keys(updated) == [('Flute', 'modify', 2)]
+    assert updated[0]['differences'][0] is not old
+    # The choice was made on the old content of measure 2, so it is dropped
+    assert merge.rebase(score1, updated).choices == {}